@@ -147,7 +147,7 @@ if __name__ == "__main__":
     # 4.3. Parameters for off-policy serial trainer
     if trainer_type == "off_serial_trainer":
         parser.add_argument(
-            "--buffer_name", type=str, default="replay_buffer", help="Options:replay_buffer/prioritized_replay_buffer"
+            "--buffer_name", type=str, default="replay_buffer", help="Options:replay_buffer/prioritized_replay_buffer/memmap_replay_buffer/compact_replay_buffer/sequence_replay_buffer"
         )
         # Size of collected samples before training, i.e., warm-start
         parser.add_argument("--buffer_warm_size", type=int, default=1000) # count as samples
@@ -157,6 +157,13 @@ if __name__ == "__main__":
         parser.add_argument("--replay_batch_size", type=int, default=1024) # count as samples
         # Period of sampling
         parser.add_argument("--sample_interval", type=int, default=1)
+        # Length of replayed windows of sequence_replay_buffer, for RNN apprfuncs
+        parser.add_argument("--buffer_seq_len", type=int, default=8)
+        # Number of replay batches sampled ahead on a background thread, 0 to disable
+        parser.add_argument("--num_prefetch_batches", type=int, default=0)
+        # Save a buffer snapshot with every saved network, restore it with ini_buffer_dir
+        parser.add_argument("--save_buffer", type=bool, default=False)
+        parser.add_argument("--ini_buffer_dir", type=str, default=None, help="Path of buffer snapshot")
     # 4.4. Parameters for off-policy async trainer
     if trainer_type == "off_async_trainer":
         parser.add_argument("--num_algs", type=int, default=2)
@@ -178,6 +185,10 @@ if __name__ == "__main__":
         parser.add_argument("--buffer_max_size", type=int, default=100000) # count as samples
         parser.add_argument("--replay_batch_size", type=int, default=1024)  # count as samples
         parser.add_argument("--sample_interval", type=int, default=1)
+        parser.add_argument("--save_buffer", type=bool, default=False)
+        parser.add_argument("--ini_buffer_dir", type=str, default=None, help="Path of buffer snapshots")
+        # Replay batches fetched from a buffer actor per RPC, e.g. num_algs
+        parser.add_argument("--replay_batches_per_request", type=int, default=1)
 
     ################################################
     # 5. Parameters for sampler
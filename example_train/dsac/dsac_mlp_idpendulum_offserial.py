@@ -127,9 +127,11 @@ if __name__ == "__main__":
 
     ################################################
     # 5. Parameters for sampler
-    parser.add_argument("--sampler_name", type=str, default="off_sampler", help="Options: on_sampler/off_sampler")
+    parser.add_argument("--sampler_name", type=str, default="off_sampler", help="Options: on_sampler/off_sampler/model_sampler")
     # Batch size of sampler for buffer store
     parser.add_argument("--sample_batch_size", type=int, default=8)
+    # Number of parallel env model rollouts of model_sampler
+    parser.add_argument("--model_env_num", type=int, default=8)
     # Add noise to action for better exploration
     parser.add_argument("--noise_params", type=dict, default=None)
 
@@ -0,0 +1,170 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab(iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: example for sac + pendulum + mlp + off_vmap
+
+
+import argparse
+import os
+import numpy as np
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_buffer import create_buffer
+from gops.create_pkg.create_env import create_env
+from gops.create_pkg.create_evaluator import create_evaluator
+from gops.create_pkg.create_sampler import create_sampler
+from gops.create_pkg.create_trainer import create_trainer
+from gops.utils.init_args import init_args
+from gops.utils.plot_evaluation import plot_all
+from gops.utils.tensorboard_setup import start_tensorboard, save_tb_to_csv
+
+os.environ["OMP_NUM_THREADS"] = "1"
+
+if __name__ == "__main__":
+    # Parameters Setup
+    parser = argparse.ArgumentParser()
+
+    ################################################
+    # Key Parameters for users
+    parser.add_argument("--env_id", type=str, default="gym_pendulum", help="id of environment")
+    parser.add_argument("--algorithm", type=str, default="SAC", help="RL algorithm")
+    parser.add_argument("--enable_cuda", default=False, help="Disable CUDA")
+
+    ################################################
+    # 1. Parameters for environment
+    parser.add_argument("--is_render", type=bool, default=False, help="Draw environment animation")
+    parser.add_argument("--is_adversary", type=bool, default=False, help="Adversary training")
+
+    ################################################
+    # 2.1 Parameters of value approximate function
+    parser.add_argument(
+        "--value_func_name",
+        type=str,
+        default="ActionValue",
+        help="Options: StateValue/ActionValue/ActionValueDis/ActionValueDistri",
+    )
+    parser.add_argument("--value_func_type", type=str, default="MLP", help="Options: MLP/CNN/CNN_SHARED/RNN/POLY/GAUSS")
+    value_func_type = parser.parse_known_args()[0].value_func_type
+    parser.add_argument("--value_hidden_sizes", type=list, default=[64, 64])
+    parser.add_argument(
+        "--value_hidden_activation", type=str, default="relu", help="Options: relu/gelu/elu/selu/sigmoid/tanh"
+    )
+    parser.add_argument("--value_output_activation", type=str, default="linear", help="Options: linear/tanh")
+
+    # 2.2 Parameters of policy approximate function
+    parser.add_argument(
+        "--policy_func_name",
+        type=str,
+        default="StochaPolicy",
+        help="Options: None/DetermPolicy/FiniteHorizonPolicy/StochaPolicy",
+    )
+    parser.add_argument(
+        "--policy_func_type", type=str, default="MLP", help="Options: MLP/CNN/CNN_SHARED/RNN/POLY/GAUSS"
+    )
+    parser.add_argument(
+        "--policy_act_distribution",
+        type=str,
+        default="TanhGaussDistribution",
+        help="Options: default/TanhGaussDistribution/GaussDistribution",
+    )
+    policy_func_type = parser.parse_known_args()[0].policy_func_type
+    parser.add_argument("--policy_hidden_sizes", type=list, default=[64, 64])
+    parser.add_argument(
+        "--policy_hidden_activation", type=str, default="relu", help="Options: relu/gelu/elu/selu/sigmoid/tanh"
+    )
+    parser.add_argument("--policy_min_log_std", type=int, default=-20)
+    parser.add_argument("--policy_max_log_std", type=int, default=1)
+
+    ################################################
+    # 3. Parameters for RL algorithm
+    parser.add_argument("--value_learning_rate", type=float, default=1e-3)
+    parser.add_argument("--q_learning_rate", type=float, default=1e-3)
+    parser.add_argument("--policy_learning_rate", type=float, default=1e-3)
+    parser.add_argument("--alpha_learning_rate", type=float, default=1e-3)
+
+    ################################################
+    # 4. Parameters for trainer
+    parser.add_argument(
+        "--trainer",
+        type=str,
+        default="off_vmap_trainer",
+        help="Options: on_serial_trainer, on_sync_trainer, off_serial_trainer, off_async_trainer, off_ddp_trainer, off_vmap_trainer",
+    )
+    # Maximum iteration number
+    parser.add_argument("--max_iteration", type=int, default=8000)
+    trainer_type = parser.parse_known_args()[0].trainer
+    parser.add_argument("--ini_network_dir", type=str, default=None)
+
+    # 4.1. Parameters for off_vmap_trainer
+    # Number of agents trained together, with seeds seed, seed + 1, ...
+    parser.add_argument("--num_agents", type=int, default=4, help="number of agents")
+    parser.add_argument(
+        "--buffer_name", type=str, default="replay_buffer", help="Options:replay_buffer"
+    )
+    # Size of collected samples before training
+    parser.add_argument("--buffer_warm_size", type=int, default=int(1e3))
+    # Max size of reply buffer
+    parser.add_argument("--buffer_max_size", type=int, default=int(1e5))
+    # Batch size of replay samples from buffer
+    parser.add_argument("--replay_batch_size", type=int, default=64)
+    # Period of sync central policy of each sampler
+    parser.add_argument("--sampler_sync_interval", type=int, default=1)
+
+    ################################################
+    # 5. Parameters for sampler
+    parser.add_argument("--sampler_name", type=str, default="off_sampler", help="Options: on_sampler/off_sampler")
+    # Batch size of sampler for buffer store
+    parser.add_argument("--sample_batch_size", type=int, default=8)
+    # Add noise to actions for better exploration
+    parser.add_argument("--noise_params", type=dict, default=None)
+
+    ################################################
+    # 6. Parameters for evaluator
+    parser.add_argument("--evaluator_name", type=str, default="evaluator")
+    parser.add_argument("--num_eval_episode", type=int, default=10)
+    parser.add_argument("--eval_interval", type=int, default=100)
+    parser.add_argument("--eval_save", type=str, default=False, help="save evaluation data")
+
+    ################################################
+    # 7. Data savings
+    parser.add_argument("--save_folder", type=str, default=None)
+    # Save value/policy every N updates
+    parser.add_argument("--apprfunc_save_interval", type=int, default=5000)
+    # Save key info every N updates
+    parser.add_argument("--log_save_interval", type=int, default=100)
+
+    ################################################
+    # Get parameter dictionary
+    args = vars(parser.parse_args())
+    env = create_env(**args)
+    args = init_args(env, **args)
+
+    start_tensorboard(args["save_folder"])
+    # Step 1: create algorithm and approximate function
+    alg = create_alg(**args)
+    alg.set_parameters({"tau": 0.05})
+    # Step 2: create sampler in trainer
+    sampler = create_sampler(**args)
+    # Step 3: create buffer in trainer
+    buffer = create_buffer(**args)
+    # Step 4: create evaluator in trainer
+    evaluator = create_evaluator(**args)
+    # Step 5: create trainer
+    trainer = create_trainer(alg, sampler, buffer, evaluator, **args)
+
+    ################################################
+    # Start training ... ...
+    trainer.train()
+    print("Training is finished!")
+
+    ################################################
+    # Plot and save training figures
+    for save_folder in trainer.save_folders:
+        plot_all(save_folder)
+        save_tb_to_csv(save_folder)
+    print("Plot & Save are finished!")
@@ -13,11 +13,13 @@
 
 from abc import ABCMeta, ABC, abstractmethod
 
-from typing import Tuple, Type
+from typing import Sequence, Tuple, Type
 
 from gops.utils.common_utils import set_seed
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.grad_aggregation import pack_update_info
+from gops.utils.weight_broadcast import load_flat_weights
 import torch
 
 
@@ -31,6 +33,45 @@ class ApprBase(ABC, torch.nn.Module):
             feature_args = get_apprfunc_dict("feature", **kwargs)
             kwargs["feature_net"] = create_apprfunc(**feature_args)
 
+    def register_legacy_members(self, ensemble: str, members: Sequence[str]):
+        """
+        Load state dicts saved with the members of the ensemble apprfunc named
+        `ensemble` as separate modules named `members`, e.g. twin critics q1
+        and q2 of earlier checkpoints, into the ensemble.
+        """
+        self._register_legacy_hook()
+        self.legacy_members[ensemble] = tuple(members)
+
+    def discard_legacy_modules(self, modules: Sequence[str]):
+        """
+        Load state dicts saved with modules named `modules` that no longer
+        exist, e.g. policy4rollout of earlier MPG checkpoints, without them.
+        """
+        self._register_legacy_hook()
+        self.legacy_modules.extend(modules)
+
+    def _register_legacy_hook(self):
+        if not hasattr(self, "legacy_members"):
+            self.legacy_members = {}
+            self.legacy_modules = []
+            self._register_load_state_dict_pre_hook(self._load_legacy_members)
+
+    def _load_legacy_members(self, state_dict, prefix, *args):
+        module_prefixes = tuple(prefix + m + "." for m in self.legacy_modules)
+        for k in list(state_dict):
+            if k.startswith(module_prefixes):
+                del state_dict[k]
+        for ensemble, members in self.legacy_members.items():
+            member_prefixes = [prefix + m + "." for m in members]
+            if not any(k.startswith(member_prefixes[0]) for k in state_dict):
+                continue
+            member_state_dicts = [
+                {k[len(p):]: state_dict.pop(k) for k in list(state_dict) if k.startswith(p)}
+                for p in member_prefixes
+            ]
+            stacked = getattr(self, ensemble).stack_member_state_dicts(member_state_dicts)
+            state_dict.update({prefix + ensemble + "." + k: v for k, v in stacked.items()})
+
     def init_scheduler(self, **kwargs):
         # self.optimizer_dict should be initialized in alg before calling this function
         assert hasattr(self, "optimizer_dict")
@@ -91,6 +132,9 @@ class AlgorithmBase(metaclass=ABCMeta):
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
 
+    def load_flat_weights(self, flat, names=None):
+        load_flat_weights(self.networks, flat, names)
+
     def local_update(self, data: dict, iteration: int) -> dict:
         tb_info = self._local_update(data, iteration)
         for key, scheduler in self.networks.scheduler_dict.items():
@@ -108,6 +152,21 @@ class AlgorithmBase(metaclass=ABCMeta):
     def get_remote_update_info(self, data: dict, iteration: int) -> Tuple[dict, dict]:
         raise NotImplemented
 
+    def get_packed_update_info(self, data: dict, iteration: int) -> Tuple[dict, tuple]:
+        """`get_remote_update_info` with the update info packed by `pack_update_info`."""
+        extra_info, update_info = self.get_remote_update_info(data, iteration)
+        return extra_info, pack_update_info(update_info)
+
+    def get_vmap_losses(self, data: dict) -> Tuple[dict, dict]:
+        """
+        Losses of one update, evaluated by OffVmapTrainer for several agents at
+        once under torch.func.vmap, so no `.item()` or branching on tensor values.
+        Return the losses keyed by tuples of the names of the parameters or
+        modules of the networks they train, whose gradients are passed to
+        `remote_update` as `<name>_grad`, and a dict of scalar tensors to log.
+        """
+        raise NotImplementedError
+
     def _remote_update(self, update_info: dict):
         raise NotImplemented
 
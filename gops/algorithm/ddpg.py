@@ -25,6 +25,7 @@ from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.common_utils import get_apprfunc_dict
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
@@ -172,25 +173,17 @@ class DDPG(AlgorithmBase):
         return -q_policy.mean()
 
     def __update(self, iteration):
-        polyak = 1 - self.tau
         delay_update = self.delay_update
 
         self.networks.q_optimizer.step()
         if iteration % delay_update == 0:
             self.networks.policy_optimizer.step()
 
-        with torch.no_grad():
-            for p, p_targ in zip(
-                self.networks.q.parameters(), self.networks.q_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.policy.parameters(),
-                self.networks.policy_target.parameters(),
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(
+            [self.networks.q, self.networks.policy],
+            [self.networks.q_target, self.networks.policy_target],
+            self.tau,
+        )
 
     def local_update(self, data: dict, iteration: int):
         extra_info = self.__compute_gradient(data, iteration)
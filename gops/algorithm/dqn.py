@@ -29,6 +29,7 @@ from gops.algorithm.base import AlgorithmBase, ApprBase
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.common_utils import get_apprfunc_dict
 from gops.utils.tensorboard_setup import tb_tags
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
@@ -154,16 +155,9 @@ class DQN(AlgorithmBase):
         return loss_q, abs_err
 
     def __update(self, iteration):
-        polyak = 1 - self.tau
-
         self.networks.q_optimizer.step()
 
-        with torch.no_grad():
-            for p, p_targ in zip(
-                self.networks.q.parameters(), self.networks.q_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(self.networks.q, self.networks.q_target, self.tau)
 
     def local_update(self, data: dict, iteration: int):
         extra_info = self.__compute_gradient(data, iteration)
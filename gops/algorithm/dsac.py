@@ -30,6 +30,7 @@ from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.gops_typing import DataDict
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
@@ -142,13 +143,35 @@ class DSAC(AlgorithmBase):
 
         self.__update(iteration)
 
+    def get_vmap_losses(self, data: DataDict) -> Tuple[dict, dict]:
+        logits = self.networks.policy(data["obs"])
+        act_dist = self.networks.create_action_distributions(logits)
+        new_act, new_log_prob = act_dist.rsample()
+        data.update({"new_act": new_act, "new_log_prob": new_log_prob})
+
+        loss_q, q, std = self.__compute_loss_q(data)
+        loss_policy, entropy = self.__compute_loss_policy(data)
+        losses = {("q",): loss_q, ("policy",): loss_policy}
+        tb_info = {
+            "DSAC/critic_avg_q-RL iter": q,
+            "DSAC/critic_avg_std-RL iter": std,
+            tb_tags["loss_actor"]: loss_policy.detach(),
+            "DSAC/policy_mean-RL iter": torch.tanh(logits[..., 0]).mean().detach(),
+            "DSAC/policy_std-RL iter": logits[..., 1].mean().detach(),
+            "DSAC/entropy-RL iter": entropy,
+        }
+        if self.auto_alpha:
+            losses[("log_alpha",)] = self.__compute_loss_alpha(data)
+            tb_info["DSAC/alpha-RL iter"] = self.__get_alpha()
+        return losses, tb_info
+
     def __get_alpha(self, requires_grad: bool = False):
         if self.auto_alpha:
             alpha = self.networks.log_alpha.exp()
             if requires_grad:
                 return alpha
             else:
-                return alpha.item()
+                return alpha.detach()
         else:
             return self.alpha
 
@@ -190,7 +213,7 @@ class DSAC(AlgorithmBase):
             "DSAC/policy_mean-RL iter": policy_mean,
             "DSAC/policy_std-RL iter": policy_std,
             "DSAC/entropy-RL iter": entropy.item(),
-            "DSAC/alpha-RL iter": self.__get_alpha(),
+            "DSAC/alpha-RL iter": float(self.__get_alpha()),
             tb_tags["alg_time"]: (time.time() - start_time) * 1000,
         }
 
@@ -275,16 +298,8 @@ class DSAC(AlgorithmBase):
             if self.auto_alpha:
                 self.networks.alpha_optimizer.step()
 
-            with torch.no_grad():
-                polyak = 1 - self.tau
-                for p, p_targ in zip(
-                    self.networks.q.parameters(), self.networks.q_target.parameters()
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.policy.parameters(),
-                    self.networks.policy_target.parameters(),
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
+            polyak_update(
+                [self.networks.q, self.networks.policy],
+                [self.networks.q_target, self.networks.policy_target],
+                self.tau,
+            )
@@ -25,26 +25,28 @@ from torch.distributions import Normal
 from torch.optim import Adam
 
 from gops.algorithm.base import AlgorithmBase, ApprBase
-from gops.create_pkg.create_apprfunc import create_apprfunc
+from gops.create_pkg.create_apprfunc import create_apprfunc, create_ensemble_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.gops_typing import DataDict
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
     """Approximate function container for DSAC.
 
-    Contains one policy and one action value.
+    Contains one policy and two action values, evaluated together as an ensemble.
     """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # create q networks
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1: nn.Module = create_apprfunc(**q_args)
-        self.q2: nn.Module = create_apprfunc(**q_args)
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
+        self.q: nn.Module = create_ensemble_apprfunc(2, **q_args)
+        self.q_target = deepcopy(self.q)
+        # checkpoints saved with separate twin critics
+        self.register_legacy_members("q", ("q1", "q2"))
+        self.register_legacy_members("q_target", ("q1_target", "q2_target"))
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
@@ -54,17 +56,14 @@ class ApproxContainer(ApprBase):
         # set target network gradients
         for p in self.policy_target.parameters():
             p.requires_grad = False
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target.parameters():
             p.requires_grad = False
 
         # create entropy coefficient
         self.log_alpha = nn.Parameter(torch.tensor(1, dtype=torch.float32))
 
         # create optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
+        self.q_optimizer = Adam(self.q.parameters(), lr=kwargs["value_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -122,8 +121,7 @@ class DSACT(AlgorithmBase):
         tb_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p._grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p._grad for p in self.networks.q2.parameters()],
+            "q_grad": [p._grad for p in self.networks.q.parameters()],
             "policy_grad": [p._grad for p in self.networks.policy.parameters()],
             "iteration": iteration,
         }
@@ -134,13 +132,10 @@ class DSACT(AlgorithmBase):
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
+        q_grad = update_info["q_grad"]
         policy_grad = update_info["policy_grad"]
 
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
+        for p, grad in zip(self.networks.q.parameters(), q_grad):
             p._grad = grad
         for p, grad in zip(self.networks.policy.parameters(), policy_grad):
             p._grad = grad
@@ -172,25 +167,14 @@ class DSACT(AlgorithmBase):
         new_act, new_log_prob = act_dist.rsample()
         data.update({"new_act": new_act, "new_log_prob": new_log_prob})
 
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        self.networks.q_optimizer.zero_grad()
         loss_q, q1, q2, std1, std2, min_std1, min_std2 = self.__compute_loss_q(data)
         loss_q.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-
-        for p in self.networks.q2.parameters():
-            p.requires_grad = False
-
+        # the policy loss passes through the q networks without updating them
         self.networks.policy_optimizer.zero_grad()
         loss_policy, entropy = self.__compute_loss_policy(data)
-        loss_policy.backward()
-
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
-            p.requires_grad = True
+        loss_policy.backward(inputs=list(self.networks.policy.parameters()))
 
         if self.auto_alpha:
             self.networks.alpha_optimizer.zero_grad()
@@ -238,8 +222,7 @@ class DSACT(AlgorithmBase):
         act2_dist = self.networks.create_action_distributions(logits_2)
         act2, log_prob_act2 = act2_dist.rsample()
 
-        q1, q1_std, _ = self.__q_evaluate(obs, act, self.networks.q1)
-        q2, q2_std, _ = self.__q_evaluate(obs, act, self.networks.q2)
+        (q1, q2), (q1_std, q2_std), _ = self.__q_evaluate(obs, act, self.networks.q)
         if self.mean_std1 is None:
             self.mean_std1 = torch.mean(q1_std.detach())
         else:
@@ -251,12 +234,8 @@ class DSACT(AlgorithmBase):
             self.mean_std2 = (1 - self.tau_b) * self.mean_std2 + self.tau_b * torch.mean(q2_std.detach())
 
 
-        q1_next, _, q1_next_sample = self.__q_evaluate(
-            obs2, act2, self.networks.q1_target
-        )
-        
-        q2_next, _, q2_next_sample = self.__q_evaluate(
-            obs2, act2, self.networks.q2_target
+        (q1_next, q2_next), _, (q1_next_sample, q2_next_sample) = self.__q_evaluate(
+            obs2, act2, self.networks.q_target
         )
         q_next = torch.min(q1_next, q2_next)
         q_next_sample = torch.where(q1_next < q2_next, q1_next_sample, q2_next_sample)
@@ -314,8 +293,7 @@ class DSACT(AlgorithmBase):
 
     def __compute_loss_policy(self, data: DataDict):
         obs, new_act, new_log_prob = data["obs"], data["new_act"], data["new_log_prob"]
-        q1, _, _ = self.__q_evaluate(obs, new_act, self.networks.q1)
-        q2, _, _ = self.__q_evaluate(obs, new_act, self.networks.q2)
+        (q1, q2), _, _ = self.__q_evaluate(obs, new_act, self.networks.q)
         loss_policy = (self.__get_alpha() * new_log_prob - torch.min(q1,q2)).mean()
         entropy = -new_log_prob.detach().mean()
         return loss_policy, entropy
@@ -329,8 +307,7 @@ class DSACT(AlgorithmBase):
         return loss_alpha
 
     def __update(self, iteration: int):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
+        self.networks.q_optimizer.step()
 
         if iteration % self.delay_update == 0:
             self.networks.policy_optimizer.step()
@@ -338,21 +315,8 @@ class DSACT(AlgorithmBase):
             if self.auto_alpha:
                 self.networks.alpha_optimizer.step()
 
-            with torch.no_grad():
-                polyak = 1 - self.tau
-                for p, p_targ in zip(
-                    self.networks.q1.parameters(), self.networks.q1_target.parameters()
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.q2.parameters(), self.networks.q2_target.parameters()
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.policy.parameters(),
-                    self.networks.policy_target.parameters(),
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
+            polyak_update(
+                [self.networks.q, self.networks.policy],
+                [self.networks.q_target, self.networks.policy_target],
+                self.tau,
+            )
@@ -16,7 +16,6 @@
 __all__ = ["FHADP"]
 
 import time
-from copy import deepcopy
 from typing import Tuple
 
 import torch
@@ -26,6 +25,7 @@ from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
 from gops.utils.gops_typing import DataDict, InfoDict
+from gops.utils.model_rollout import ModelRollout, discounted_sum
 from gops.utils.tensorboard_setup import tb_tags
 
 
@@ -62,6 +62,7 @@ class FHADP(AlgorithmBase):
 
     :param int pre_horizon: envmodel predict horizon.
     :param float gamma: discount factor.
+    :param bool compile_rollout: whether to compile the rollout of policy and envmodel.
     """
 
     def __init__(
@@ -69,12 +70,16 @@ class FHADP(AlgorithmBase):
         *,
         pre_horizon: int,
         gamma: float = 1.0,
+        compile_rollout: bool = True,
         index: int = 0,
         **kwargs,
     ):
         super().__init__(index, **kwargs)
         self.networks = ApproxContainer(**kwargs)
         self.envmodel = create_env_model(**kwargs, pre_horizon=pre_horizon)
+        self.rollout = ModelRollout(
+            self.envmodel, self.networks.policy, compile=compile_rollout
+        )
         self.pre_horizon = pre_horizon
         self.gamma = gamma
         self.tb_info = dict()
@@ -104,20 +109,15 @@ class FHADP(AlgorithmBase):
     def _compute_gradient(self, data: DataDict):
         start_time = time.time()
         self.networks.policy.zero_grad()
-        loss_policy, loss_info = self._compute_loss_policy(deepcopy(data))
+        loss_policy, loss_info = self._compute_loss_policy(data)
         loss_policy.backward()
         end_time = time.time()
         self.tb_info.update(loss_info)
         self.tb_info[tb_tags["alg_time"]] = (end_time - start_time) * 1000  # ms
 
     def _compute_loss_policy(self, data: DataDict) -> Tuple[torch.Tensor, InfoDict]:
-        o, d = data["obs"], data["done"]
-        info = data
-        v_pi = 0
-        for step in range(self.pre_horizon):
-            a = self.networks.policy(o, step + 1)
-            o, r, d, info = self.envmodel.forward(o, a, d, info)
-            v_pi += r * (self.gamma ** step)
+        traj = self.rollout(data["obs"], data["done"], data, self.pre_horizon)
+        v_pi = discounted_sum(traj.rewards, self.gamma)
         loss_policy = -v_pi.mean()
         loss_info = {
             tb_tags["loss_actor"]: loss_policy.item()
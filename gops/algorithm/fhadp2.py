@@ -13,7 +13,6 @@
 
 __all__ = ["FHADP2"]
 
-from copy import deepcopy
 from typing import Tuple
 import torch
 import torch.nn as nn
@@ -23,6 +22,7 @@ import warnings
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
 
@@ -51,12 +51,16 @@ class FHADP2(AlgorithmBase):
 
     :param int forward_step: envmodel forward step.
     :param float gamma: discount factor.
+    :param bool compile_rollout: whether to compile the rollout of envmodel.
     """
 
     def __init__(self, index=0, **kwargs):
         super().__init__(index, **kwargs)
         self.networks = ApproxContainer(**kwargs)
         self.envmodel = create_env_model(**kwargs)
+        self.rollout = ModelRollout(
+            self.envmodel, compile=kwargs.get("compile_rollout", True)
+        )
         self.forward_step = kwargs["pre_horizon"]
         self.gamma = 1.0
         self.tb_info = dict()
@@ -86,7 +90,7 @@ class FHADP2(AlgorithmBase):
     def __compute_gradient(self, data):
         start_time = time.time()
         self.networks.policy.zero_grad()
-        loss_policy = self.__compute_loss_policy(deepcopy(data))
+        loss_policy = self.__compute_loss_policy(data)
 
         loss_policy.backward()
 
@@ -99,25 +103,10 @@ class FHADP2(AlgorithmBase):
         return
 
     def __compute_loss_policy(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
-        info_init = data
-        v_pi = 0
+        o, d = data["obs"], data["done"]
         a = self.networks.policy.forward_all_policy(o)
-        for step in range(self.forward_step):
-            if step == 0:
-                o2, r, d, info = self.envmodel.forward(o, a[:, 0, :], d, info_init)
-                v_pi = r
-            else:
-                o = o2
-                o2, r, d, info = self.envmodel.forward(o, a[:, step, :], d, info)
-                v_pi += r * (self.gamma**step)
-
+        traj = self.rollout(o, d, data, self.forward_step, actions=a)
+        v_pi = discounted_sum(traj.rewards, self.gamma)
         return -(v_pi).mean()
 
 
@@ -13,6 +13,7 @@ from typing import Tuple
 import torch
 from gops.algorithm.fhadp import ApproxContainer, FHADP
 from gops.utils.gops_typing import DataDict, InfoDict
+from gops.utils.model_rollout import discounted_sum
 from gops.utils.tensorboard_setup import tb_tags
 
 
@@ -51,16 +52,10 @@ class FHADPExterior(FHADP):
         )
 
     def _compute_loss_policy(self, data: DataDict) -> Tuple[torch.Tensor, InfoDict]:
-        o, d = data["obs"], data["done"]
-        info = data
-        v_pi_r = 0
-        v_pi_c = 0
-        for step in range(self.pre_horizon):
-            a = self.networks.policy(o, step + 1)
-            o, r, d, info = self.envmodel.forward(o, a, d, info)
-            c = (torch.clamp_min(info["constraint"], 0) ** 2).sum(1)
-            v_pi_r += r * (self.gamma ** step)
-            v_pi_c += c * (self.gamma ** step)
+        traj = self.rollout(data["obs"], data["done"], data, self.pre_horizon)
+        c = (torch.clamp_min(traj.constraints, 0) ** 2).sum(2)
+        v_pi_r = discounted_sum(traj.rewards, self.gamma)
+        v_pi_c = discounted_sum(c, self.gamma)
         loss_reward = -v_pi_r.mean()
         loss_constraint = v_pi_c.mean()
         loss_policy = loss_reward + self.penalty * loss_constraint
@@ -13,6 +13,7 @@ from typing import Tuple
 import torch
 from gops.algorithm.fhadp import ApproxContainer, FHADP
 from gops.utils.gops_typing import DataDict, InfoDict
+from gops.utils.model_rollout import discounted_sum
 from gops.utils.tensorboard_setup import tb_tags
 
 EPSILON = 1e-8
@@ -53,24 +54,13 @@ class FHADPInterior(FHADP):
         )
 
     def _compute_loss_policy(self, data: DataDict) -> Tuple[torch.Tensor, InfoDict]:
-        o, d = data["obs"], data["done"]
-        info = data
-        v_pi_r = 0
-        constraint = []
-        v_pi_c_int = 0
-        v_pi_c_ext = 0
-        for step in range(self.pre_horizon):
-            a = self.networks.policy(o, step + 1)
-            o, r, d, info = self.envmodel.forward(o, a, d, info)
-            c = info["constraint"]
-            constraint.append(c)
-            c_int = (-torch.clamp_max(c, 0) + EPSILON).log().sum(1)
-            c_ext = (torch.clamp_min(c, 0) ** 2).sum(1)
-            v_pi_r += r * (self.gamma ** step)
-            v_pi_c_int += c_int * (self.gamma ** step)
-            v_pi_c_ext += c_ext * (self.gamma ** step)
-        constraint = torch.stack(constraint, dim=1)
-        feasible = (constraint < 0).all(2).all(1)
+        traj = self.rollout(data["obs"], data["done"], data, self.pre_horizon)
+        c_int = (-torch.clamp_max(traj.constraints, 0) + EPSILON).log().sum(2)
+        c_ext = (torch.clamp_min(traj.constraints, 0) ** 2).sum(2)
+        v_pi_r = discounted_sum(traj.rewards, self.gamma)
+        v_pi_c_int = discounted_sum(c_int, self.gamma)
+        v_pi_c_ext = discounted_sum(c_ext, self.gamma)
+        feasible = (traj.constraints < 0).all(2).all(0)
         loss_reward = -v_pi_r.mean()
         loss_constraint_int = (v_pi_c_int * feasible).mean()
         loss_constraint_ext = (v_pi_c_ext * ~feasible).mean()
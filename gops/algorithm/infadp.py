@@ -24,8 +24,10 @@ import time
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
@@ -73,12 +75,19 @@ class INFADP(AlgorithmBase):
     :param float tau: param for soft update of target network.
     :param int pev_step: number of steps for policy evaluation.
     :param int pim_step: number of steps for policy improvement.
+    :param bool compile_rollout: whether to compile the model rollout.
     """
 
     def __init__(self, index=0, **kwargs):
         super().__init__(index, **kwargs)
         self.networks = ApproxContainer(**kwargs)
         self.envmodel = create_env_model(**kwargs)
+        self.rollout = ModelRollout(
+            self.envmodel,
+            self.networks.policy,
+            virtual_time=False,
+            compile=kwargs.get("compile_rollout", True),
+        )
         self.gamma = 0.99
         self.tau = 0.005
         self.pev_step = 1
@@ -123,14 +132,11 @@ class INFADP(AlgorithmBase):
         for net_name in update_list:
             self.networks.optimizer_dict[net_name].step()
 
-        with torch.no_grad():
-            for net_name in update_list:
-                for p, p_targ in zip(
-                    self.networks.net_dict[net_name].parameters(),
-                    self.networks.target_net_dict[net_name].parameters(),
-                ):
-                    p_targ.data.mul_(1 - tau)
-                    p_targ.data.add_(tau * p.data)
+        polyak_update(
+            [self.networks.net_dict[net_name] for net_name in update_list],
+            [self.networks.target_net_dict[net_name] for net_name in update_list],
+            tau,
+        )
 
     def __compute_gradient(self, data, iteration):
         update_list = []
@@ -154,62 +160,32 @@ class INFADP(AlgorithmBase):
         end_time = time.time()
 
         self.tb_info[tb_tags["alg_time"]] = (end_time - start_time) * 1000  # ms
+        self.tb_info.update(self.rollout.tb_info("INFADP"))
         return update_list
 
     def __compute_loss_v(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
+        o, d = data["obs"], data["done"]
         v = self.networks.v(o)
-        info_init = data
 
         with torch.no_grad():
-            for step in range(self.forward_step):
-                if step == 0:
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info_init)
-                    backup = r
-                else:
-                    o = o2
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                    backup += self.gamma**step * r
-
+            traj = self.rollout(o, d, data, self.forward_step)
+            backup = discounted_sum(traj.rewards, self.gamma)
             backup += (
-                (~d) * self.gamma**self.forward_step * self.networks.v_target(o2)
+                (~traj.done)
+                * self.gamma**self.forward_step
+                * self.networks.v_target(traj.obs[-1])
             )
         loss_v = ((v - backup) ** 2).mean()
         return loss_v, torch.mean(v)
 
     def __compute_loss_policy(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
+        traj = self.rollout(data["obs"], data["done"], data, self.forward_step)
+        v_pi = discounted_sum(traj.rewards, self.gamma)
+        v_pi += (
+            (~traj.done)
+            * self.gamma**self.forward_step
+            * self.networks.v_target(traj.obs[-1])
         )
-        info_init = data
-        v_pi = torch.zeros(1)
-        for p in self.networks.v.parameters():
-            p.requires_grad = False
-        for step in range(self.forward_step):
-            if step == 0:
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info_init)
-                v_pi = r
-            else:
-                o = o2
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                v_pi += self.gamma**step * r
-        v_pi += (~d) * self.gamma**self.forward_step * self.networks.v_target(o2)
-        for p in self.networks.v.parameters():
-            p.requires_grad = True
         return -v_pi.mean()
 
 
@@ -27,6 +27,7 @@ from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
+from gops.utils.target_update import polyak_update
 import numpy as np
 
 
@@ -73,14 +74,11 @@ class ApproxContainer(ApprBase):
                 p.grad = grad
             self.optimizer_dict[net_name].step()
 
-        with torch.no_grad():
-            for net_name in grads_dict.keys():
-                for p, p_targ in zip(
-                    self.net_dict[net_name].parameters(),
-                    self.target_net_dict[net_name].parameters(),
-                ):
-                    p_targ.data.mul_(1 - tau)
-                    p_targ.data.add_(tau * p.data)
+        polyak_update(
+            [self.net_dict[net_name] for net_name in grads_dict.keys()],
+            [self.target_net_dict[net_name] for net_name in grads_dict.keys()],
+            tau,
+        )
 
 
 class MAC(AlgorithmBase):
@@ -147,14 +145,11 @@ class MAC(AlgorithmBase):
         for net_name in update_list:
             self.networks.optimizer_dict[net_name].step()
 
-        with torch.no_grad():
-            for net_name in update_list:
-                for p, p_targ in zip(
-                    self.networks.net_dict[net_name].parameters(),
-                    self.networks.target_net_dict[net_name].parameters(),
-                ):
-                    p_targ.data.mul_(1 - tau)
-                    p_targ.data.add_(tau * p.data)
+        polyak_update(
+            [self.networks.net_dict[net_name] for net_name in update_list],
+            [self.networks.target_net_dict[net_name] for net_name in update_list],
+            tau,
+        )
 
     def dynamic_model_forward(self, o, a, d):
         if self.delta is not None:
@@ -24,10 +24,12 @@ import torch
 from torch.optim import Adam
 
 from gops.algorithm.base import AlgorithmBase, ApprBase
-from gops.create_pkg.create_apprfunc import create_apprfunc
+from gops.create_pkg.create_apprfunc import create_apprfunc, create_ensemble_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
@@ -45,53 +47,34 @@ class ApproxContainer(ApprBase):
         # policy gradient estimation method
         pge_method = kwargs["pge_method"]
 
-        # create value network
+        # create value networks, evaluated together as an ensemble: twin critics,
+        # followed by twin critics of model backup for mixed_state
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1 = create_apprfunc(**q_args)
-        self.q2 = create_apprfunc(**q_args)
-        if pge_method == "mixed_state":
-            self.q1_model = deepcopy(self.q1)
-            self.q2_model = deepcopy(self.q2)
+        ensemble_size = 4 if pge_method == "mixed_state" else 2
+        self.q = create_ensemble_apprfunc(ensemble_size, **q_args)
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
         self.policy = create_apprfunc(**policy_args)
-        self.policy4rollout = create_apprfunc(**policy_args)
-        self.policy4rollout = deepcopy(self.policy)
-        for p in self.policy4rollout.parameters():
-            p.requires_grad = False
 
         #  create target networks
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
-        if pge_method == "mixed_state":
-            self.q1_model_target = deepcopy(self.q1_model)
-            self.q2_model_target = deepcopy(self.q2_model)
+        self.q_target = deepcopy(self.q)
         self.policy_target = deepcopy(self.policy)
+        # checkpoints saved with separate critics
+        members = ("q1", "q2", "q1_model", "q2_model")[:ensemble_size]
+        self.register_legacy_members("q", members)
+        self.register_legacy_members("q_target", [m + "_target" for m in members])
+        # checkpoints saved with the policy copy used for model rollouts
+        self.discard_legacy_modules(["policy4rollout"])
 
         # set target network gradients
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target.parameters():
             p.requires_grad = False
         for p in self.policy_target.parameters():
             p.requires_grad = False
-        if pge_method == "mixed_state":
-            for p in self.q1_model_target.parameters():
-                p.requires_grad = False
-            for p in self.q2_model_target.parameters():
-                p.requires_grad = False
 
         # set optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
-        if pge_method == "mixed_state":
-            self.q1_model_optimizer = Adam(
-                self.q1_model.parameters(), lr=kwargs["value_learning_rate"]
-            )
-            self.q2_model_optimizer = Adam(
-                self.q2_model.parameters(), lr=kwargs["value_learning_rate"]
-            )
+        self.q_optimizer = Adam(self.q.parameters(), lr=kwargs["value_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -117,6 +100,7 @@ class MPG(AlgorithmBase):
         tau: float = 0.1,
         delay_update: int = 1,
         forward_step: int = 10,
+        compile_rollout: bool = True,
         **kwargs,
     ) -> None:
         """
@@ -129,10 +113,19 @@ class MPG(AlgorithmBase):
             :param: float tau: target update.
             :param: int delay_update: delay update of policy network.
             :param: int forward_step: forward step in calculating model return.
+            :param: bool compile_rollout: whether to compile the model rollout.
         """
         super(MPG, self).__init__(index, **kwargs)
         self.networks = ApproxContainer(**kwargs)
         self.envmodel = create_env_model(**kwargs)
+        # only the first action of the model return is differentiated
+        self.rollout = ModelRollout(
+            self.envmodel,
+            self.networks.policy,
+            virtual_time=False,
+            policy_grad_steps=1,
+            compile=compile_rollout,
+        )
         self.pge_method = kwargs["pge_method"]
         if self.pge_method == "mixed_weight":
             self.terminal_iter = terminal_iter
@@ -169,45 +162,20 @@ class MPG(AlgorithmBase):
         )
 
         # zero gradient for networks
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        self.networks.q_optimizer.zero_grad()
         self.networks.policy_optimizer.zero_grad()
-        if self.pge_method == "mixed_state":
-            self.networks.q1_model_optimizer.zero_grad()
-            self.networks.q2_model_optimizer.zero_grad()
 
         # compute q loss and backward
         start_time = time.time()
         q_info, backup_info = self.__compute_loss_q(o, a, r, o2, d)
         loss_q = q_info["MPG/loss_q-RL iter"]
-        loss_q.backward()
-        if self.pge_method == "mixed_state":
-            loss_q_model = q_info["MPG/loss_q_model-RL iter"]
-            loss_q_model.backward()
-
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-        for p in self.networks.q2.parameters():
-            p.requires_grad = False
         if self.pge_method == "mixed_state":
-            for p in self.networks.q1_model.parameters():
-                p.requires_grad = False
-            for p in self.networks.q2_model.parameters():
-                p.requires_grad = False
+            loss_q = loss_q + q_info["MPG/loss_q_model-RL iter"]
+        loss_q.backward()
 
-        # compute policy loss and backward
+        # compute policy loss and backward, through the q networks without updating them
         loss_pi, pi_tb_info = self.__compute_loss_pi(data, iteration, backup_info)
-        loss_pi.backward()
-
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
-            p.requires_grad = True
-        if self.pge_method == "mixed_state":
-            for p in self.networks.q1_model.parameters():
-                p.requires_grad = True
-            for p in self.networks.q2_model.parameters():
-                p.requires_grad = True
+        loss_pi.backward(inputs=list(self.networks.policy.parameters()))
 
         # log information
         end_time = time.time()
@@ -215,37 +183,27 @@ class MPG(AlgorithmBase):
         q_tb_info = {k: v.item() for k, v in q_info.items()}
         tb_info.update(q_tb_info)
         tb_info.update(pi_tb_info)
+        tb_info.update(self.rollout.tb_info("MPG"))
         return tb_info
 
-    # compute value backup/target for data-driven policy gradient
+    # compute value backups/targets for data-driven and, for mixed_state, model-driven policy gradient
     def __compute_value_backup(self, o, a, r, o2, d):
         with torch.no_grad():
             pi_targ = self.networks.policy_target(o2)
-            # Target Q-values
-            q1_pi_targ = self.networks.q1_target(o2, pi_targ)
-            q2_pi_targ = self.networks.q2_target(o2, pi_targ)
-            q_pi_targ = torch.min(q1_pi_targ, q2_pi_targ)
+            # Target Q-values, minimum of each pair of twin critics
+            q_pi_targ = self.networks.q_target(o2, pi_targ)
+            q_pi_targ = torch.min(q_pi_targ[0::2], q_pi_targ[1::2])
             backup = r + self.gamma * (1 - d) * q_pi_targ
         return backup
 
-    # compute value backup/target for model-driven policy gradient
-    def __compute_value_backup_model(self, o, a, r, o2, d):
-        with torch.no_grad():
-            pi_targ = self.networks.policy_target(o2)
-            # Target Q-values of model
-            q1_model_pi_targ = self.networks.q1_model_target(o2, pi_targ)
-            q2_model_pi_targ = self.networks.q2_model_target(o2, pi_targ)
-            q_model_pi_targ = torch.min(q1_model_pi_targ, q2_model_pi_targ)
-            backup_model = r + self.gamma * (1 - d) * q_model_pi_targ
-        return backup_model
-
     # compute q loss for data-driven and model-driven policy gradient
     def __compute_loss_q(self, o, a, r, o2, d):
-        q1 = self.networks.q1(o, a)
-        q2 = self.networks.q2(o, a)
+        q = self.networks.q(o, a)
+        q1, q2 = q[0], q[1]
 
         # Bellman backup for Q functions
-        backup_data = self.__compute_value_backup(o, a, r, o2, d)
+        backup = self.__compute_value_backup(o, a, r, o2, d)
+        backup_data = backup[0]
         backup_info = {"backup_data": backup_data}
 
         # MSE loss against Bellman backup for data-driven policy gradient
@@ -262,11 +220,10 @@ class MPG(AlgorithmBase):
         }
 
         if self.pge_method == "mixed_state":
-            q1_model = self.networks.q1_model(o, a)
-            q2_model = self.networks.q2_model(o, a)
+            q1_model, q2_model = q[2], q[3]
 
             # Bellman backup for Q functions
-            backup_model = self.__compute_value_backup_model(o, a, r, o2, d)
+            backup_model = backup[1]
             backup_info.update({"backup_model": backup_model})
 
             # MSE loss against Bellman backup for model-driven policy gradient
@@ -310,34 +267,18 @@ class MPG(AlgorithmBase):
 
     # compute policy loss for data-driven and model-driven policy gradient
     def __compute_loss_pi(self, data, iteration, backup_info):
-        # get data including state, action, reward, next state and done
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
-        info = data
+        o = data["obs"]
         done = torch.zeros(o.shape[0]).bool()
 
         # data return
-        data_return = self.networks.q1(o, self.networks.policy(o))
+        data_return = self.networks.q(o, self.networks.policy(o), index=0)
 
         # model return
-        model_return = torch.zeros(1)
-        for step in range(self.forward_step):
-            if step == 0:
-                a = self.networks.policy(o)
-                o2, r, done, info = self.envmodel.forward(o, a, done, info)
-                model_return = self.reward_scale * r
-            else:
-                o = o2
-                a = self.networks.policy4rollout(o)
-                o2, r, done, info = self.envmodel.forward(o, a, done, info)
-                model_return += self.reward_scale * self.gamma**step * r
-        model_return += self.gamma**self.forward_step * self.networks.q1_target(
-            o2, self.networks.policy(o2)
+        traj = self.rollout(o, done, data, self.forward_step)
+        o2 = traj.obs[-1]
+        model_return = self.reward_scale * discounted_sum(traj.rewards, self.gamma)
+        model_return += self.gamma**self.forward_step * self.networks.q_target(
+            o2, self.networks.policy(o2), index=0
         )
 
         # mixed policy gradient
@@ -380,48 +321,15 @@ class MPG(AlgorithmBase):
 
     # update networks and target networks
     def __update(self, iteration):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
-        if self.pge_method == "mixed_state":
-            self.networks.q1_model_optimizer.step()
-            self.networks.q2_model_optimizer.step()
+        self.networks.q_optimizer.step()
 
         if iteration % self.delay_update == 0:
             self.networks.policy_optimizer.step()
-        self.networks.policy4rollout = deepcopy(self.networks.policy)
-        for p in self.networks.policy4rollout.parameters():
-            p.requires_grad = False
-        with torch.no_grad():
-            polyak = 1 - self.tau
-            for p, p_targ in zip(
-                self.networks.q1.parameters(), self.networks.q1_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.q2.parameters(), self.networks.q2_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.policy.parameters(),
-                self.networks.policy_target.parameters(),
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            if self.pge_method == "mixed_state":
-                for p, p_targ in zip(
-                    self.networks.q1_model.parameters(),
-                    self.networks.q1_model_target.parameters(),
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.q2_model.parameters(),
-                    self.networks.q2_model_target.parameters(),
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(
+            [self.networks.q, self.networks.policy],
+            [self.networks.q_target, self.networks.policy_target],
+            self.tau,
+        )
 
     def local_update(self, data: dict, iteration: int):
         tb_info = self.__compute_gradient(data, iteration)
@@ -432,43 +340,20 @@ class MPG(AlgorithmBase):
         tb_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p._grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p._grad for p in self.networks.q2.parameters()],
+            "q_grad": [p._grad for p in self.networks.q.parameters()],
             "policy_grad": [p._grad for p in self.networks.policy.parameters()],
             "iteration": iteration,
         }
-        if self.pge_method == "mixed_state":
-            update_info.update(
-                {
-                    "q1_model_grad": [
-                        p._grad for p in self.networks.q1_model.parameters()
-                    ],
-                    "q2_model_grad": [
-                        p._grad for p in self.networks.q2_model.parameters()
-                    ],
-                }
-            )
 
         return tb_info, update_info
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
+        q_grad = update_info["q_grad"]
         policy_grad = update_info["policy_grad"]
 
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
+        for p, grad in zip(self.networks.q.parameters(), q_grad):
             p._grad = grad
         for p, grad in zip(self.networks.policy.parameters(), policy_grad):
             p._grad = grad
-
-        if self.pge_method == "mixed_state":
-            q1_model_grad = update_info["q1_model_grad"]
-            q2_model_grad = update_info["q2_model_grad"]
-            for p, grad in zip(self.networks.q1_model.parameters(), q1_model_grad):
-                p._grad = grad
-            for p, grad in zip(self.networks.q2_model.parameters(), q2_model_grad):
-                p._grad = grad
         self.__update(iteration)
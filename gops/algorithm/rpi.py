@@ -17,6 +17,7 @@ __all__ = ["ApproxContainer", "RPI"]
 
 from copy import deepcopy
 import math
+from typing import Optional
 import numpy as np
 import torch
 import torch.nn as nn
@@ -121,6 +122,8 @@ class RPI(AlgorithmBase):
         max_step_update_value: int = 10000,
         print_interval: int = 1,
         learning_rate: float = 1e-3,
+        num_eval_state: Optional[int] = None,
+        eval_chunk_size: int = 10000,
         **kwargs,
     ) -> None:
         """
@@ -129,18 +132,24 @@ class RPI(AlgorithmBase):
             :param: int max_step_update_value: max gradient step in policy evaluation.
             :param: int print_interval: print interval.
             :param: float learning_rate: learning rate of value function.
+            :param: int num_eval_state: number of states for the terminal condition of policy evaluation,
+                one reset batch of the env model if None.
+            :param: int eval_chunk_size: number of states evaluated at once for the terminal condition.
         """
         super().__init__(index, **kwargs)
 
         self.max_newton_iteration = max_newton_iteration
         self.max_step_update_value = max_step_update_value
         self.print_interval = print_interval
+        self.num_eval_state = num_eval_state
+        self.eval_chunk_size = eval_chunk_size
 
         self.num_update_value = 0
         self.norm_hamiltonian_before = 0
         self.norm_hamiltonian_after = self.max_step_update_value**3
         self.step_size_newton = 0
         self.set_state = None
+        self.set_state_terms = None
         self.grad_step = np.ones([int(self.max_newton_iteration), 1], dtype="float32")
 
         self.is_adversary = kwargs['is_adversary']
@@ -176,8 +185,9 @@ class RPI(AlgorithmBase):
         start_time = time.time()
 
         # threshold value to determine whether to continue policy evaluation
-        self.set_state = self.env_model.reset().clone()
-        self.norm_hamiltonian_before = self.__calculate_norm_hamiltonian(self.set_state)
+        self.set_state = self.__reset_set_state()
+        self.set_state_terms = self.__calculate_set_state_terms(self.set_state)
+        self.norm_hamiltonian_before = self.__calculate_norm_hamiltonian()
 
         # policy evaluation and update value network
         for i in range(self.max_step_update_value):
@@ -190,14 +200,13 @@ class RPI(AlgorithmBase):
             self.approximate_optimizer.step()
 
             # judge whether to continue policy evaluation
-            self.norm_hamiltonian_after = self.__calculate_norm_hamiltonian(
-                self.set_state
-            )
+            self.norm_hamiltonian_after = self.__calculate_norm_hamiltonian()
             if not self.continue_evaluation():
                 break
 
         # update target value network
         self.networks.value_target = deepcopy(self.networks.value)
+        self.set_state_terms = None
         end_time = time.time()
 
         # log information
@@ -228,16 +237,67 @@ class RPI(AlgorithmBase):
 
         return loss_value
 
+    # states for policy evaluation terminal condition
+    def __reset_set_state(self):
+        if self.num_eval_state is None:
+            return self.env_model.reset().clone()
+        num_reset = math.ceil(self.num_eval_state / self.env_model.sample_batch_size)
+        set_state = torch.cat([self.env_model.reset() for _ in range(num_reset)])
+        return set_state[: self.num_eval_state]
+
+    def __calculate_set_state_terms(self, set_state):
+        """
+        Split the states into chunks of at most `eval_chunk_size` states, with their
+        utility and dynamics, which are fixed during policy evaluation since the
+        action and adversary only depend on the target value network.
+        :param: torch.tensor set_state: state.
+        :return: list set_state_terms: tuples of state, utility and dynamics of each chunk.
+        """
+        num_chunk = math.ceil(set_state.shape[0] / self.eval_chunk_size)
+        set_state_terms = []
+        # chunks of nearly equal size, since env models treat a batch of one state differently
+        for batch_observation in torch.tensor_split(set_state, num_chunk):
+            batch_input = self.networks.action_and_adversary(batch_observation)
+            batch_utility, batch_delta_state = self.__calculate_utility_and_dynamics(
+                batch_observation, batch_input
+            )
+            set_state_terms.append(
+                (batch_observation.clone(), batch_utility, batch_delta_state)
+            )
+        return set_state_terms
+
     # for policy evaluation terminal condition
-    def __calculate_norm_hamiltonian(self, set_state):
-        # name completion
-        batch_observation = set_state
-        batch_input = self.networks.action_and_adversary(set_state)
+    def __calculate_norm_hamiltonian(self):
+        num_state, abs_hamiltonian_sum = 0, 0.0
+        for batch_observation, batch_utility, batch_delta_state in self.set_state_terms:
+            # first-order value gradient, without graph for backward
+            batch_observation.requires_grad_(True)
+            batch_value = self.networks.value(batch_observation)
+            (batch_delta_value,) = torch.autograd.grad(
+                torch.sum(batch_value), batch_observation
+            )
+            batch_observation.requires_grad_(False)
 
-        # hamiltonian
-        hamiltonian = self.__calculate_hamiltonian(batch_observation, batch_input)
+            hamiltonian = batch_utility + torch.sum(
+                batch_delta_value * batch_delta_state, dim=1
+            )
+            abs_hamiltonian_sum += torch.sum(torch.abs(hamiltonian)).item()
+            num_state += batch_observation.shape[0]
 
-        return hamiltonian.detach().item()
+        return abs_hamiltonian_sum / num_state
+
+    def __calculate_utility_and_dynamics(self, batch_observation, batch_input):
+        done = torch.zeros(
+            batch_observation.shape[0], device=batch_observation.device
+        ).bool()
+        info = {}
+        _, batch_reward, _, next_info = self.env_model.forward(
+            batch_observation.detach(), batch_input, done, info
+        )
+
+        batch_utility = -batch_reward
+        batch_delta_state = next_info["delta_state"]
+        return batch_utility.detach(), batch_delta_state.detach()
 
     def __calculate_hamiltonian(self, batch_observation, batch_input):
         """
@@ -253,18 +313,11 @@ class RPI(AlgorithmBase):
         )
         batch_observation.requires_grad_(False)
 
-        done = torch.zeros(
-            batch_observation.shape[0], device=batch_observation.device
-        ).bool()
-        info = {}
-        _, batch_reward, _, next_info = self.env_model.forward(
-            batch_observation, batch_input, done, info
+        batch_utility, batch_delta_state = self.__calculate_utility_and_dynamics(
+            batch_observation, batch_input
         )
-
-        batch_utility = -batch_reward
-        batch_delta_state = next_info["delta_state"]
         hamiltonian = self.__value_loss_function(
-            batch_delta_value, batch_utility.detach(), batch_delta_state.detach()
+            batch_delta_value, batch_utility, batch_delta_state
         )
 
         return hamiltonian
@@ -279,7 +332,7 @@ class RPI(AlgorithmBase):
         :return: torch.tensor loss: value loss.
         """
         # dV / dt = \partial V / \partial t * f(x, u, w)
-        dv_dt = torch.diag(torch.mm(delta_value, delta_state.t()), 0)
+        dv_dt = torch.sum(delta_value * delta_state, dim=1)
         # hamiltonian
         hamiltonian = utility + dv_dt
         # value loss
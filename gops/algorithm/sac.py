@@ -23,45 +23,44 @@ import torch.nn as nn
 from torch.optim import Adam
 
 from gops.algorithm.base import AlgorithmBase, ApprBase
-from gops.create_pkg.create_apprfunc import create_apprfunc
+from gops.create_pkg.create_apprfunc import create_apprfunc, create_ensemble_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.gops_typing import DataDict
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
     """Approximate function container for SAC.
 
-    Contains one policy and two action values.
+    Contains one policy and two action values, evaluated together as an ensemble.
     """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # create q networks
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1: nn.Module = create_apprfunc(**q_args)
-        self.q2: nn.Module = create_apprfunc(**q_args)
+        self.q: nn.Module = create_ensemble_apprfunc(2, **q_args)
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
         self.policy: nn.Module = create_apprfunc(**policy_args)
 
         # create target networks
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
+        self.q_target = deepcopy(self.q)
+        # checkpoints saved with separate twin critics
+        self.register_legacy_members("q", ("q1", "q2"))
+        self.register_legacy_members("q_target", ("q1_target", "q2_target"))
 
         # set target networks gradients
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target.parameters():
             p.requires_grad = False
 
         # create entropy coefficient
         self.log_alpha = nn.Parameter(torch.tensor(1, dtype=torch.float32))
 
         # create optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["q_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["q_learning_rate"])
+        self.q_optimizer = Adam(self.q.parameters(), lr=kwargs["q_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -119,8 +118,7 @@ class SAC(AlgorithmBase):
         tb_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p.grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p.grad for p in self.networks.q2.parameters()],
+            "q_grad": [p.grad for p in self.networks.q.parameters()],
             "policy_grad": [p.grad for p in self.networks.policy.parameters()],
             "iteration": iteration,
         }
@@ -131,13 +129,10 @@ class SAC(AlgorithmBase):
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
+        q_grad = update_info["q_grad"]
         policy_grad = update_info["policy_grad"]
 
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
+        for p, grad in zip(self.networks.q.parameters(), q_grad):
             p._grad = grad
         for p, grad in zip(self.networks.policy.parameters(), policy_grad):
             p._grad = grad
@@ -146,13 +141,34 @@ class SAC(AlgorithmBase):
 
         self.__update(iteration)
 
+    def get_vmap_losses(self, data: DataDict) -> Tuple[dict, dict]:
+        logits = self.networks.policy(data["obs"])
+        act_dist = self.networks.create_action_distributions(logits)
+        new_act, new_logp = act_dist.rsample()
+        data.update({"new_act": new_act, "new_logp": new_logp})
+
+        loss_q, q1, q2 = self.__compute_loss_q(data)
+        loss_policy, entropy = self.__compute_loss_policy(data)
+        losses = {("q",): loss_q, ("policy",): loss_policy}
+        tb_info = {
+            tb_tags["loss_critic"]: loss_q.detach(),
+            tb_tags["loss_actor"]: loss_policy.detach(),
+            "SAC/critic_avg_q1-RL iter": q1,
+            "SAC/critic_avg_q2-RL iter": q2,
+            "SAC/entropy-RL iter": entropy,
+        }
+        if self.auto_alpha:
+            losses[("log_alpha",)] = self.__compute_loss_alpha(data)
+            tb_info["SAC/alpha-RL iter"] = self.__get_alpha()
+        return losses, tb_info
+
     def __get_alpha(self, requires_grad: bool = False):
         if self.auto_alpha:
             alpha = self.networks.log_alpha.exp()
             if requires_grad:
                 return alpha
             else:
-                return alpha.item()
+                return alpha.detach()
         else:
             return self.alpha
 
@@ -165,24 +181,14 @@ class SAC(AlgorithmBase):
         new_act, new_logp = act_dist.rsample()
         data.update({"new_act": new_act, "new_logp": new_logp})
 
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        self.networks.q_optimizer.zero_grad()
         loss_q, q1, q2 = self.__compute_loss_q(data)
         loss_q.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-        for p in self.networks.q2.parameters():
-            p.requires_grad = False
-
+        # the policy loss passes through the q networks without updating them
         self.networks.policy_optimizer.zero_grad()
         loss_policy, entropy = self.__compute_loss_policy(data)
-        loss_policy.backward()
-
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
-            p.requires_grad = True
+        loss_policy.backward(inputs=list(self.networks.policy.parameters()))
 
         if self.auto_alpha:
             self.networks.alpha_optimizer.zero_grad()
@@ -195,7 +201,7 @@ class SAC(AlgorithmBase):
             "SAC/critic_avg_q1-RL iter": q1.item(),
             "SAC/critic_avg_q2-RL iter": q2.item(),
             "SAC/entropy-RL iter": entropy.item(),
-            "SAC/alpha-RL iter": self.__get_alpha(),
+            "SAC/alpha-RL iter": float(self.__get_alpha()),
             tb_tags["alg_time"]: (time.time() - start_time) * 1000,
         }
 
@@ -209,14 +215,12 @@ class SAC(AlgorithmBase):
             data["obs2"],
             data["done"],
         )
-        q1 = self.networks.q1(obs, act)
-        q2 = self.networks.q2(obs, act)
+        q1, q2 = self.networks.q(obs, act)
         with torch.no_grad():
             next_logits = self.networks.policy(obs2)
             next_act_dist = self.networks.create_action_distributions(next_logits)
             next_act, next_logp = next_act_dist.rsample()
-            next_q1 = self.networks.q1_target(obs2, next_act)
-            next_q2 = self.networks.q2_target(obs2, next_act)
+            next_q1, next_q2 = self.networks.q_target(obs2, next_act)
             next_q = torch.min(next_q1, next_q2)
             backup = rew + (1 - done) * self.gamma * (
                 next_q - self.__get_alpha() * next_logp
@@ -227,8 +231,7 @@ class SAC(AlgorithmBase):
 
     def __compute_loss_policy(self, data: DataDict):
         obs, new_act, new_logp = data["obs"], data["new_act"], data["new_logp"]
-        q1 = self.networks.q1(obs, new_act)
-        q2 = self.networks.q2(obs, new_act)
+        q1, q2 = self.networks.q(obs, new_act)
         loss_policy = (self.__get_alpha() * new_logp - torch.min(q1, q2)).mean()
         entropy = -new_logp.detach().mean()
         return loss_policy, entropy
@@ -241,23 +244,11 @@ class SAC(AlgorithmBase):
         return loss_alpha
 
     def __update(self, iteration: int):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
+        self.networks.q_optimizer.step()
 
         self.networks.policy_optimizer.step()
 
         if self.auto_alpha:
             self.networks.alpha_optimizer.step()
 
-        with torch.no_grad():
-            polyak = 1 - self.tau
-            for p, p_targ in zip(
-                self.networks.q1.parameters(), self.networks.q1_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.q2.parameters(), self.networks.q2_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(self.networks.q, self.networks.q_target, self.tau)
@@ -25,8 +25,10 @@ import numpy as np
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
@@ -80,6 +82,7 @@ class SPIL(AlgorithmBase):
     :param int pev_step: initial policy evaluation step.
     :param int pim_step: initial policy improvement step.
     :param int forward_step: predictive step in virtual horizon.
+    :param bool compile_rollout: whether to compile the model rollout.
     """
 
     def __init__(
@@ -90,11 +93,18 @@ class SPIL(AlgorithmBase):
         pev_step: int = 1,
         pim_step: int = 1,
         forward_step: int = 25,
+        compile_rollout: bool = True,
         **kwargs: Any,
     ):
         super().__init__(index, **kwargs)
         self.networks = ApproxContainer(**kwargs)
         self.envmodel = create_env_model(**kwargs)
+        self.rollout = ModelRollout(
+            self.envmodel,
+            self.networks.policy,
+            virtual_time=False,
+            compile=compile_rollout,
+        )
         self.gamma = gamma
         self.tau = tau
         self.pev_step = pev_step
@@ -148,79 +158,54 @@ class SPIL(AlgorithmBase):
         for net_name in update_list:
             self.networks.optimizer_dict[net_name].step()
 
-        with torch.no_grad():
-            for net_name in update_list:
-                for p, p_targ in zip(
-                    self.networks.net_dict[net_name].parameters(),
-                    self.networks.target_net_dict[net_name].parameters(),
-                ):
-                    p_targ.data.mul_(1 - tau)
-                    p_targ.data.add_(tau * p.data)
+        polyak_update(
+            [self.networks.net_dict[net_name] for net_name in update_list],
+            [self.networks.target_net_dict[net_name] for net_name in update_list],
+            tau,
+        )
 
     def __compute_gradient(self, data: dict, iteration: int) -> list:
         update_list = []
 
         start_time = time.time()
-        self.networks.v.zero_grad()
-        loss_v, v = self.__compute_loss_v(deepcopy(data))
-        loss_v.backward()
-        self.tb_info[tb_tags["loss_critic"]] = loss_v.item()
-        self.tb_info[tb_tags["critic_avg_value"]] = v.item()
-        update_list.append("v")
-        self.networks.policy.zero_grad()
-        loss_policy = self.__compute_loss_policy(deepcopy(data))
-        loss_policy.backward()
-        self.tb_info[tb_tags["loss_actor"]] = loss_policy.item()
-        update_list.append("policy")
+        # value and policy losses share one rollout of the batch
+        with self.rollout.shared():
+            self.networks.v.zero_grad()
+            loss_v, v = self.__compute_loss_v(data)
+            loss_v.backward()
+            self.tb_info[tb_tags["loss_critic"]] = loss_v.item()
+            self.tb_info[tb_tags["critic_avg_value"]] = v.item()
+            update_list.append("v")
+            self.networks.policy.zero_grad()
+            loss_policy = self.__compute_loss_policy(data)
+            loss_policy.backward()
+            self.tb_info[tb_tags["loss_actor"]] = loss_policy.item()
+            update_list.append("policy")
 
         end_time = time.time()
 
         self.tb_info[tb_tags["alg_time"]] = (end_time - start_time) * 1000
+        self.tb_info.update(self.rollout.tb_info("SPIL"))
 
         return update_list
 
     def __compute_loss_v(self, data: dict):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
+        o, d = data["obs"], data["done"]
         v = self.networks.v(o)
-        traj_issafe = torch.ones(o.shape[0], self.n_constraint)
-        info = data
+        # rolled out with gradient, so that the policy loss can reuse it
+        traj = self.rollout(o, d, data, self.forward_step)
 
         with torch.no_grad():
-            for step in range(self.forward_step):
-                if step == 0:
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                    r_sum = self.reward_scale * r
-                    traj_issafe *= info["constraint"] <= 0
-
-                else:
-                    o = o2
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                    r_sum += self.reward_scale * self.gamma**step * r
-                    traj_issafe *= info["constraint"] <= 0
-
-            r_sum += self.gamma**self.forward_step * self.networks.v_target(o2)
+            r_sum = self.reward_scale * discounted_sum(traj.rewards, self.gamma)
+            r_sum += self.gamma**self.forward_step * self.networks.v_target(
+                traj.obs[-1]
+            )
+            traj_issafe = (traj.constraints <= 0).all(0).float()
         loss_v = ((v - r_sum) ** 2).mean()
         self.safe_prob = traj_issafe.mean(0).numpy()
         return loss_v, torch.mean(v)
 
     def __compute_loss_policy(self, data: dict):
-        o, a, r, c, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["constraint"],
-            data["obs2"],
-            data["done"],
-        )
-
         def Phi(y):
             # transfer constraint to cost
             m1 = 1
@@ -231,25 +216,9 @@ class SPIL(AlgorithmBase):
             )
             return sig
 
-        info = data
-        for step in range(self.forward_step):
-            if step == 0:
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                c = info["constraint"]
-                c = Phi(c)
-                r_sum = self.reward_scale * r
-                c_sum = c
-                c_mul = c
-            else:
-                o = o2
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                c = info["constraint"]
-                c = Phi(c)
-                r_sum = r_sum + self.reward_scale * self.gamma**step * r
-                c_sum = c_sum + c
-                c_mul = c_mul * c
+        traj = self.rollout(data["obs"], data["done"], data, self.forward_step)
+        r_sum = self.reward_scale * discounted_sum(traj.rewards, self.gamma)
+        c_mul = torch.prod(Phi(traj.constraints), dim=0)
         w_r, w_c = self.__spil_get_weight()
         loss_pi = (w_r * r_sum + (c_mul * torch.Tensor(w_c)).sum(1)).mean()
         return -loss_pi
@@ -22,39 +22,38 @@ import torch
 from torch.optim import Adam
 
 from gops.algorithm.base import AlgorithmBase, ApprBase
-from gops.create_pkg.create_apprfunc import create_apprfunc
+from gops.create_pkg.create_apprfunc import create_apprfunc, create_ensemble_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.target_update import polyak_update
 
 
 class ApproxContainer(ApprBase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # create value network
+        # create value networks, evaluated together as an ensemble
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1 = create_apprfunc(**q_args)
-        self.q2 = create_apprfunc(**q_args)
+        self.q = create_ensemble_apprfunc(2, **q_args)
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
         self.policy = create_apprfunc(**policy_args)
 
         #  create target networks
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
+        self.q_target = deepcopy(self.q)
         self.policy_target = deepcopy(self.policy)
+        # checkpoints saved with separate twin critics
+        self.register_legacy_members("q", ("q1", "q2"))
+        self.register_legacy_members("q_target", ("q1_target", "q2_target"))
 
         # set target network gradients
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target.parameters():
             p.requires_grad = False
         for p in self.policy_target.parameters():
             p.requires_grad = False
 
         # set optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
+        self.q_optimizer = Adam(self.q.parameters(), lr=kwargs["value_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -106,8 +105,7 @@ class TD3(AlgorithmBase):
     def __compute_gradient(self, data: dict, iteration):
         tb_info = dict()
         start_time = time.time()
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        self.networks.q_optimizer.zero_grad()
         self.networks.policy_optimizer.zero_grad()
 
         if not self.per_flag:
@@ -135,18 +133,9 @@ class TD3(AlgorithmBase):
             )
             loss_q.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-        for p in self.networks.q2.parameters():
-            p.requires_grad = False
-
+        # the policy loss passes through the q networks without updating them
         loss_policy = self.__compute_loss_pi(o)
-        loss_policy.backward()
-
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
-            p.requires_grad = True
+        loss_policy.backward(inputs=list(self.networks.policy.parameters()))
 
         end_time = time.time()
         tb_info[tb_tags["loss_critic"]] = loss_q.item()
@@ -159,9 +148,26 @@ class TD3(AlgorithmBase):
         else:
             return tb_info
 
+    def get_vmap_losses(self, data: dict) -> Tuple[dict, dict]:
+        assert not self.per_flag, "prioritized replay is not supported by vmap losses"
+        o, a, r, o2, d = (
+            data["obs"],
+            data["act"],
+            data["rew"] * self.reward_scale,
+            data["obs2"],
+            data["done"],
+        )
+        loss_q, loss_q1, loss_q2 = self.__compute_loss_q(o, a, r, o2, d)
+        loss_policy = self.__compute_loss_pi(o)
+        tb_info = {
+            tb_tags["loss_critic"]: loss_q.detach(),
+            tb_tags["critic_avg_value"]: loss_q.detach(),
+            tb_tags["loss_actor"]: loss_policy.detach(),
+        }
+        return {("q",): loss_q, ("policy",): loss_policy}, tb_info
+
     def __compute_loss_q(self, o, a, r, o2, d):
-        q1 = self.networks.q1(o, a)
-        q2 = self.networks.q2(o, a)
+        q1, q2 = self.networks.q(o, a)
 
         # Bellman backup for Q functions
         with torch.no_grad():
@@ -177,8 +183,7 @@ class TD3(AlgorithmBase):
             )
 
             # Target Q-values
-            q1_pi_targ = self.networks.q1_target(o2, a2)
-            q2_pi_targ = self.networks.q2_target(o2, a2)
+            q1_pi_targ, q2_pi_targ = self.networks.q_target(o2, a2)
             q_pi_targ = torch.min(q1_pi_targ, q2_pi_targ)
             backup = r + self.gamma * (1 - d) * q_pi_targ
 
@@ -190,8 +195,7 @@ class TD3(AlgorithmBase):
         return loss_q, loss_q1, loss_q2
 
     def __compute_loss_q_per(self, o, a, r, o2, d, idx, weight):
-        q1 = self.networks.q1(o, a)
-        q2 = self.networks.q2(o, a)
+        q1, q2 = self.networks.q(o, a)
 
         # Bellman backup for Q functions
         with torch.no_grad():
@@ -207,8 +211,7 @@ class TD3(AlgorithmBase):
             )
 
             # Target Q-values
-            q1_pi_targ = self.networks.q1_target(o2, a2)
-            q2_pi_targ = self.networks.q2_target(o2, a2)
+            q1_pi_targ, q2_pi_targ = self.networks.q_target(o2, a2)
             q_pi_targ = torch.min(q1_pi_targ, q2_pi_targ)
             backup = r + self.gamma * (1 - d) * q_pi_targ
 
@@ -221,34 +224,20 @@ class TD3(AlgorithmBase):
         return loss_q, loss_q1, loss_q2, abs_err
 
     def __compute_loss_pi(self, o):
-        q1_pi = self.networks.q1(o, self.networks.policy(o))
+        q1_pi = self.networks.q(o, self.networks.policy(o), index=0)
         return -q1_pi.mean()
 
     def __update(self, iteration):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
+        self.networks.q_optimizer.step()
 
         if iteration % self.delay_update == 0:
             self.networks.policy_optimizer.step()
 
-        with torch.no_grad():
-            polyak = 1 - self.tau
-            for p, p_targ in zip(
-                self.networks.q1.parameters(), self.networks.q1_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.q2.parameters(), self.networks.q2_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.policy.parameters(),
-                self.networks.policy_target.parameters(),
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(
+            [self.networks.q, self.networks.policy],
+            [self.networks.q_target, self.networks.policy_target],
+            self.tau,
+        )
 
     def local_update(self, data: dict, iteration: int):
         extra_info = self.__compute_gradient(data, iteration)
@@ -259,8 +248,7 @@ class TD3(AlgorithmBase):
         extra_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p._grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p._grad for p in self.networks.q2.parameters()],
+            "q_grad": [p._grad for p in self.networks.q.parameters()],
             "policy_grad": [p._grad for p in self.networks.policy.parameters()],
             "iteration": iteration,
         }
@@ -269,13 +257,10 @@ class TD3(AlgorithmBase):
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
+        q_grad = update_info["q_grad"]
         policy_grad = update_info["policy_grad"]
 
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
+        for p, grad in zip(self.networks.q.parameters(), q_grad):
             p._grad = grad
         for p, grad in zip(self.networks.policy.parameters(), policy_grad):
             p._grad = grad
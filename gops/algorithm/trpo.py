@@ -17,14 +17,14 @@
 __all__ = ["TRPO"]
 
 import time
-from copy import deepcopy
-from typing import Callable, Tuple
+import warnings
+from typing import Callable, Optional, Tuple
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.func import functional_call, vmap
 from torch.optim import Adam
-import torch.autograd
 
 from gops.algorithm.base import AlgorithmBase, ApprBase
 from gops.create_pkg.create_apprfunc import create_apprfunc
@@ -95,6 +95,9 @@ class TRPO(AlgorithmBase):
         self.alpha = alpha
         self.max_search = max_search
         self.train_v_iters = train_v_iters
+        # whether the line search candidates are evaluated by one vmapped call,
+        # disabled for policies without batching rules, e.g. RNN
+        self.batched_search = True
         self.networks = ApproxContainer(**kwargs)
         self.value_optimizer = Adam(
             self.networks.value.parameters(), lr=value_learning_rate
@@ -124,76 +127,67 @@ class TRPO(AlgorithmBase):
         if self.norm_adv:
             adv = (adv - adv.mean()) / (adv.std() + EPSILON)
 
+        # policy parameters as one flat vector, passed to functional calls as views of it
+        policy = self.networks.policy
+        names, shapes = zip(*((n, p.shape) for n, p in policy.named_parameters()))
+        numels = [shape.numel() for shape in shapes]
+        weight_old = nn.utils.convert_parameters.parameters_to_vector(
+            policy.parameters()
+        ).detach()
+        weight = weight_old.clone().requires_grad_()
+
+        def policy_logits(flat_weight: torch.Tensor):
+            params = {
+                name: w.view(shape)
+                for name, w, shape in zip(names, torch.split(flat_weight, numels), shapes)
+            }
+            return functional_call(policy, params, (obs,))
+
         # pi
-        with torch.no_grad():
-            logits_old = self.networks.policy(obs)
-        pi_old = self.networks.create_action_distributions(logits=logits_old)
+        logits = policy_logits(weight)
+        pi = self.networks.create_action_distributions(logits=logits)
+        pi_old = self.networks.create_action_distributions(logits=logits.detach())
         logp_old = pi_old.log_prob(act)
 
         def get_surrogate_advantage(logp: torch.Tensor):
-            return torch.mean(torch.exp(logp - logp_old) * adv)
+            return torch.mean(torch.exp(logp - logp_old) * adv, dim=-1)
 
-        logits = self.networks.policy(obs)
-        pi = self.networks.create_action_distributions(logits=logits)
         surrogate_advantage = get_surrogate_advantage(pi.log_prob(act))
-        g_params = torch.autograd.grad(
-            surrogate_advantage, self.networks.policy.parameters(), retain_graph=True
-        )
-        # FIXME: CNN layer's g would be non-contiguous, needing further investigation
-        # Current workaround is making sure it's contiguous
-        # See also: Two more `contiguous` in `hvp`
-        g_params = [g_param.contiguous() for g_param in g_params]
-        g_vec = nn.utils.convert_parameters.parameters_to_vector(g_params)
+        (g_vec,) = torch.autograd.grad(surrogate_advantage, weight, retain_graph=True)
         x0_vec = torch.zeros_like(g_vec)
         d_kl = pi.kl_divergence(pi_old).mean()
-
-        def hvp(f: torch.Tensor, x: torch.Tensor):
-            g_params = torch.autograd.grad(
-                f, self.networks.policy.parameters(), create_graph=True
-            )
-            g_params = [g_param.contiguous() for g_param in g_params]
-            g_vec = nn.utils.convert_parameters.parameters_to_vector(g_params)
-            hvp_params = torch.autograd.grad(
-                torch.dot(g_vec, x),
-                self.networks.policy.parameters(),
-                retain_graph=True,
-            )
-            hvp_params = [hvp_param.contiguous() for hvp_param in hvp_params]
-            return nn.utils.convert_parameters.parameters_to_vector(hvp_params)
+        # gradient of KL divergence, built once and differentiated again by every product
+        (kl_grad,) = torch.autograd.grad(d_kl, weight, create_graph=True)
 
         def cg_func(x: torch.Tensor):
-            return hvp(d_kl, x).add_(x, alpha=self.damping_factor)
+            (hvp,) = torch.autograd.grad(kl_grad, weight, x, retain_graph=True)
+            return hvp.add_(x, alpha=self.damping_factor)
 
         x_vec, _ = self._conjugate_gradient(
             cg_func, g_vec, x0_vec, self.rtol, self.atol, self.max_cg
         )
 
-        weight_old = nn.utils.convert_parameters.parameters_to_vector(
-            self.networks.policy.parameters()
-        )
-        new_policy = self._create_new_policy()
         trpo_step = (
             torch.sqrt(2 * self.delta / (torch.dot(g_vec, x_vec) + EPSILON)) * x_vec
         )
 
-        def update_policy(alpha: float):
-            weight_new = weight_old.add(trpo_step, alpha=alpha)
-            nn.utils.convert_parameters.vector_to_parameters(
-                weight_new, new_policy.parameters()
-            )
+        # backtracking line search, with all candidates evaluated in one batched call
+        # if the policy supports it
+        alphas = self.alpha ** torch.arange(self.max_search, dtype=weight_old.dtype)
+        weight_new = weight_old + alphas.unsqueeze(1) * trpo_step
 
-        for i in range(self.max_search):
-            update_policy(self.alpha**i)
-            logits_new = new_policy(obs)
+        def is_accepted(logits_new: torch.Tensor):
             pi_new = self.networks.create_action_distributions(logits=logits_new)
-            logp_new = pi_new.log_prob(act)
-
-            if (
-                get_surrogate_advantage(logp_new) > 0
-                and pi_new.kl_divergence(pi_old).mean() < self.delta
-            ):
-                self.networks.policy.load_state_dict(new_policy.state_dict())
-                break
+            return (get_surrogate_advantage(pi_new.log_prob(act)) > 0) & (
+                pi_new.kl_divergence(pi_old).mean(-1) < self.delta
+            )
+
+        with torch.no_grad():
+            accepted = self._search(policy_logits, is_accepted, weight_new)
+        if accepted is not None:
+            nn.utils.convert_parameters.vector_to_parameters(
+                weight_new[accepted].clone(), policy.parameters()
+            )
         else:
             print("fail to improve policy!")
 
@@ -216,11 +210,26 @@ class TRPO(AlgorithmBase):
         tb_info[tb_tags["loss_actor"]] = -surrogate_advantage.item()
         return tb_info
 
-    def _create_new_policy(self):
-        new_policy = deepcopy(self.networks.policy)
-        for p in new_policy.parameters():
-            p.requires_grad_(False)
-        return new_policy
+    def _search(
+        self,
+        policy_logits: Callable[[torch.Tensor], torch.Tensor],
+        is_accepted: Callable[[torch.Tensor], torch.Tensor],
+        weight_new: torch.Tensor,
+    ) -> Optional[int]:
+        """Index of the first accepted candidate weight, or None if none is accepted."""
+        if self.batched_search:
+            try:
+                accepted = torch.nonzero(is_accepted(vmap(policy_logits)(weight_new)))
+                return accepted[0, 0].item() if len(accepted) > 0 else None
+            except Exception as e:
+                warnings.warn(
+                    "Failed to batch the line search, searching serially: {}".format(e)
+                )
+                self.batched_search = False
+        for i, weight in enumerate(weight_new):
+            if is_accepted(policy_logits(weight)):
+                return i
+        return None
 
     @staticmethod
     def _conjugate_gradient(
@@ -22,6 +22,8 @@ __all__ = [
     "ActionValueDistri",
     "StochaPolicyDis",
     "StateValue",
+    "ActionValueEnsemble",
+    "ActionValueDistriEnsemble",
 ]
 
 import numpy as np
@@ -41,6 +43,64 @@ def mlp(sizes, activation, output_activation=nn.Identity):
     return nn.Sequential(*layers)
 
 
+# Linear layers of an ensemble, stored as stacked weights
+class StackedLinear(nn.Module):
+    """
+    Linear layers of `ensemble_size` members evaluated by one batched matmul.
+    Input: features of all members, of shape (ensemble_size, ..., in_features),
+        or of the member of `index` only, of shape (..., in_features).
+    Output: outputs of all members, of shape (ensemble_size, ..., out_features),
+        or of the member of `index` only, of shape (..., out_features).
+    """
+
+    def __init__(self, ensemble_size, in_features, out_features):
+        super().__init__()
+        # members are initialized as separate nn.Linear layers
+        layers = [nn.Linear(in_features, out_features) for _ in range(ensemble_size)]
+        self.weight = nn.Parameter(torch.stack([l.weight.detach().t() for l in layers]))
+        self.bias = nn.Parameter(torch.stack([l.bias.detach()[None] for l in layers]))
+
+    def forward(self, x, index=None):
+        n, i, o = self.weight.shape
+        if index is not None:
+            y = torch.addmm(self.bias[index], x.reshape(-1, i), self.weight[index])
+        else:
+            y = torch.baddbmm(self.bias, x.reshape(n, -1, i), self.weight)
+        return y.reshape(*x.shape[:-1], o)
+
+
+class StackedSequential(nn.Sequential):
+    """Sequential of stacked layers, evaluating all members or the member of `index` only."""
+
+    def forward(self, x, index=None):
+        for layer in self:
+            x = layer(x, index) if isinstance(layer, StackedLinear) else layer(x)
+        return x
+
+
+# Stack the state dicts of members saved as separate MLP apprfuncs
+def stack_member_state_dicts(ensemble, member_state_dicts):
+    state_dict = {}
+    for name, module in ensemble.named_modules():
+        if isinstance(module, StackedLinear):
+            state_dict[name + ".weight"] = torch.stack(
+                [sd[name + ".weight"].t() for sd in member_state_dicts]
+            )
+            state_dict[name + ".bias"] = torch.stack(
+                [sd[name + ".bias"][None] for sd in member_state_dicts]
+            )
+    return state_dict
+
+
+# Define MLP function of an ensemble
+def mlp_ensemble(sizes, activation, ensemble_size, output_activation=nn.Identity):
+    layers = []
+    for j in range(len(sizes) - 1):
+        act = activation if j < len(sizes) - 2 else output_activation
+        layers += [StackedLinear(ensemble_size, sizes[j], sizes[j + 1]), act()]
+    return StackedSequential(*layers)
+
+
 # Count parameter number of MLP
 def count_vars(module):
     return sum([np.prod(p.shape) for p in module.parameters()])
@@ -245,6 +305,40 @@ class ActionValue(nn.Module, Action_Distribution):
         return torch.squeeze(q, -1)
 
 
+class ActionValueEnsemble(nn.Module, Action_Distribution):
+    """
+    Approximated function of an ensemble of action-value functions, e.g. twin critics.
+    Input: observation, action.
+    Output: action-values of all members, stacked along the first dim, or
+        action-value of the member of `index` only.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        obs_dim = kwargs["obs_dim"]
+        act_dim = kwargs["act_dim"]
+        hidden_sizes = kwargs["hidden_sizes"]
+        self.ensemble_size = kwargs["ensemble_size"]
+        self.q = mlp_ensemble(
+            [obs_dim + act_dim] + list(hidden_sizes) + [1],
+            get_activation_func(kwargs["hidden_activation"]),
+            self.ensemble_size,
+            get_activation_func(kwargs["output_activation"]),
+        )
+        self.action_distribution_cls = kwargs["action_distribution_cls"]
+
+    def stack_member_state_dicts(self, member_state_dicts):
+        """State dict of the ensemble from the state dicts of its members as separate apprfuncs."""
+        return stack_member_state_dicts(self, member_state_dicts)
+
+    def forward(self, obs, act, index=None):
+        x = torch.cat([obs, act], dim=-1)
+        if index is None:
+            x = x.expand(self.ensemble_size, *x.shape)
+        q = self.q(x, index)
+        return torch.squeeze(q, -1)
+
+
 class ActionValueDis(nn.Module, Action_Distribution):
     """
     Approximated function of action-value function for discrete action space.
@@ -296,6 +390,42 @@ class ActionValueDistri(nn.Module):
         return torch.cat((value_mean, value_log_std), dim=-1)
 
 
+class ActionValueDistriEnsemble(nn.Module):
+    """
+    Approximated function of an ensemble of distributed action-value functions.
+    Input: observation, action.
+    Output: parameters of action-value distributions of all members, stacked along
+        the first dim, or of the member of `index` only.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        obs_dim = kwargs["obs_dim"]
+        act_dim = kwargs["act_dim"]
+        hidden_sizes = kwargs["hidden_sizes"]
+        self.ensemble_size = kwargs["ensemble_size"]
+        self.q = mlp_ensemble(
+            [obs_dim + act_dim] + list(hidden_sizes) + [2],
+            get_activation_func(kwargs["hidden_activation"]),
+            self.ensemble_size,
+            get_activation_func(kwargs["output_activation"]),
+        )
+
+    def stack_member_state_dicts(self, member_state_dicts):
+        """State dict of the ensemble from the state dicts of its members as separate apprfuncs."""
+        return stack_member_state_dicts(self, member_state_dicts)
+
+    def forward(self, obs, act, index=None):
+        x = torch.cat([obs, act], dim=-1)
+        if index is None:
+            x = x.expand(self.ensemble_size, *x.shape)
+        logits = self.q(x, index)
+        value_mean, value_std = torch.chunk(logits, chunks=2, dim=-1)
+        value_log_std = torch.nn.functional.softplus(value_std)
+
+        return torch.cat((value_mean, value_log_std), dim=-1)
+
+
 class StochaPolicyDis(ActionValueDis, Action_Distribution):
     """
     Approximated function of stochastic policy for discrete action space.
@@ -81,6 +81,8 @@ def create_alg(**kwargs) -> object:
     if (
         trainer_name is None
         or trainer_name.startswith("off_serial")
+        or trainer_name.startswith("off_ddp")
+        or trainer_name.startswith("off_vmap")
         or trainer_name.startswith("on_serial")
         or trainer_name.startswith("on_sync")
     ):
@@ -14,6 +14,9 @@ import os
 from dataclasses import dataclass, field
 from typing import Callable, Dict
 
+import torch
+from torch import nn
+
 from gops.utils.gops_path import apprfunc_path
 
 
@@ -70,3 +73,42 @@ def create_apprfunc(**kwargs) -> object:
     apprfunc = apprfunc_creator(**_kwargs)
 
     return apprfunc
+
+
+class ApprfuncEnsemble(nn.Module):
+    """
+    Ensemble of approximate functions without a stacked implementation,
+    evaluated one by one with outputs stacked along a new first dim, or
+    evaluating the member of `index` only.
+    """
+
+    def __init__(self, members):
+        super().__init__()
+        self.members = nn.ModuleList(members)
+
+    def forward(self, *args, index=None):
+        if index is not None:
+            return self.members[index](*args)
+        return torch.stack([member(*args) for member in self.members])
+
+    def stack_member_state_dicts(self, member_state_dicts):
+        """State dict of the ensemble from the state dicts of its members as separate apprfuncs."""
+        return {
+            "members.{}.{}".format(k, name): v
+            for k, state_dict in enumerate(member_state_dicts)
+            for name, v in state_dict.items()
+        }
+
+
+def create_ensemble_apprfunc(ensemble_size: int, **kwargs) -> object:
+    """
+    Create `ensemble_size` approximate functions of the same arguments, e.g. twin
+    critics, which are evaluated in one call and return their outputs stacked
+    along a new first dim, or the output of one member if called with `index`.
+    The `<name>Ensemble` of the apprfunc type, storing the members as stacked
+    weights, is used if registered.
+    """
+    name = kwargs["name"] + "Ensemble"
+    if kwargs["apprfunc"].lower() + "_" + name in registry:
+        return create_apprfunc(**dict(kwargs, name=name, ensemble_size=ensemble_size))
+    return ApprfuncEnsemble([create_apprfunc(**kwargs) for _ in range(ensemble_size)])
@@ -66,7 +66,13 @@ def create_sampler(**kwargs,) -> object:
         raise RuntimeError(f"{spec_.sampler_name} registered but entry_point is not specified")
 
     trainer_name = _kwargs.get("trainer", None)
-    if trainer_name is None or trainer_name.startswith("off_serial") or trainer_name.startswith("on_serial"):
+    if (
+        trainer_name is None
+        or trainer_name.startswith("off_serial")
+        or trainer_name.startswith("off_ddp")
+        or trainer_name.startswith("off_vmap")
+        or trainer_name.startswith("on_serial")
+    ):
         sam = sampler_creator(**_kwargs)
     elif (
         trainer_name.startswith("off_async")
@@ -0,0 +1,132 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Background replay batch prefetcher for off-policy trainers
+
+
+__all__ = ["BatchPrefetcher"]
+
+import queue
+import threading
+import time
+
+import torch
+
+from gops.utils.tensorboard_setup import tb_tags
+
+
+class BatchPrefetcher:
+    """
+    Wrap a replay buffer and sample its batches ahead of time on a background thread.
+
+    The worker thread keeps up to `num_prefetch` batches in a bounded queue, so
+    index generation, gathering and tensor conversion of the next batches overlap
+    with the gradient step of the learner. Buffer writes, priority updates and
+    snapshots go through the wrapper and are serialized with sampling by a lock;
+    other attributes are forwarded to the wrapped buffer. With prioritized replay,
+    a batch is drawn with priorities up to `num_prefetch` updates old. An error
+    of the worker, e.g. of sampling or pinning, is raised by `sample_batch`.
+
+    Args:
+        buffer: replay buffer to sample from.
+        batch_size (int): size of replay batches.
+        num_prefetch (int): capacity of the batch queue.
+        pin_memory (bool): put batch tensors in page-locked memory for faster
+            host-to-device copies.
+    """
+
+    def __init__(self, buffer, batch_size: int, num_prefetch: int = 2, pin_memory: bool = False):
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.pin_memory = pin_memory
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=num_prefetch)
+        self.stop_event = threading.Event()
+
+        self.num_get = 0
+        self.num_starved = 0
+        self.wait_time = 0.0
+
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["buffer"], name)
+
+    def _worker(self):
+        try:
+            while not self.stop_event.is_set():
+                with self.lock:
+                    batch = self.buffer.sample_batch(self.batch_size)
+                if self.pin_memory:
+                    for k, v in batch.items():
+                        if isinstance(v, torch.Tensor):
+                            batch[k] = v.pin_memory()
+                self._put(batch)
+        except Exception as e:
+            # handed to the learner, which raises it instead of waiting forever
+            self._put(e)
+
+    def _put(self, item) -> None:
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+    def _get(self):
+        while True:
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                # nothing more is put once the worker has stopped
+                if not self.thread.is_alive() and self.queue.empty():
+                    raise RuntimeError("The batch prefetching thread has stopped")
+
+    def sample_batch(self, batch_size: int) -> dict:
+        assert batch_size == self.batch_size, "BatchPrefetcher samples batches of a fixed size"
+        self.num_get += 1
+        try:
+            batch = self.queue.get_nowait()
+        except queue.Empty:
+            self.num_starved += 1
+            start_time = time.perf_counter()
+            batch = self._get()
+            self.wait_time += time.perf_counter() - start_time
+        if isinstance(batch, Exception):
+            raise RuntimeError("Failed to prefetch a replay batch") from batch
+        return batch
+
+    def add_batch(self, samples) -> None:
+        with self.lock:
+            self.buffer.add_batch(samples)
+
+    def update_batch(self, idxes, priorities) -> None:
+        with self.lock:
+            self.buffer.update_batch(idxes, priorities)
+
+    def save(self, path: str) -> None:
+        with self.lock:
+            self.buffer.save(path)
+
+    def get_tb_info(self) -> dict:
+        """Starvation statistics since the last call."""
+        tb_info = {
+            tb_tags["prefetch_starvation"]: self.num_starved / max(self.num_get, 1),
+            tb_tags["prefetch_wait_time"]: self.wait_time / max(self.num_get, 1) * 1000,
+            tb_tags["prefetch_queue_size"]: self.queue.qsize(),
+        }
+        self.num_get = 0
+        self.num_starved = 0
+        self.wait_time = 0.0
+        return tb_info
+
+    def close(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
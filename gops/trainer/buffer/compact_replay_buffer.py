@@ -0,0 +1,160 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer storing each state once
+
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from gops.trainer.buffer.replay_buffer import ReplayBuffer, rows_equal
+
+__all__ = ["CompactReplayBuffer"]
+
+
+class CompactReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer with uniform sampling probability that stores each state once.
+
+    Instead of keeping `obs2` and `next_*` infos, the next state of the transition
+    in slot i is read from slot i + 1. A transition is followed by its successor
+    when the next sample continues the same episode, which is detected from the
+    data itself: the sample is not done and its next observation and infos equal
+    the observation and infos of the following sample. Otherwise an extra slot
+    holding only the next observation and infos is written after it. Such slots,
+    and the latest sample while its successor is unknown, are flagged invalid and
+    never sampled as transitions.
+
+    Samplers emit consecutive steps of one environment next to each other, so
+    only episode ends and batch boundaries cost an extra slot and the buffer
+    holds about twice as many transitions as ReplayBuffer in the same memory.
+    `buffer_max_size` counts slots.
+    """
+
+    def __init__(self, index=0, **kwargs):
+        super().__init__(index, **kwargs)
+        # zero-filled arrays are not backed by memory until written to,
+        # so dropping the duplicated fields here never touches them
+        # (current, next) array names of the fields describing a state
+        self.state_pairs = [("obs", "obs2")]
+        for k in self.additional_info.keys():
+            self.state_pairs.extend(
+                zip(self._array_names(k), self._array_names("next_" + k))
+            )
+        for _, next_name in self.state_pairs:
+            del self.buf[next_name]
+        self.buf["valid"] = np.zeros(self.max_size, dtype=np.bool_)
+        self.num_valid = 0
+        # next state of the latest sample, kept until it is known whether
+        # the following sample continues the episode
+        self.pending: Optional[dict] = None
+
+    def load(self, path: str) -> None:
+        super().load(path)
+        self.num_valid = int(self.buf["valid"][:self.size].sum())
+        self.pending = None
+
+    def add_batch(self, samples: Union[Sequence, dict]) -> None:
+        if not isinstance(samples, dict):
+            samples = self.experiences_to_batch(samples)
+        samples = self._flatten_batch(samples)
+        num = len(samples["rew"])
+        if num == 0:
+            return
+        done = np.asarray(samples["done"]).astype(np.bool_)
+
+        if self.pending is not None:
+            pending_slot = (self.ptr - 1) % self.max_size
+            first = {k: v[:1] for k, v in samples.items()}
+            if not self._continues(self.pending, first, np.zeros(1, dtype=np.bool_))[0]:
+                self._store_terminal(self.pending)
+            # the slot after the pending sample now holds its next state
+            self._set_valid(np.array([pending_slot]), True)
+            self.pending = None
+
+        # boundary[j]: sample j is not followed by its successor in this batch
+        boundary = np.ones(num, dtype=np.bool_)
+        boundary[:-1] = ~self._continues(
+            {k: v[:-1] for k, v in samples.items()},
+            {k: v[1:] for k, v in samples.items()},
+            done[:-1],
+        )
+        last_open = not done[-1]
+        boundary[-1] = not last_open
+
+        # slot layout: every sample, each boundary followed by a terminal slot;
+        # src indexes the current part [0, num) or the next part [num, 2 * num)
+        row_pos = np.arange(num) + np.concatenate(([0], np.cumsum(boundary)[:-1]))
+        total = num + int(boundary.sum())
+        is_terminal = np.ones(total, dtype=np.bool_)
+        is_terminal[row_pos] = False
+        src = np.empty(total, dtype=np.int64)
+        src[row_pos] = np.arange(num)
+        src[is_terminal] = num + np.flatnonzero(boundary)
+        row_src = np.where(src >= num, src - num, src)
+
+        batch = {"valid": ~is_terminal}
+        for name, next_name in self.state_pairs:
+            batch[name] = np.concatenate(
+                (np.asarray(samples[name]), np.asarray(samples[next_name]))
+            )[src]
+        for k in ("act", "rew", "done", "logp"):
+            # transition fields of terminal slots are never read
+            batch[k] = np.asarray(samples[k])[row_src]
+        if last_open:
+            batch["valid"][-1] = False
+
+        idxes = self._store_batch(batch)
+        self.num_valid += int(batch["valid"][-len(idxes):].sum())
+        if last_open:
+            self.pending = {
+                next_name: np.asarray(samples[next_name])[-1:]
+                for _, next_name in self.state_pairs
+            }
+
+    def _continues(self, prev: dict, cur: dict, prev_done: np.ndarray) -> np.ndarray:
+        same = ~prev_done
+        for name, next_name in self.state_pairs:
+            same &= rows_equal(prev[next_name], cur[name])
+        return same
+
+    def _store_terminal(self, pending: dict) -> None:
+        batch = {"valid": np.zeros(1, dtype=np.bool_)}
+        for name, next_name in self.state_pairs:
+            batch[name] = pending[next_name]
+        for k in ("act", "rew", "done", "logp"):
+            batch[k] = np.zeros((1,) + self.buf[k].shape[1:], dtype=self.buf[k].dtype)
+        self._store_batch(batch)
+
+    def _store_batch(self, batch: dict) -> np.ndarray:
+        # account for valid transitions that are about to be overwritten
+        count = min(len(batch["rew"]), self.max_size)
+        start = (self.ptr + len(batch["rew"]) - count) % self.max_size
+        overwritten = (start + np.arange(count)) % self.max_size
+        self.num_valid -= int(self.buf["valid"][overwritten].sum())
+        return super()._store_batch(batch)
+
+    def _set_valid(self, idxes: np.ndarray, value: bool) -> None:
+        self.num_valid += int((self.buf["valid"][idxes] != value).sum()) * (1 if value else -1)
+        self.buf["valid"][idxes] = value
+
+    def sample_batch(self, batch_size: int) -> dict:
+        if self.num_valid == 0:
+            raise RuntimeError("CompactReplayBuffer holds no complete transition yet!")
+        valid = self.buf["valid"]
+        idxes = np.random.randint(0, self.size, size=batch_size)
+        rejected = ~valid[idxes]
+        while rejected.any():
+            idxes[rejected] = np.random.randint(0, self.size, size=int(rejected.sum()))
+            rejected = ~valid[idxes]
+        next_idxes = (idxes + 1) % self.max_size
+
+        arrays = {k: v[idxes] for k, v in self.buf.items() if k != "valid"}
+        for name, next_name in self.state_pairs:
+            arrays[next_name] = self.buf[name][next_idxes]
+        return self._to_tensors(arrays)
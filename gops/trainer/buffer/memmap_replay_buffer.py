@@ -0,0 +1,56 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Disk-backed replay buffer
+
+
+import os
+
+import numpy as np
+from gops.trainer.buffer.replay_buffer import ReplayBuffer
+
+__all__ = ["MemmapReplayBuffer"]
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer with uniform sampling probability whose fields live in
+    memory-mapped files instead of RAM.
+
+    Every field is an `np.memmap` under `buffer_memmap_dir`, which defaults to
+    `<save_folder>/buffer_memmap/<index>`. The OS page cache keeps the recently
+    written and frequently sampled pages in memory, so the buffer size is bounded
+    by disk space rather than RAM. The files are left in place after training.
+
+    Args:
+        buffer_memmap_dir (str, optional): directory of the memory-mapped files.
+    """
+
+    def __init__(self, index=0, **kwargs):
+        self.memmap_dir = kwargs.get("buffer_memmap_dir", None)
+        if self.memmap_dir is None:
+            self.memmap_dir = os.path.join(
+                kwargs["save_folder"], "buffer_memmap", str(index)
+            )
+        os.makedirs(self.memmap_dir, exist_ok=True)
+        super().__init__(index, **kwargs)
+
+    def _allocate(self, key: str, shape: tuple, dtype) -> np.memmap:
+        return np.memmap(
+            os.path.join(self.memmap_dir, key + ".dat"),
+            dtype=dtype,
+            mode="w+",
+            shape=shape,
+        )
+
+    def flush(self) -> None:
+        """Write dirty pages of all fields back to disk."""
+        for v in self.buf.values():
+            if isinstance(v, np.memmap):
+                v.flush()
+
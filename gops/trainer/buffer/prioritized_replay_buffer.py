@@ -11,12 +11,72 @@
 #  Update: 2023-08-08, Zhilong Zheng: Make this compatible with new version of GOPS; Speed up sampling and updating
 
 
-from typing import Tuple
+from typing import Iterator, Sequence, Tuple, Union
+
 import numpy as np
 import torch
 from gops.trainer.buffer.replay_buffer import ReplayBuffer
 
-__all__ = ["PrioritizedReplayBuffer"]
+__all__ = ["PrioritizedReplayBuffer", "SumMinTree"]
+
+
+class SumMinTree:
+    """
+    Sum tree and min tree over a fixed number of leaves with batched operations.
+
+    Both trees are flat arrays with the root at index 1 and the leaves at
+    [capacity, 2 * capacity), where capacity is the number of leaves rounded up
+    to a power of two. Every leaf therefore sits at the same depth, and prefix-sum
+    queries and priority updates run level by level over all indices at once.
+
+    Args:
+        size (int): number of leaves.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.capacity = 1 << max(size - 1, 0).bit_length()
+        self.depth = self.capacity.bit_length() - 1
+        self.sum_tree = np.zeros(2 * self.capacity)
+        self.min_tree = np.full(2 * self.capacity, float("inf"))
+
+    @property
+    def total(self) -> float:
+        return self.sum_tree[1]
+
+    @property
+    def min(self) -> float:
+        return self.min_tree[1]
+
+    def get(self, idxes: np.ndarray) -> np.ndarray:
+        return self.sum_tree[np.asarray(idxes) + self.capacity]
+
+    def update(self, idxes: Union[Sequence[int], np.ndarray], values: Union[float, np.ndarray]) -> None:
+        nodes = np.asarray(idxes, dtype=np.int64) + self.capacity
+        if nodes.size == 0:
+            return
+        self.sum_tree[nodes] = values
+        self.min_tree[nodes] = values
+        nodes = np.unique(nodes) >> 1
+        for _ in range(self.depth):
+            # nodes stay sorted after halving, so duplicates are adjacent
+            nodes = nodes[np.concatenate(([True], nodes[1:] != nodes[:-1]))]
+            left = nodes << 1
+            self.sum_tree[nodes] = self.sum_tree[left] + self.sum_tree[left + 1]
+            self.min_tree[nodes] = np.minimum(self.min_tree[left], self.min_tree[left + 1])
+            nodes = nodes >> 1
+
+    def find_prefixsum_idx(self, values: np.ndarray) -> np.ndarray:
+        """Return, for each value, the smallest leaf whose prefix sum reaches it."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(values.shape, dtype=np.int64)
+        for _ in range(self.depth):
+            left = nodes << 1
+            left_sum = self.sum_tree[left]
+            go_right = values > left_sum
+            values -= np.where(go_right, left_sum, 0.0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.capacity, self.size - 1)
 
 
 class PrioritizedReplayBuffer(ReplayBuffer):
@@ -35,117 +95,93 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                                 Defaults to 0.4.
         beta_increment (float, optional): Schedule on beta that finally reaches 1.
                                           Defaults to 0.01.
+
+    Sampled indices are global, i.e. slot + index * buffer_max_size, so that
+    several buffers can serve as shards of one prioritized replay, see
+    `gops.trainer.sharded_replay.ShardedPrioritizedReplay`.
     """
 
     def __init__(self, index=0, **kwargs):
         super().__init__(index, **kwargs)
+        self.offset = index * self.max_size
 
-        self.sum_tree = np.zeros(2 * self.max_size - 1)
-        self.min_tree = float("inf") * np.ones(2 * self.max_size - 1)
+        self.tree = SumMinTree(self.max_size)
         self.alpha = 0.6  #TODO: make it specifiable?
         self.beta = 0.4
         self.beta_increment = 0.01
         self.epsilon = 1e-6
         self.max_priority = 1.0 ** self.alpha
 
-    def store(
-        self,
-        obs: np.ndarray,
-        act: np.ndarray,
-        rew: float,
-        done: bool,
-        info: dict,
-        next_obs: np.ndarray,
-        next_info: dict,
-        logp: np.ndarray,
-    ) -> None:
-        self.buf["obs"][self.ptr] = obs
-        self.buf["obs2"][self.ptr] = next_obs
-        self.buf["act"][self.ptr] = act
-        self.buf["rew"][self.ptr] = rew
-        self.buf["done"][self.ptr] = done
-        self.buf["logp"][self.ptr] = logp
-        for k in self.additional_info.keys():
-            self.buf[k][self.ptr] = info[k]
-            self.buf["next_" + k][self.ptr] = next_info[k]
-        tree_idx = self.ptr + self.max_size - 1
-        self.sum_tree[tree_idx] = self.max_priority
-        self.min_tree[tree_idx] = self.max_priority
-        self.update_tree(tree_idx)
-        self.ptr = (self.ptr + 1) % self.max_size
-        self.size = min(self.size + 1, self.max_size)
-
-    def update_tree(self, tree_idx: int) -> None:
-        parent = (tree_idx - 1) // 2
-        while True:
-            left = 2 * parent + 1
-            right = left + 1
-            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
-            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
-            if parent == 0:
-                break
-            parent = (parent - 1) // 2
-
-    def get_leaf(self, value: float) -> Tuple[int, float]:
-        parent = 0
-        while True:
-            left = 2 * parent + 1
-            right = left + 1
-            if left >= len(self.sum_tree):
-                idx = parent
-                break
-            else:
-                if value <= self.sum_tree[left]:
-                    parent = left
-                else:
-                    value -= self.sum_tree[left]
-                    parent = right
-        return idx, self.sum_tree[idx]
+    def _store_batch(self, batch: dict) -> np.ndarray:
+        idxes = super()._store_batch(batch)
+        self.tree.update(idxes, self.max_priority)
+        return idxes
+
+    def _snapshot_arrays(self) -> Iterator[Tuple[str, np.ndarray]]:
+        yield from super()._snapshot_arrays()
+        yield "sum_tree", self.tree.sum_tree
+        yield "min_tree", self.tree.min_tree
+
+    def _snapshot_meta(self) -> dict:
+        meta = super()._snapshot_meta()
+        meta.update({"max_priority": float(self.max_priority), "beta": self.beta})
+        return meta
+
+    def _restore_meta(self, meta: dict) -> None:
+        super()._restore_meta(meta)
+        self.max_priority = meta["max_priority"]
+        self.beta = meta["beta"]
 
     def sample_batch(self, batch_size: int) -> dict:
-        idxes, weights = np.zeros(batch_size, dtype=np.int32), np.zeros(batch_size)
-        segment = self.sum_tree[0] / batch_size
         self.beta = min(1.0, self.beta + self.beta_increment)  #TODO: technically useless
-        min_prob = self.min_tree[0] / self.sum_tree[0]
-        max_weight = (min_prob * self.size) ** (-self.beta)
+        return self._sample(batch_size, self.tree.total, self.tree.min, self.size)
+
+    def sample_shard(
+        self, batch_size: int, total: float, min_priority: float, size: int, beta: float
+    ) -> dict:
+        """
+        Sample as one shard of a sharded prioritized replay, with importance
+        weights computed from the priority statistics of all shards.
+        """
+        self.beta = beta
+        return self._sample(batch_size, total, min_priority, size)
+
+    def priority_stats(self) -> Tuple[float, float, int]:
+        """Total and minimum priority and number of samples."""
+        return self.tree.total, self.tree.min, self.size
+
+    def beta_schedule(self) -> Tuple[float, float]:
+        return self.beta, self.beta_increment
+
+    def _sample(self, batch_size: int, total: float, min_priority: float, size: int) -> dict:
+        # draw stratified over the local priorities, weight by the probability
+        # of the sample among `size` samples with `total` priority
+        segment = self.tree.total / batch_size
+        min_prob = min_priority / total
+        max_weight = (min_prob * size) ** (-self.beta)
 
         values = np.random.uniform(np.arange(batch_size) * segment, np.arange(batch_size) * segment + segment)
-        idxes, priorities = zip(*map(self.get_leaf, values))
-        idxes = np.array(idxes, dtype=np.int32)
-        priorities = np.array(priorities)
-        probs = priorities / self.sum_tree[0]
-        weights = (probs * self.size) ** (-self.beta) / max_weight
+        idxes = self.tree.find_prefixsum_idx(values)
+        priorities = self.tree.get(idxes)
+        probs = priorities / total
+        weights = (probs * size) ** (-self.beta) / max_weight
 
         batch = {}
-        ptrs = idxes - self.max_size + 1
-        batch["idx"] = torch.as_tensor(idxes, dtype=torch.int32)
+        batch["idx"] = torch.as_tensor(idxes + self.offset, dtype=torch.int64)
         batch["weight"] = torch.as_tensor(weights, dtype=torch.float32)
-        for k, v in self.buf.items():
-            if isinstance(v, np.ndarray):
-                batch[k] = torch.as_tensor(v[ptrs], dtype=torch.float32)
-            else:
-                batch[k] = v[ptrs].array2tensor()
+        batch.update(self._to_tensors({k: v[idxes] for k, v in self.buf.items()}))
         return batch
 
-    def update_batch(self, idxes: int, priorities: float) -> None:
+    def sample_batches(self, num: int, batch_size: int) -> dict:
+        # advance beta once per replay batch, as separate sample_batch calls would
+        self.beta = min(1.0, self.beta + (num - 1) * self.beta_increment)
+        return self.sample_batch(num * batch_size)
+
+    def update_batch(self, idxes: np.ndarray, priorities: np.ndarray) -> None:
         if isinstance(idxes, torch.Tensor):
-            idxes = idxes.detach().numpy()
+            idxes = idxes.detach().cpu().numpy()
         if isinstance(priorities, torch.Tensor):
-            priorities = priorities.detach().numpy()
+            priorities = priorities.detach().cpu().numpy()
         priorities = (priorities + self.epsilon) ** self.alpha
-        self.sum_tree[idxes] = priorities
-        self.min_tree[idxes] = priorities
+        self.tree.update(np.asarray(idxes) - self.offset, priorities)
         self.max_priority = max(self.max_priority, priorities.max())
-
-        idxes_to_update = {}  # lazy update to avoid redundancy
-        for idx in idxes:
-            while idx >= 0 and idx not in idxes_to_update:
-                idxes_to_update[idx] = True
-                idx = (idx - 1) // 2
-        for idx in sorted(idxes_to_update.keys(), reverse=True):
-            parent = (idx - 1) // 2
-            left = 2 * parent + 1
-            right = left + 1
-            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
-            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
-
@@ -10,12 +10,18 @@
 #  Update: 2021-03-05, Yuheng Lei: Create replay buffer
 
 
+from dataclasses import fields, is_dataclass
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+import json
+import operator
+import os
+
 import numpy as np
 import sys
 import torch
 from gops.utils.common_utils import set_seed
 
-__all__ = ["ReplayBuffer"]
+__all__ = ["ReplayBuffer", "FieldCodec", "StateLayout", "split_batches"]
 
 
 def combined_shape(length: int, shape=None):
@@ -24,9 +30,170 @@ def combined_shape(length: int, shape=None):
     return (length, shape) if np.isscalar(shape) else (length, *shape)
 
 
+def rows_equal(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Whether the rows of two arrays, compared along the first dimension, are equal."""
+    a, b = np.asarray(a), np.asarray(b)
+    equal = np.asarray(a == b)
+    return np.all(equal, axis=tuple(range(1, equal.ndim)))
+
+
+def copy_in_chunks(src: np.ndarray, dst: np.ndarray, chunk_bytes: int = 1 << 26) -> None:
+    """Copy src into dst along the first dimension, a bounded number of bytes at a time."""
+    row_bytes = max(src[:1].nbytes, 1)
+    chunk = max(chunk_bytes // row_bytes, 1)
+    for i in range(0, len(src), chunk):
+        dst[i:i + chunk] = src[i:i + chunk]
+
+
+def split_batches(block: dict, num: int) -> List[dict]:
+    """
+    Split a block returned by `sample_batches` into `num` replay batches.
+
+    Rows are dealt out round robin, so with stratified prioritized sampling
+    every batch still spans all strata. Each batch owns its memory and can be
+    shipped to another process without the rest of the block.
+    """
+    if num == 1:
+        return [block]
+    total = len(block["rew"])
+    return [
+        {k: v[torch.arange(i, total, num)] for k, v in block.items()}
+        for i in range(num)
+    ]
+
+
+class StateLayout:
+    """
+    Flattened layout of a State/ContextState template of env_gen_ocp.
+
+    The array leaves of the template are found once by walking its dataclass
+    fields and named like `context_state.reference`. Afterwards leaves are read
+    through cached attribute getters and states are rebuilt from a cached
+    constructor tree, so buffers keep every leaf as a plain array and bulk
+    writes and gathers never reflect over the fields of a state.
+    """
+
+    def __init__(self, template):
+        self.leaves: List[Tuple[str, np.ndarray]] = []
+        self.tree = self._build(template, "")
+        self.names = [name for name, _ in self.leaves]
+        self.getters = [operator.attrgetter(name) for name in self.names]
+
+    def _build(self, value, prefix: str) -> tuple:
+        children = []
+        for f in fields(value):
+            v = getattr(value, f.name)
+            if isinstance(v, np.ndarray):
+                children.append(("leaf", len(self.leaves)))
+                self.leaves.append((prefix + f.name, v))
+            elif is_dataclass(v):
+                children.append(("node", self._build(v, prefix + f.name + ".")))
+            else:
+                # non-array fields such as an integer time index are shared
+                children.append(("const", v))
+        return value.__class__, children
+
+    def flatten(self, value) -> list:
+        """Array leaves of a state in the order of `names`."""
+        return [get(value) for get in self.getters]
+
+    def stack(self, values: Sequence) -> list:
+        """Array leaves of a sequence of states, each stacked along a new first dimension."""
+        return [np.stack([get(v) for v in values]) for get in self.getters]
+
+    def unflatten(self, leaves: Sequence):
+        """Rebuild a state from its array leaves in the order of `names`."""
+        return self._assemble(self.tree, leaves)
+
+    def _assemble(self, node: tuple, leaves: Sequence):
+        cls, children = node
+        values = []
+        for kind, item in children:
+            if kind == "leaf":
+                values.append(leaves[item])
+            elif kind == "node":
+                values.append(self._assemble(item, leaves))
+            else:
+                values.append(item)
+        return cls(*values)
+
+
+class FieldCodec:
+    """
+    Storage type of a buffer field, decoded to float32 tensors when sampled.
+
+    Args:
+        dtype (str): storage type, a numpy type name such as "float16" or "uint8",
+            or "bfloat16", which is kept as raw uint16 bits.
+        shift (optional): shift of affine quantization for integer types.
+        scale (optional): scale of affine quantization for integer types.
+
+    Floating types are plain casts. Integer types round and saturate; with
+    `shift` and `scale` they quantize affinely with the convention of
+    ScaleObservationData, i.e. (x + shift) * scale is expected in [-1, 1] for
+    signed and [0, 1] for unsigned types and is spread over the integer range,
+    so the obs_shift/obs_scale known for an environment can be reused.
+    """
+
+    def __init__(self, dtype: str, shift=None, scale=None):
+        self.is_bfloat16 = dtype == "bfloat16"
+        self.storage_dtype = np.dtype(np.uint16 if self.is_bfloat16 else dtype)
+        self.is_integer = not self.is_bfloat16 and np.issubdtype(self.storage_dtype, np.integer)
+        self.affine = shift is not None or scale is not None
+        if self.affine and not self.is_integer:
+            raise ValueError(f"Affine quantization needs an integer storage type, got {dtype}!")
+        if self.is_integer:
+            info = np.iinfo(self.storage_dtype)
+            self.int_min, self.int_max = info.min, info.max
+        if self.affine:
+            shift = np.asarray(0.0 if shift is None else shift, dtype=np.float32)
+            scale = np.asarray(1.0 if scale is None else scale, dtype=np.float32)
+            self.shift = shift
+            self.scale = scale * self.int_max
+            self.shift_tensor = torch.as_tensor(self.shift)
+            self.scale_tensor = torch.as_tensor(self.scale)
+
+    @classmethod
+    def from_spec(cls, spec: Union[str, dict]) -> "FieldCodec":
+        if isinstance(spec, str):
+            return cls(spec)
+        return cls(**spec)
+
+    def encode(self, value: np.ndarray) -> np.ndarray:
+        if self.is_bfloat16:
+            value = torch.as_tensor(np.asarray(value, dtype=np.float32)).to(torch.bfloat16)
+            return value.view(torch.int16).numpy().view(np.uint16)
+        if self.is_integer:
+            value = np.asarray(value, dtype=np.float32)
+            if self.affine:
+                value = (value + self.shift) * self.scale
+            value = np.clip(np.rint(value), self.int_min, self.int_max)
+        return np.asarray(value).astype(self.storage_dtype)
+
+    def decode(self, value: np.ndarray) -> torch.Tensor:
+        if self.is_bfloat16:
+            return torch.from_numpy(value.view(np.int16)).view(torch.bfloat16).float()
+        value = torch.as_tensor(value, dtype=torch.float32)
+        if self.affine:
+            value = value / self.scale_tensor - self.shift_tensor
+        return value
+
+
 class ReplayBuffer:
     """
     Implementation of replay buffer with uniform sampling probability.
+
+    Args:
+        buffer_storage_dtype (dict, optional): storage type of fields, keyed by
+            "obs", "act", "rew", "done", "logp" or a key of additional info, with
+            values accepted by `FieldCodec.from_spec`, e.g.
+            {"obs": "float16"} or {"obs": {"dtype": "int8", "shift": 0, "scale": 0.1}}.
+            A type given for "obs" or an info key also applies to the next
+            observation or info. Fields not listed are stored as float32, infos
+            with their own type. State infos of env_gen_ocp are not converted.
+
+    State infos of env_gen_ocp are stored as one array per leaf, named like
+    `state.context_state.reference`, and rebuilt into states when sampled.
     """
 
     def __init__(self, index=0, **kwargs):
@@ -34,37 +201,69 @@ class ReplayBuffer:
         self.obsv_dim = kwargs["obsv_dim"]
         self.act_dim = kwargs["action_dim"]
         self.max_size = kwargs["buffer_max_size"]
+        self.additional_info = kwargs["additional_info"]
+        self.codecs: Dict[str, FieldCodec] = {}
+        self.layouts: Dict[str, StateLayout] = {}
+        for k, spec in kwargs.get("buffer_storage_dtype", {}).items():
+            codec = FieldCodec.from_spec(spec)
+            if k == "obs":
+                self.codecs["obs2"] = codec
+            elif k in self.additional_info:
+                self.codecs["next_" + k] = codec
+            self.codecs[k] = codec
         self.buf = {
-            "obs": np.zeros(
-                combined_shape(self.max_size, self.obsv_dim), dtype=np.float32
+            "obs": self._allocate_field(
+                "obs", combined_shape(self.max_size, self.obsv_dim), np.float32
             ),
-            "obs2": np.zeros(
-                combined_shape(self.max_size, self.obsv_dim), dtype=np.float32
+            "obs2": self._allocate_field(
+                "obs2", combined_shape(self.max_size, self.obsv_dim), np.float32
             ),
-            "act": np.zeros(
-                combined_shape(self.max_size, self.act_dim), dtype=np.float32
+            "act": self._allocate_field(
+                "act", combined_shape(self.max_size, self.act_dim), np.float32
             ),
-            "rew": np.zeros(self.max_size, dtype=np.float32),
-            "done": np.zeros(self.max_size, dtype=np.float32),
-            "logp": np.zeros(self.max_size, dtype=np.float32),
+            "rew": self._allocate_field("rew", (self.max_size,), np.float32),
+            "done": self._allocate_field("done", (self.max_size,), np.float32),
+            "logp": self._allocate_field("logp", (self.max_size,), np.float32),
         }
-        self.additional_info = kwargs["additional_info"]
         for k, v in self.additional_info.items():
-            if isinstance(v, dict):
-                self.buf[k] = np.zeros(
-                    combined_shape(self.max_size, v["shape"]), dtype=v["dtype"]
-                )
-                self.buf["next_" + k] = np.zeros(
-                    combined_shape(self.max_size, v["shape"]), dtype=v["dtype"]
-                )
-            else:
-                self.buf[k] = v.batch(self.max_size)
-                self.buf["next_" + k] = v.batch(self.max_size)
+            layout = None if isinstance(v, dict) else StateLayout(v)
+            for key in (k, "next_" + k):
+                if layout is None:
+                    self.buf[key] = self._allocate_field(
+                        key, combined_shape(self.max_size, v["shape"]), v["dtype"]
+                    )
+                    continue
+                self.layouts[key] = layout
+                for name, leaf in layout.leaves:
+                    name = key + "." + name
+                    self.buf[name] = self._allocate(
+                        name, combined_shape(self.max_size, leaf.shape), leaf.dtype
+                    )
+        self.leaf_names = {
+            name for key in self.layouts.keys() for name in self._array_names(key)
+        }
         self.ptr, self.size, = (
             0,
             0,
         )
 
+    def _allocate_field(self, key: str, shape: tuple, dtype) -> np.ndarray:
+        codec = self.codecs.get(key, None)
+        if codec is not None:
+            dtype = codec.storage_dtype
+        return self._allocate(key, shape, dtype)
+
+    def _allocate(self, key: str, shape: tuple, dtype) -> np.ndarray:
+        """Allocate the storage of one field, overridden by other storage backends."""
+        return np.zeros(shape, dtype=dtype)
+
+    def _array_names(self, key: str) -> List[str]:
+        """Names of the arrays in `self.buf` holding field `key`."""
+        layout = self.layouts.get(key, None)
+        if layout is None:
+            return [key]
+        return [key + "." + name for name in layout.names]
+
     def __len__(self):
         return self.size
 
@@ -82,27 +281,178 @@ class ReplayBuffer:
         next_info: dict,
         logp: np.ndarray,
     ) -> None:
-        self.buf["obs"][self.ptr] = obs
-        self.buf["obs2"][self.ptr] = next_obs
-        self.buf["act"][self.ptr] = act
-        self.buf["rew"][self.ptr] = rew
-        self.buf["done"][self.ptr] = done
-        self.buf["logp"][self.ptr] = logp
+        self.add_batch([(obs, act, rew, done, info, next_obs, next_info, logp)])
+
+    def save(self, path: str) -> None:
+        """
+        Save a snapshot of the buffer to directory `path`.
+
+        Every array is written to its own `.npy` file in chunks and the pointer
+        and size go to `meta.json`, which is written last so that an interrupted
+        save is never mistaken for a complete snapshot.
+        """
+        os.makedirs(path, exist_ok=True)
+        meta_file = os.path.join(path, "meta.json")
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        for name, arr in self._snapshot_arrays():
+            out = np.lib.format.open_memmap(
+                os.path.join(path, name + ".npy"), mode="w+", dtype=arr.dtype, shape=arr.shape
+            )
+            copy_in_chunks(arr, out)
+            out.flush()
+            del out
+        with open(meta_file, "w", encoding="utf-8") as f:
+            json.dump(self._snapshot_meta(), f, indent=4)
+
+    def load(self, path: str) -> None:
+        """Restore the buffer from a snapshot written by `save`."""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["buffer"] != self.__class__.__name__:
+            raise ValueError(
+                f"Buffer snapshot in {path} was saved by {meta['buffer']}, "
+                f"it cannot be loaded by {self.__class__.__name__}!"
+            )
+        if meta["max_size"] != self.max_size:
+            raise ValueError(
+                f"Buffer snapshot in {path} has max size {meta['max_size']}, "
+                f"but this buffer has max size {self.max_size}!"
+            )
+        self._restore_meta(meta)
+        for name, arr in self._snapshot_arrays():
+            src = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+            if src.shape != arr.shape:
+                raise ValueError(
+                    f"Shape of {name} in buffer snapshot is {src.shape}, expected {arr.shape}!"
+                )
+            copy_in_chunks(src, arr)
+
+    def _snapshot_arrays(self) -> Iterator[Tuple[str, np.ndarray]]:
+        # slots [0, size) hold all valid samples whether or not the ring has wrapped
+        for k, v in self.buf.items():
+            yield k, v[:self.size]
+
+    def _snapshot_meta(self) -> dict:
+        return {
+            "buffer": self.__class__.__name__,
+            "ptr": self.ptr,
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+    def _restore_meta(self, meta: dict) -> None:
+        self.ptr = meta["ptr"]
+        self.size = meta["size"]
+
+    def add_batch(self, samples: Union[Sequence, dict]) -> None:
+        """
+        Insert a batch of transitions.
+
+        Args:
+            samples: either a columnar batch as produced by the samplers, i.e.
+                a dict keyed like `self.buf` whose values hold the whole batch
+                along the first dimension, or a list of unbatched `Experience`.
+        """
+        if not isinstance(samples, dict):
+            samples = self.experiences_to_batch(samples)
+        self._store_batch(samples)
+
+    def experiences_to_batch(self, samples: Sequence) -> dict:
+        """Convert a list of `Experience` to a columnar batch with flattened states."""
+        obs, act, rew, done, info, next_obs, next_info, logp = zip(*samples)
+        batch = {
+            "obs": np.stack(obs),
+            "obs2": np.stack(next_obs),
+            "act": np.stack(act),
+            "rew": np.asarray(rew),
+            "done": np.asarray(done),
+            "logp": np.asarray(logp),
+        }
         for k in self.additional_info.keys():
-            self.buf[k][self.ptr] = info[k]
-            self.buf["next_" + k][self.ptr] = next_info[k]
-        self.ptr = (self.ptr + 1) % self.max_size
-        self.size = min(self.size + 1, self.max_size)
+            for key, infos in ((k, info), ("next_" + k, next_info)):
+                layout = self.layouts.get(key, None)
+                if layout is None:
+                    batch[key] = np.stack([i[k] for i in infos])
+                else:
+                    leaves = layout.stack([i[k] for i in infos])
+                    batch.update(zip(self._array_names(key), leaves))
+        return batch
+
+    def _flatten_batch(self, batch: dict) -> dict:
+        # replace State values of a columnar batch by their array leaves
+        flat = {}
+        for k, v in batch.items():
+            if k in self.layouts:
+                flat.update(zip(self._array_names(k), self.layouts[k].flatten(v)))
+            else:
+                flat[k] = v
+        return flat
 
-    def add_batch(self, samples: list) -> None:
-        list(map(lambda sample: self.store(*sample), samples))
+    def _ring_slices(self, start: int, num: int) -> List[slice]:
+        # slices of the ring storage covering `num` slots from `start`,
+        # split at most once where the pointer wraps around
+        end = start + num
+        if end <= self.max_size:
+            return [slice(start, end)]
+        return [slice(start, self.max_size), slice(0, end - self.max_size)]
+
+    def _store_batch(self, batch: dict) -> np.ndarray:
+        batch = self._flatten_batch(batch)
+        num = len(batch["rew"])
+        if num == 0:
+            return np.zeros(0, dtype=np.int64)
+        # only the latest max_size samples survive, land them where a
+        # sequential insertion would have put them
+        skip = max(num - self.max_size, 0)
+        start = (self.ptr + skip) % self.max_size
+        count = num - skip
+        slices = self._ring_slices(start, count)
+        for k, v in batch.items():
+            buf = self.buf[k]
+            v = np.asarray(v)[skip:]
+            shape = (count,) + buf.shape[1:]
+            if v.size == np.prod(shape):
+                v = v.reshape(shape)
+            else:
+                # rows of another shape than declared are broadcast, as stored row by row
+                v = np.broadcast_to(v, shape)
+            if k in self.codecs:
+                v = self.codecs[k].encode(v)
+            offset = 0
+            for s in slices:
+                length = s.stop - s.start
+                buf[s] = v[offset:offset + length]
+                offset += length
+        self.ptr = (self.ptr + num) % self.max_size
+        self.size = min(self.size + num, self.max_size)
+        return (start + np.arange(count)) % self.max_size
 
     def sample_batch(self, batch_size: int) -> dict:
         idxes = np.random.randint(0, self.size, size=batch_size)
-        batch = {}
-        for k, v in self.buf.items():
-            if isinstance(v, np.ndarray):
-                batch[k] = torch.as_tensor(v[idxes], dtype=torch.float32)
-            else:
-                batch[k] = v[idxes].array2tensor()
+        return self._to_tensors({k: v[idxes] for k, v in self.buf.items()})
+
+    def sample_batches(self, num: int, batch_size: int) -> dict:
+        """
+        Sample `num` replay batches at once, returned as one block of
+        num * batch_size rows to be split with `split_batches`.
+        """
+        return self.sample_batch(num * batch_size)
+
+    def _to_tensors(self, arrays: dict) -> dict:
+        # convert gathered rows keyed like `self.buf` to a batch of tensors
+        # with the leaves of each State field rebuilt into a state
+        batch = {
+            k: self._to_tensor(k, v) for k, v in arrays.items() if k not in self.leaf_names
+        }
+        for k, layout in self.layouts.items():
+            batch[k] = layout.unflatten(
+                [torch.from_numpy(arrays[name]) for name in self._array_names(k)]
+            )
         return batch
+
+    def _to_tensor(self, key: str, value: np.ndarray) -> torch.Tensor:
+        codec = self.codecs.get(key, None)
+        if codec is not None:
+            return codec.decode(value)
+        return torch.as_tensor(value, dtype=torch.float32)
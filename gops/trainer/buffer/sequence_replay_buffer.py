@@ -0,0 +1,96 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer sampling windows of consecutive transitions
+
+
+import numpy as np
+from gops.trainer.buffer.replay_buffer import ReplayBuffer, rows_equal
+
+__all__ = ["SequenceReplayBuffer"]
+
+
+class SequenceReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer with uniform sampling probability over fixed-length windows
+    of consecutive transitions, for the recurrent approximate functions.
+
+    Every field of a sampled batch has shape (batch_size, buffer_seq_len, ...),
+    so `obs` can be fed to the networks of `gops.apprfunc.rnn` as is, while the
+    last step of the other fields is `[:, -1]`. A window never crosses an
+    episode end: slot i continues into slot i + 1 only if transition i is not
+    done and its next observation equals the observation of slot i + 1, so the
+    steps of one environment have to be stored next to each other.
+
+    The continuation flags and the valid window starts are updated only around
+    inserted slots. When most slots start a valid window, starts are drawn by
+    rejection; otherwise from an index of valid starts rebuilt lazily at the
+    next sampling. Either way sampling is a single gather per field, even at
+    millions of transitions.
+
+    Args:
+        buffer_seq_len (int): length of sampled windows.
+    """
+
+    def __init__(self, index=0, **kwargs):
+        super().__init__(index, **kwargs)
+        self.seq_len = kwargs.get("buffer_seq_len", 8)
+        # cont[i]: transition in slot i is followed by its successor in slot i + 1
+        self.cont = np.zeros(self.max_size, dtype=np.bool_)
+        self.valid_start = np.zeros(self.max_size, dtype=np.bool_)
+        self.num_valid = 0
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.starts_dirty = False
+
+    def load(self, path: str) -> None:
+        super().load(path)
+        self._update_index(0, self.max_size)
+
+    def _store_batch(self, batch: dict) -> np.ndarray:
+        idxes = super()._store_batch(batch)
+        if len(idxes) > 0:
+            # the slot before the batch may now continue into it
+            self._update_index(idxes[0] - 1, min(len(idxes) + 1, self.max_size))
+        return idxes
+
+    def _update_index(self, first: int, num: int) -> None:
+        slots = (first + np.arange(num)) % self.max_size
+        next_slots = (slots + 1) % self.max_size
+        self.cont[slots] = (
+            (slots < self.size)
+            & (next_slots < self.size)
+            & (next_slots != self.ptr)
+            & (self.buf["done"][slots] == 0)
+            & rows_equal(self.buf["obs2"][slots], self.buf["obs"][next_slots])
+        )
+        # windows starting up to seq_len - 1 slots earlier contain changed flags
+        span = self.seq_len - 1
+        starts = (first - span + np.arange(min(num + span, self.max_size))) % self.max_size
+        valid = starts < self.size
+        for k in range(span):
+            valid &= self.cont[(starts + k) % self.max_size]
+        self.num_valid += int(valid.sum()) - int(self.valid_start[starts].sum())
+        self.valid_start[starts] = valid
+        self.starts_dirty = True
+
+    def sample_batch(self, batch_size: int) -> dict:
+        if self.num_valid == 0:
+            raise RuntimeError("SequenceReplayBuffer holds no complete window yet!")
+        if 2 * self.num_valid >= self.size:
+            starts = np.random.randint(0, self.size, size=batch_size)
+            rejected = ~self.valid_start[starts]
+            while rejected.any():
+                starts[rejected] = np.random.randint(0, self.size, size=int(rejected.sum()))
+                rejected = ~self.valid_start[starts]
+        else:
+            if self.starts_dirty:
+                self.starts = np.flatnonzero(self.valid_start)
+                self.starts_dirty = False
+            starts = self.starts[np.random.randint(0, len(self.starts), size=batch_size)]
+        idxes = (starts[:, None] + np.arange(self.seq_len)) % self.max_size
+        return self._to_tensors({k: v[idxes] for k, v in self.buf.items()})
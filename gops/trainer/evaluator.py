@@ -7,6 +7,8 @@
 #  Update Date: 2021-05-10, Yang Guan: renew environment parameters
 
 
+from typing import List
+
 import numpy as np
 import torch
 
@@ -16,26 +18,47 @@ from gops.utils.common_utils import set_seed
 
 
 class Evaluator:
+    """
+    Evaluate the mode of the policy over `num_eval_episode` episodes. The
+    episodes run concurrently on a vector env of `eval_env_num` environments,
+    `num_eval_episode` by default, of type `eval_env_type`, "sync" or "async",
+    with one batched policy inference per step. If there are more episodes
+    than environments, they run in rounds, and when rendering, episodes run
+    one at a time.
+
+    Every episode is seeded on reset with its own seed, the evaluator seed
+    plus the number of episodes evaluated before it, so that its return and
+    saved data do not depend on the number of environments it runs with. This
+    holds for envs that draw their randomness from their own seeded generator.
+    """
+
     def __init__(self, index=0, **kwargs):
+        self.render = kwargs["is_render"]
+        self.num_eval_episode = kwargs["num_eval_episode"]
+        eval_env_num = 1 if self.render else kwargs.get("eval_env_num", None)
+        if eval_env_num is None:
+            eval_env_num = self.num_eval_episode
         kwargs.update({
             "reward_scale": None,
             "repeat_num": None,
-            "gym2gymnasium": False,
-            "vector_env_num": None,
+            "gym2gymnasium": True,
+            "vector_env_num": eval_env_num,
+            "vector_env_type": kwargs.get("eval_env_type", "sync"),
         })
         self.env = create_env(**kwargs)
+        self.num_envs = self.env.num_envs
 
-        _, self.env = set_seed(kwargs["trainer"], kwargs["seed"], index + 400, self.env)
+        seed, self.env = set_seed(kwargs["trainer"], kwargs["seed"], index + 400, self.env)
+        self.seed = kwargs["seed"] if seed is None else seed
 
         self.networks = create_approx_contrainer(**kwargs)
-        self.render = kwargs["is_render"]
 
-        self.num_eval_episode = kwargs["num_eval_episode"]
         self.action_type = kwargs["action_type"]
         self.policy_func_name = kwargs["policy_func_name"]
         self.save_folder = kwargs["save_folder"]
         self.eval_save = kwargs.get("eval_save", True)
 
+        self.num_episodes = 0
         self.print_time = 0
         self.print_iteration = -1
 
@@ -43,53 +66,68 @@ class Evaluator:
         self.networks.load_state_dict(state_dict)
 
     def run_an_episode(self, iteration, render=True):
-        if self.print_iteration != iteration:
-            self.print_iteration = iteration
-            self.print_time = 0
-        else:
-            self.print_time += 1
-        obs_list = []
-        action_list = []
-        reward_list = []
-        obs, info = self.env.reset()
-        done = 0
-        info["TimeLimit.truncated"] = False
-        while not (done or info["TimeLimit.truncated"]):
-            batch_obs = torch.from_numpy(np.expand_dims(obs, axis=0).astype("float32"))
+        return self.run_episodes(1, iteration, render)[0]
+
+    def run_episodes(self, n, iteration, render=False) -> List[float]:
+        """Run `n` episodes, at most `num_envs` at a time, and return their returns."""
+        episode_returns = []
+        while len(episode_returns) < n:
+            num_round = min(n - len(episode_returns), self.num_envs)
+            episode_returns.extend(self.__run_round(num_round, iteration, render))
+        return episode_returns
+
+    def __run_round(self, n, iteration, render) -> List[float]:
+        seeds = [
+            (self.seed + self.num_episodes + i) % 2 ** 32 for i in range(self.num_envs)
+        ]
+        self.num_episodes += n
+        self.env.seed(seeds)
+        obs, _ = self.env.reset()
+
+        obs_lists = [[] for _ in range(n)]
+        action_lists = [[] for _ in range(n)]
+        reward_lists = [[] for _ in range(n)]
+        # environments after the first n and those whose episode ended are
+        # stepped along, after their autoreset, but not recorded
+        done = np.arange(self.num_envs) >= n
+        while not done.all():
+            batch_obs = torch.from_numpy(obs.astype("float32"))
             logits = self.networks.policy(batch_obs)
             action_distribution = self.networks.create_action_distributions(logits)
             action = action_distribution.mode()
-            action = action.detach().numpy()[0]
-            next_obs, reward, done, next_info = self.env.step(action)
-            obs_list.append(obs)
-            action_list.append(action)
+            action = action.detach().numpy()
+            next_obs, reward, terminated, truncated, _ = self.env.step(action)
+            for i in np.flatnonzero(~done):
+                obs_lists[i].append(obs[i])
+                action_lists[i].append(action[i])
+                reward_lists[i].append(reward[i])
+            done |= terminated | truncated
             obs = next_obs
-            info = next_info
-            if "TimeLimit.truncated" not in info.keys():
-                info["TimeLimit.truncated"] = False
             # Draw environment animation
             if render:
-                self.env.render()
-            reward_list.append(reward)
-        eval_dict = {
-            "reward_list": reward_list,
-            "action_list": action_list,
-            "obs_list": obs_list,
-        }
-        if self.eval_save:
-            np.save(
-                self.save_folder
-                + "/evaluator/iter{}_ep{}".format(iteration, self.print_time),
-                eval_dict,
-            )
-        episode_return = sum(reward_list)
-        return episode_return
+                self.env.call("render")
+
+        for i in range(n):
+            if self.print_iteration != iteration:
+                self.print_iteration = iteration
+                self.print_time = 0
+            else:
+                self.print_time += 1
+            eval_dict = {
+                "reward_list": reward_lists[i],
+                "action_list": action_lists[i],
+                "obs_list": obs_lists[i],
+            }
+            if self.eval_save:
+                np.save(
+                    self.save_folder
+                    + "/evaluator/iter{}_ep{}".format(iteration, self.print_time),
+                    eval_dict,
+                )
+        return [sum(reward_list) for reward_list in reward_lists]
 
     def run_n_episodes(self, n, iteration):
-        episode_return_list = []
-        for _ in range(n):
-            episode_return_list.append(self.run_an_episode(iteration, self.render))
-        return np.mean(episode_return_list)
+        return np.mean(self.run_episodes(n, iteration, self.render))
 
     def run_evaluation(self, iteration):
         return self.run_n_episodes(self.num_eval_episode, iteration)
@@ -13,6 +13,7 @@
 __all__ = ["OffAsyncTrainer"]
 
 from cmath import inf
+import collections
 import importlib
 import os
 import random
@@ -23,9 +24,11 @@ import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
-from gops.utils.common_utils import random_choice_with_index
+from gops.trainer.buffer.replay_buffer import split_batches
+from gops.trainer.sharded_replay import ShardedPrioritizedReplay
 from gops.utils.parallel_task_manager import TaskPool
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
+from gops.utils.weight_broadcast import WeightPublisher
 
 warnings.filterwarnings("ignore")
 
@@ -36,10 +39,6 @@ class OffAsyncTrainer:
         self.samplers = sampler
         self.buffers = buffer
         self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
-        if self.per_flag and kwargs["num_buffers"] > 1:
-            raise RuntimeError(
-                "Using multiple prioritized_replay_buffers is not supported!"
-            )
         self.evaluator = evaluator
 
         # create center network
@@ -59,7 +58,14 @@ class OffAsyncTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # versioned weights for samplers and learners, published once per update
+        self.weights = WeightPublisher(self.networks.networks)
+        self.sampler_modules = ray.get(self.samplers[0].get_weight_modules.remote())
+
         self.replay_batch_size = kwargs["replay_batch_size"]
+        # replay batches fetched per buffer RPC, queued until a learner needs them
+        self.replay_batches_per_request = kwargs.get("replay_batches_per_request", 1)
+        self.replay_queue = collections.deque()
         self.max_iteration = kwargs["max_iteration"]
         self.sample_interval = kwargs.get("sample_interval", 1)
         self.log_save_interval = kwargs["log_save_interval"]
@@ -81,6 +87,15 @@ class OffAsyncTrainer:
         self._set_samplers()
 
         self.warm_size = kwargs["buffer_warm_size"]
+        self.save_buffer = kwargs.get("save_buffer", False)
+        if kwargs.get("ini_buffer_dir", None) is not None:
+            # restore buffer snapshots, pre sampling only tops up what is missing
+            ray.get(
+                [
+                    buffer.load.remote(os.path.join(kwargs["ini_buffer_dir"], str(i)))
+                    for i, buffer in enumerate(self.buffers)
+                ]
+            )
         while not all(
             [
                 l >= self.warm_size
@@ -93,6 +108,13 @@ class OffAsyncTrainer:
                 self.sample_tasks.add(sampler, sampler.sample.remote())
 
         # create alg tasks and start computing gradient
+        # prioritized replay over several buffers samples all of them as one
+        self.sharded_replay = None
+        if self.per_flag and len(self.buffers) > 1:
+            self.sharded_replay = ShardedPrioritizedReplay(
+                self.buffers, kwargs["buffer_max_size"]
+            )
+
         self.learn_tasks = TaskPool()
         self._set_algs()
 
@@ -108,32 +130,50 @@ class OffAsyncTrainer:
         self.start_time = time.time()
 
     def _set_samplers(self):
-        weights = self.networks.state_dict()
         for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
+            self.weights.send(sampler, self.sampler_modules)
             self.sample_tasks.add(sampler, sampler.sample.remote())
 
     def _set_algs(self):
-        weights = self.networks.state_dict()
         for alg in self.algs:
             alg.train.remote()
-            alg.load_state_dict.remote(weights)
-            buffer, _ = random_choice_with_index(self.buffers)
-            data = ray.get(buffer.sample_batch.remote(self.replay_batch_size))
+            self.weights.send(alg)
+            data = self._replay()
             self.learn_tasks.add(
                 alg, alg.get_remote_update_info.remote(data, self.iteration)
             )
 
+    def _replay(self):
+        if not self.replay_queue:
+            num = self.replay_batches_per_request
+            if self.sharded_replay is not None:
+                block = self.sharded_replay.sample_batches(num, self.replay_batch_size)
+            else:
+                buffer = random.choice(self.buffers)
+                if num == 1:
+                    block = ray.get(buffer.sample_batch.remote(self.replay_batch_size))
+                else:
+                    block = ray.get(
+                        buffer.sample_batches.remote(num, self.replay_batch_size)
+                    )
+            self.replay_queue.extend(split_batches(block, num))
+        return self.replay_queue.popleft()
+
+    def _update_priorities(self, idx, new_priority):
+        if self.sharded_replay is not None:
+            self.sharded_replay.update_batch(idx, new_priority)
+        else:
+            self.buffers[0].update_batch.remote(idx, new_priority)
+
     def step(self):
         # sampling
         sampler_tb_dict = {}
         if self.iteration % self.sample_interval == 0:
             if self.sample_tasks.completed_num > 0:
-                weights = ray.put(self.networks.state_dict())
                 for sampler, objID in self.sample_tasks.completed():
                     batch_data, sampler_tb_dict = ray.get(objID)
                     random.choice(self.buffers).add_batch.remote(batch_data)
-                    sampler.load_state_dict.remote(weights)
+                    self.weights.send(sampler, self.sampler_modules)
                     self.sample_tasks.add(sampler, sampler.sample.remote())
 
         # learning
@@ -141,20 +181,17 @@ class OffAsyncTrainer:
             if self.per_flag:
                 extra_info, update_info = ray.get(objID)
                 alg_tb_dict, idx, new_priority = extra_info
-                self.buffers[0].update_batch.remote(idx, new_priority)
+                self._update_priorities(idx, new_priority)
             else:
                 alg_tb_dict, update_info = ray.get(objID)
 
             # replay
-            data = ray.get(
-                random.choice(self.buffers).sample_batch.remote(self.replay_batch_size)
-            )
+            data = self._replay()
             if self.use_gpu:
                 for k, v in data.items():
                     data[k] = v.cuda()
 
-            weights = ray.put(self.networks.state_dict())
-            alg.load_state_dict.remote(weights)
+            self.weights.send(alg)
             self.learn_tasks.add(
                 alg, alg.get_remote_update_info.remote(data, self.iteration)
             )
@@ -164,6 +201,7 @@ class OffAsyncTrainer:
                         for i in range(len(v)):
                             update_info[k][i] = v[i].cpu()
             self.networks.remote_update(update_info)
+            self.weights.update()
 
             self.iteration += 1
 
@@ -252,6 +290,13 @@ class OffAsyncTrainer:
             self.networks.state_dict(),
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
+        if self.save_buffer:
+            ray.get(
+                [
+                    buffer.save.remote(os.path.join(self.save_folder, "buffer", str(i)))
+                    for i, buffer in enumerate(self.buffers)
+                ]
+            )
 
     def _add_eval_task(self):
         self.evaluator.load_state_dict.remote(self.networks.state_dict())
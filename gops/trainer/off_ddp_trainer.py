@@ -0,0 +1,144 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Data-parallel trainer for off-policy RL algorithms on torch.distributed
+
+
+__all__ = ["OffDdpTrainer"]
+
+import socket
+
+import ray
+import torch.distributed as dist
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_buffer import create_buffer
+from gops.create_pkg.create_sampler import create_sampler
+from gops.trainer.off_serial_trainer import OffSerialTrainer
+from gops.utils.grad_aggregation import allreduce_update_info
+from gops.utils.weight_broadcast import flatten_weights, load_flat_weights
+
+
+def _init_learner(rank: int, world_size: int, init_method: str, networks) -> None:
+    dist.init_process_group(
+        "gloo", init_method=init_method, rank=rank, world_size=world_size
+    )
+    # start every learner from the weights of rank 0
+    flat = flatten_weights(networks)
+    for tensor in flat.values():
+        dist.broadcast(tensor, src=0)
+    load_flat_weights(networks, flat)
+
+
+def _ddp_update(alg, buffer, per_flag: bool, data: dict, iteration: int, bucket_numel: int) -> dict:
+    extra_info, update_info = alg.get_remote_update_info(data, iteration)
+    alg.remote_update(allreduce_update_info(update_info, bucket_numel))
+    if per_flag:
+        alg_tb_dict, idx, new_priority = extra_info
+        buffer.update_batch(idx, new_priority)
+        return alg_tb_dict
+    return extra_info
+
+
+class DdpLearner:
+    """
+    Learner of OffDdpTrainer with a rank above 0, running in its own process
+    with its own sampler and replay buffer.
+    """
+
+    def __init__(self, rank: int, world_size: int, init_method: str, alg_parameters: dict, **kwargs):
+        self.alg = create_alg(index=rank, **kwargs)
+        self.alg.set_parameters(alg_parameters)
+        self.networks = self.alg.networks
+        self.sampler = create_sampler(index=rank, **kwargs)
+        self.sampler.networks = self.networks
+        self.buffer = create_buffer(index=rank, **kwargs)
+        self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
+        self.replay_batch_size = kwargs["replay_batch_size"]
+        self.sample_interval = kwargs.get("sample_interval", 1)
+        self.bucket_numel = kwargs["bucket_numel"]
+        _init_learner(rank, world_size, init_method, self.networks)
+
+        while self.buffer.size < kwargs["buffer_warm_size"]:
+            samples, _ = self.sampler.sample()
+            self.buffer.add_batch(samples)
+
+    def train(self, max_iteration: int) -> None:
+        for iteration in range(max_iteration):
+            if iteration % self.sample_interval == 0:
+                samples, _ = self.sampler.sample()
+                self.buffer.add_batch(samples)
+            data = self.buffer.sample_batch(self.replay_batch_size)
+            self.networks.train()
+            _ddp_update(
+                self.alg, self.buffer, self.per_flag, data, iteration, self.bucket_numel
+            )
+            self.networks.eval()
+        dist.destroy_process_group()
+
+
+class OffDdpTrainer(OffSerialTrainer):
+    """
+    Data-parallel trainer without a central parameter server.
+
+    `num_learners` learners step in lockstep, each sampling into and replaying
+    from its own buffer. Their gradients are packed into flat tensors and
+    averaged by bucketed all-reduce over torch.distributed with the gloo
+    backend, so every learner applies the same update and their networks stay
+    identical. This process is the learner of rank 0 and also logs, evaluates
+    and saves like OffSerialTrainer; the others run in ray actors and take the
+    hyperparameters set on the algorithm of this process.
+
+    Algorithms call their networks directly instead of through one forward, so
+    gradients are all-reduced after the backward passes rather than overlapped
+    with them as by DistributedDataParallel.
+
+    Args:
+        num_learners (int): number of learners, including this process.
+        ddp_bucket_cap_mb (float): size of all-reduce buckets in megabytes.
+    """
+
+    def __init__(self, alg, sampler, buffer, evaluator, **kwargs):
+        assert not kwargs["use_gpu"], "OffDdpTrainer runs learners on cpu"
+        super().__init__(alg, sampler, buffer, evaluator, **kwargs)
+        self.num_learners = kwargs.get("num_learners", 2)
+        # buckets hold float32 gradients
+        self.bucket_numel = int(kwargs.get("ddp_bucket_cap_mb", 25) * 2 ** 20 / 4)
+
+        with socket.socket() as s:
+            s.bind(("", 0))
+            port = s.getsockname()[1]
+        init_method = f"tcp://{ray.util.get_node_ip_address()}:{port}"
+        learner_kwargs = dict(kwargs, bucket_numel=self.bucket_numel)
+        self.learners = [
+            ray.remote(num_cpus=1)(DdpLearner).remote(
+                rank,
+                self.num_learners,
+                init_method,
+                self.alg.get_parameters(),
+                **learner_kwargs,
+            )
+            for rank in range(1, self.num_learners)
+        ]
+        _init_learner(0, self.num_learners, init_method, self.networks)
+
+    def _update(self, replay_samples: dict) -> dict:
+        return _ddp_update(
+            self.alg,
+            self.buffer,
+            self.per_flag,
+            replay_samples,
+            self.iteration,
+            self.bucket_numel,
+        )
+
+    def train(self):
+        tasks = [learner.train.remote(self.max_iteration) for learner in self.learners]
+        super().train()
+        ray.get(tasks)
+        dist.destroy_process_group()
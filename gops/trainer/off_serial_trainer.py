@@ -21,6 +21,7 @@ import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
+from gops.trainer.batch_prefetcher import BatchPrefetcher
 from gops.utils.common_utils import ModuleOnDevice
 from gops.utils.parallel_task_manager import TaskPool
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
@@ -59,7 +60,10 @@ class OffSerialTrainer:
         )
         self.writer.flush()
 
-        # pre sampling
+        # restore buffer snapshot, pre sampling only tops up what is missing
+        self.save_buffer = kwargs.get("save_buffer", False)
+        if kwargs.get("ini_buffer_dir", None) is not None:
+            self.buffer.load(kwargs["ini_buffer_dir"])
         while self.buffer.size < kwargs["buffer_warm_size"]:
             samples, _ = self.sampler.sample()
             self.buffer.add_batch(samples)
@@ -72,9 +76,28 @@ class OffSerialTrainer:
         if self.use_gpu:
             self.networks.cuda()
 
+        # sample replay batches on a background thread
+        self.num_prefetch_batches = kwargs.get("num_prefetch_batches", 0)
+        if self.num_prefetch_batches > 0:
+            self.buffer = BatchPrefetcher(
+                self.buffer,
+                self.replay_batch_size,
+                self.num_prefetch_batches,
+                pin_memory=self.use_gpu,
+            )
+
         self.start_time = time.time()
 
     def step(self):
+        replay_samples, sampler_tb_dict = self._sample()
+
+        self.networks.train()
+        alg_tb_dict = self._update(replay_samples)
+        self.networks.eval()
+
+        self._record(alg_tb_dict, sampler_tb_dict)
+
+    def _sample(self):
         # sampling
         sampler_tb_dict = {}
         if self.iteration % self.sample_interval == 0:
@@ -89,22 +112,16 @@ class OffSerialTrainer:
         if self.use_gpu:
             for k, v in replay_samples.items():
                 replay_samples[k] = v.cuda()
+        return replay_samples, sampler_tb_dict
 
-        self.networks.train()
-        if self.per_flag:
-            alg_tb_dict, idx, new_priority = self.alg.local_update(
-                replay_samples, self.iteration
-            )
-            self.buffer.update_batch(idx, new_priority)
-        else:
-            alg_tb_dict = self.alg.local_update(replay_samples, self.iteration)
-        self.networks.eval()
-
+    def _record(self, alg_tb_dict: dict, sampler_tb_dict: dict):
         # log
         if self.iteration % self.log_save_interval == 0:
             print("Iter = ", self.iteration)
             add_scalars(alg_tb_dict, self.writer, step=self.iteration)
             add_scalars(sampler_tb_dict, self.writer, step=self.iteration)
+            if self.num_prefetch_batches > 0:
+                add_scalars(self.buffer.get_tb_info(), self.writer, step=self.iteration)
 
         # save
         if self.iteration % self.apprfunc_save_interval == 0:
@@ -162,11 +179,23 @@ class OffSerialTrainer:
                     self.sampler.get_total_sample_number(),
                 )
 
+    def _update(self, replay_samples: dict) -> dict:
+        if self.per_flag:
+            alg_tb_dict, idx, new_priority = self.alg.local_update(
+                replay_samples, self.iteration
+            )
+            self.buffer.update_batch(idx, new_priority)
+        else:
+            alg_tb_dict = self.alg.local_update(replay_samples, self.iteration)
+        return alg_tb_dict
+
     def train(self):
         while self.iteration < self.max_iteration:
             self.step()
             self.iteration += 1
 
+        if self.num_prefetch_batches > 0:
+            self.buffer.close()
         self.save_apprfunc()
         self.writer.flush()
 
@@ -175,6 +204,8 @@ class OffSerialTrainer:
             self.networks.state_dict(),
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
+        if self.save_buffer:
+            self.buffer.save(os.path.join(self.save_folder, "buffer"))
 
     def _add_eval_task(self):
         with ModuleOnDevice(self.networks, "cpu"):
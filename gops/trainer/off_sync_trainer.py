@@ -14,21 +14,24 @@
 __all__ = ["OffSyncTrainer"]
 
 from cmath import inf
+import collections
 import importlib
 import os
 import random
 import time
 import warnings
 
-import numpy as np
 import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
+from gops.trainer.buffer.replay_buffer import split_batches
+from gops.trainer.sharded_replay import ShardedPrioritizedReplay
+from gops.utils.grad_aggregation import mean_update_info
 from gops.utils.parallel_task_manager import TaskPool
 from gops.utils.tensorboard_setup import add_scalars
 from gops.utils.tensorboard_setup import tb_tags
-from gops.utils.common_utils import random_choice_with_index
+from gops.utils.weight_broadcast import WeightPublisher
 
 warnings.filterwarnings("ignore")
 
@@ -39,10 +42,6 @@ class OffSyncTrainer:
         self.samplers = sampler
         self.buffers = buffer
         self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
-        if self.per_flag and kwargs["num_buffers"] > 1:
-            raise RuntimeError(
-                "Using multiple prioritized_replay_buffers is not supported!"
-            )
         self.evaluator = evaluator
 
         # create center network
@@ -62,7 +61,14 @@ class OffSyncTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # versioned weights for samplers and learners, published once per update
+        self.weights = WeightPublisher(self.networks.networks)
+        self.sampler_modules = ray.get(self.samplers[0].get_weight_modules.remote())
+
         self.replay_batch_size = kwargs["replay_batch_size"]
+        # replay batches fetched per buffer RPC, queued until a learner needs them
+        self.replay_batches_per_request = kwargs.get("replay_batches_per_request", 1)
+        self.replay_queue = collections.deque()
         self.max_iteration = kwargs["max_iteration"]
         self.sample_interval = kwargs.get("sample_interval", 1)
         self.log_save_interval = kwargs["log_save_interval"]
@@ -84,6 +90,15 @@ class OffSyncTrainer:
         self._set_samplers()
 
         self.warm_size = kwargs["buffer_warm_size"]
+        self.save_buffer = kwargs.get("save_buffer", False)
+        if kwargs.get("ini_buffer_dir", None) is not None:
+            # restore buffer snapshots, pre sampling only tops up what is missing
+            ray.get(
+                [
+                    buffer.load.remote(os.path.join(kwargs["ini_buffer_dir"], str(i)))
+                    for i, buffer in enumerate(self.buffers)
+                ]
+            )
         while not all(
             [
                 l >= self.warm_size
@@ -95,6 +110,13 @@ class OffSyncTrainer:
                 random.choice(self.buffers).add_batch.remote(batch_data)
                 self.sample_tasks.add(sampler, sampler.sample.remote())
 
+        # prioritized replay over several buffers samples all of them as one
+        self.sharded_replay = None
+        if self.per_flag and len(self.buffers) > 1:
+            self.sharded_replay = ShardedPrioritizedReplay(
+                self.buffers, kwargs["buffer_max_size"]
+            )
+
         self.learn_tasks = TaskPool()
         self._set_algs()
 
@@ -110,32 +132,50 @@ class OffSyncTrainer:
         self.start_time = time.time()
 
     def _set_samplers(self):
-        weights = self.networks.state_dict()
         for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
+            self.weights.send(sampler, self.sampler_modules)
             self.sample_tasks.add(sampler, sampler.sample.remote())
 
     def _set_algs(self):
-        weights = self.networks.state_dict()
         for alg in self.algs:
             alg.train.remote()
-            alg.load_state_dict.remote(weights)
-            buffer, _ = random_choice_with_index(self.buffers)
-            data = ray.get(buffer.sample_batch.remote(self.replay_batch_size))
+            self.weights.send(alg)
+            data = self._replay()
             self.learn_tasks.add(
-                alg, alg.get_remote_update_info.remote(data, self.iteration)
+                alg, alg.get_packed_update_info.remote(data, self.iteration)
             )
 
+    def _replay(self):
+        if not self.replay_queue:
+            num = self.replay_batches_per_request
+            if self.sharded_replay is not None:
+                block = self.sharded_replay.sample_batches(num, self.replay_batch_size)
+            else:
+                buffer = random.choice(self.buffers)
+                if num == 1:
+                    block = ray.get(buffer.sample_batch.remote(self.replay_batch_size))
+                else:
+                    block = ray.get(
+                        buffer.sample_batches.remote(num, self.replay_batch_size)
+                    )
+            self.replay_queue.extend(split_batches(block, num))
+        return self.replay_queue.popleft()
+
+    def _update_priorities(self, idx, new_priority):
+        if self.sharded_replay is not None:
+            self.sharded_replay.update_batch(idx, new_priority)
+        else:
+            self.buffers[0].update_batch.remote(idx, new_priority)
+
     def step(self):
         # sampling
         sampler_tb_dict = {}
         if self.iteration % self.sample_interval == 0:
             if self.sample_tasks.completed_num > 0:
-                weights = ray.put(self.networks.state_dict())
                 for sampler, objID in self.sample_tasks.completed():
                     batch_data, sampler_tb_dict = ray.get(objID)
                     random.choice(self.buffers).add_batch.remote(batch_data)
-                    sampler.load_state_dict.remote(weights)
+                    self.weights.send(sampler, self.sampler_modules)
                     self.sample_tasks.add(sampler, sampler.sample.remote())
 
         # learning
@@ -147,30 +187,20 @@ class OffSyncTrainer:
                 if self.per_flag:
                     extra_info, update_information = ray.get(objID)
                     alg_tb_dict, idx, new_priority = extra_info
-                    self.buffers[0].update_batch.remote(idx, new_priority)
+                    self._update_priorities(idx, new_priority)
                 else:
                     alg_tb_dict, update_information = ray.get(objID)
 
                 # replay
-                data = ray.get(
-                    random.choice(self.buffers).sample_batch.remote(
-                        self.replay_batch_size
-                    )
-                )
+                data = self._replay()
                 if self.use_gpu:
                     for k, v in data.items():
                         data[k] = v.cuda()
 
-                weights = ray.put(self.networks.state_dict())
-                alg.load_state_dict.remote(weights)
+                self.weights.send(alg)
                 self.learn_tasks.add(
-                    alg, alg.get_remote_update_info.remote(data, self.iteration)
+                    alg, alg.get_packed_update_info.remote(data, self.iteration)
                 )
-                if self.use_gpu:
-                    for k, v in update_information.items():
-                        if isinstance(v, list):
-                            for i in range(len(v)):
-                                update_information[k][i] = v[i].cpu()
 
                 tb_dict.append(alg_tb_dict)
                 update_info.append(update_information)
@@ -178,31 +208,9 @@ class OffSyncTrainer:
             self.iteration += 1
 
             # average gradients
-            num = np.shape(update_info)[0]
-            values_last_time = None
-            for _ in range(num):
-                if _ == 0:
-                    values_last_time = list(update_info[0].values())
-                else:
-                    values_list = []
-                    for a, b in zip(values_last_time, list(update_info[_].values())):
-                        if _ == 1:
-                            if isinstance(a, list):
-                                values_list.append(
-                                    [(i + j) / num for i, j in zip(a, b)]
-                                )
-                            else:
-                                values_list.append((a + b) / num)
-                        else:
-                            if isinstance(a, list):
-                                values_list.append([i + j / num for i, j in zip(a, b)])
-                            else:
-                                values_list.append(a + b / num)
-                    values_last_time = values_list
-
-            keys = update_info[0].keys()
-            update_info = dict(zip(keys, values_last_time))
+            update_info = mean_update_info(update_info)
             self.networks.remote_update(update_info)
+            self.weights.update()
 
             # log
             if self.iteration % (self.log_save_interval) == 0:
@@ -289,6 +297,13 @@ class OffSyncTrainer:
             self.networks.state_dict(),
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
+        if self.save_buffer:
+            ray.get(
+                [
+                    buffer.save.remote(os.path.join(self.save_folder, "buffer", str(i)))
+                    for i, buffer in enumerate(self.buffers)
+                ]
+            )
 
     def _add_eval_task(self):
         self.evaluator.load_state_dict.remote(self.networks.state_dict())
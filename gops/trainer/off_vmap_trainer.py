@@ -0,0 +1,209 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Trainer of several independent off-policy agents in one process with torch.func.vmap
+
+
+__all__ = ["StackedAgents", "OffVmapTrainer"]
+
+import copy
+import json
+import os
+import time
+from typing import List, Sequence
+
+import torch
+import torch.nn as nn
+from torch.func import functional_call, vmap
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_buffer import create_buffer
+from gops.create_pkg.create_evaluator import create_evaluator
+from gops.create_pkg.create_sampler import create_sampler
+from gops.trainer.off_serial_trainer import OffSerialTrainer
+from gops.utils.common_utils import change_type, seed_everything
+from gops.utils.tensorboard_setup import tb_tags
+
+
+class _VmapLosses(nn.Module):
+    """Call `get_vmap_losses` of an algorithm as the forward of a module of its networks."""
+
+    def __init__(self, alg):
+        super().__init__()
+        self.alg = alg
+        self.networks = alg.networks
+
+    def forward(self, data: dict):
+        return self.alg.get_vmap_losses(data)
+
+
+class StackedAgents:
+    """
+    Update algorithms of the same configuration together. Their parameters and
+    buffers are stacked along a leading agent dimension, the losses of
+    `get_vmap_losses` are evaluated for all agents by one vmapped functional
+    call and differentiated once per loss, and each algorithm applies its
+    slice of the gradients with its own optimizers by `remote_update`.
+
+    Args:
+        algs (list): algorithms, each with its own networks.
+    """
+
+    def __init__(self, algs: Sequence):
+        self.algs = list(algs)
+        modules = [_VmapLosses(alg) for alg in self.algs]
+        self.module = modules[0]
+        # name -> tensors of every agent, which own the weights
+        self.agent_params = {
+            name: [dict(m.named_parameters())[name] for m in modules]
+            for name, _ in self.module.named_parameters()
+        }
+        self.agent_buffers = {
+            name: [dict(m.named_buffers())[name] for m in modules]
+            for name, _ in self.module.named_buffers()
+        }
+        with torch.no_grad():
+            self.params = {
+                name: torch.stack(tensors).requires_grad_(tensors[0].requires_grad)
+                for name, tensors in self.agent_params.items()
+            }
+            self.buffers = {
+                name: torch.stack(tensors) for name, tensors in self.agent_buffers.items()
+            }
+
+    def _losses(self, params: dict, buffers: dict, data: dict):
+        return functional_call(self.module, (params, buffers), (data,))
+
+    def _trained_params(self, name: str) -> List[str]:
+        prefix = "networks." + name
+        return [n for n in self.params if n == prefix or n.startswith(prefix + ".")]
+
+    def update(self, data: Sequence[dict], iteration: int) -> List[dict]:
+        """Update every agent on its own replay batch and return their tb infos."""
+        with torch.no_grad():
+            for name, stacked in self.params.items():
+                torch.stack(self.agent_params[name], out=stacked)
+            for name, stacked in self.buffers.items():
+                torch.stack(self.agent_buffers[name], out=stacked)
+        data = {k: torch.stack([d[k] for d in data]) for k in data[0]}
+
+        losses, tb_info = vmap(self._losses, randomness="different")(
+            self.params, self.buffers, data
+        )
+        grads = {}
+        for names, loss in losses.items():
+            trained = [n for name in names for n in self._trained_params(name)]
+            grads.update(
+                zip(
+                    trained,
+                    torch.autograd.grad(
+                        loss.sum(), [self.params[n] for n in trained], retain_graph=True
+                    ),
+                )
+            )
+
+        tb_infos = []
+        for k, alg in enumerate(self.algs):
+            update_info = {"iteration": iteration}
+            for names in losses:
+                for name in names:
+                    attr = getattr(alg.networks, name)
+                    if isinstance(attr, nn.Parameter):
+                        update_info[name + "_grad"] = grads["networks." + name][k]
+                    else:
+                        update_info[name + "_grad"] = [
+                            grads["networks." + name + "." + n][k]
+                            for n, _ in attr.named_parameters()
+                        ]
+            alg.remote_update(update_info)
+            tb_infos.append({tag: v[k].item() for tag, v in tb_info.items()})
+        return tb_infos
+
+
+class OffVmapTrainer:
+    """
+    Train `num_agents` independent agents of one configuration in one process,
+    e.g. to run a sweep over seeds. Agent k uses seed `seed + k` and has its own
+    networks, optimizers, sampler, replay buffer and evaluator, each run as by
+    OffSerialTrainer and saving to its own result folder: `save_folder` for the
+    first agent, which is built from the given components, and
+    `save_folder_seed<seed + k>` for the others, built like it and taking the
+    hyperparameters set on its algorithm. The agents are updated together in
+    lockstep by StackedAgents, so their forward and backward passes run
+    batched over the agents instead of one small network at a time.
+
+    The algorithm must implement `get_vmap_losses`; agents draw their
+    randomness from the global generator of this process.
+
+    Args:
+        num_agents (int): number of agents, including the given one.
+    """
+
+    def __init__(self, alg, sampler, buffer, evaluator, **kwargs):
+        assert not kwargs["use_gpu"], "OffVmapTrainer runs agents on cpu"
+        assert (
+            kwargs["buffer_name"] == "replay_buffer"
+        ), "OffVmapTrainer does not support prioritized replay"
+        self.num_agents = kwargs.get("num_agents", 2)
+        self.max_iteration = kwargs["max_iteration"]
+        self.iteration = 0
+
+        self.agents = [OffSerialTrainer(alg, sampler, buffer, evaluator, **kwargs)]
+        for index in range(1, self.num_agents):
+            self.agents.append(self._create_agent(index, alg.get_parameters(), **kwargs))
+        self.save_folders = [agent.save_folder for agent in self.agents]
+        self.stacked = StackedAgents([agent.alg for agent in self.agents])
+
+    @staticmethod
+    def _create_agent(index: int, alg_parameters: dict, **kwargs) -> OffSerialTrainer:
+        seed = (kwargs["seed"] + index) % 2 ** 32
+        save_folder = kwargs["save_folder"] + "_seed{}".format(seed)
+        kwargs.update({"seed": seed, "save_folder": save_folder})
+        os.makedirs(save_folder + "/apprfunc", exist_ok=True)
+        os.makedirs(save_folder + "/evaluator", exist_ok=True)
+        config = {k: v for k, v in kwargs.items() if k != "additional_info"}
+        with open(save_folder + "/config.json", "w", encoding="utf-8") as f:
+            json.dump(change_type(copy.deepcopy(config)), f, ensure_ascii=False, indent=4)
+
+        seed_everything(seed)
+        alg = create_alg(**kwargs)
+        alg.set_parameters(alg_parameters)
+        sampler = create_sampler(**kwargs)
+        buffer = create_buffer(**kwargs)
+        evaluator = create_evaluator(**kwargs)
+        return OffSerialTrainer(alg, sampler, buffer, evaluator, **kwargs)
+
+    def step(self):
+        replay_samples, sampler_tb_dicts = zip(*(agent._sample() for agent in self.agents))
+
+        start_time = time.time()
+        for agent in self.agents:
+            agent.networks.train()
+        alg_tb_dicts = self.stacked.update(replay_samples, self.iteration)
+        for agent in self.agents:
+            agent.networks.eval()
+        alg_time = (time.time() - start_time) * 1000
+
+        for agent, alg_tb_dict, sampler_tb_dict in zip(
+            self.agents, alg_tb_dicts, sampler_tb_dicts
+        ):
+            alg_tb_dict[tb_tags["alg_time"]] = alg_time
+            agent._record(alg_tb_dict, sampler_tb_dict)
+
+    def train(self):
+        while self.iteration < self.max_iteration:
+            self.step()
+            self.iteration += 1
+            for agent in self.agents:
+                agent.iteration = self.iteration
+
+        for agent in self.agents:
+            if agent.num_prefetch_batches > 0:
+                agent.buffer.close()
+            agent.save_apprfunc()
+            agent.writer.flush()
@@ -24,6 +24,7 @@ from torch.utils.tensorboard import SummaryWriter
 
 from gops.utils.parallel_task_manager import TaskPool
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
+from gops.utils.weight_broadcast import WeightPublisher
 
 warnings.filterwarnings("ignore")
 
@@ -51,6 +52,10 @@ class OnSyncTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # versioned weights for samplers, published once per update
+        self.weights = WeightPublisher(self.networks.networks)
+        self.sampler_modules = ray.get(self.samplers[0].get_weight_modules.remote())
+
         self.max_iteration = kwargs["max_iteration"]
         self.log_save_interval = kwargs["log_save_interval"]
         self.apprfunc_save_interval = kwargs["apprfunc_save_interval"]
@@ -79,9 +84,8 @@ class OnSyncTrainer:
 
     def step(self):
         # sampling
-        weights = ray.put(self.networks.state_dict())
         for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
+            self.weights.send(sampler, self.sampler_modules)
         samples, sampler_tb_dict = zip(
             *ray.get(
                 [
@@ -99,6 +103,7 @@ class OnSyncTrainer:
                 all_samples[k] = v.cuda()
         alg_tb_dict = self.alg.local_update(all_samples, self.iteration)
         self.networks.load_state_dict(self.alg.state_dict())
+        self.weights.update()
 
         # log
         if self.iteration % self.log_save_interval == 0:
@@ -11,7 +11,7 @@
 
 
 from abc import ABCMeta, abstractmethod
-from typing import List, NamedTuple, Tuple, Union
+from typing import NamedTuple, Optional, Tuple
 import time
 
 import numpy as np
@@ -20,12 +20,21 @@ import torch
 from gops.create_pkg.create_env import create_env
 from gops.create_pkg.create_alg import create_approx_contrainer
 from gops.env.vector.vector_env import VectorEnv
+from gops.trainer.buffer.replay_buffer import StateLayout
 from gops.utils.common_utils import set_seed
 from gops.utils.explore_noise import GaussNoise, EpsilonGreedy
 from gops.utils.tensorboard_setup import tb_tags
+from gops.utils.weight_broadcast import load_flat_weights
 
 
 class Experience(NamedTuple):
+    """
+    Transitions of one environment step. Samplers produce them batched, i.e.
+    every field holds all environments of the step along the first dimension
+    and the infos hold the additional info of the env, batched the same way,
+    and the time-limit flags under "TimeLimit.truncated". Buffers also accept
+    lists of unbatched experiences.
+    """
     obs: np.ndarray
     action: np.ndarray
     reward: float
@@ -37,6 +46,9 @@ class Experience(NamedTuple):
 
 
 class BaseSampler(metaclass=ABCMeta):
+    # modules of the networks used for sampling
+    weight_modules = ("policy",)
+
     def __init__(
         self, 
         sample_batch_size,
@@ -68,19 +80,34 @@ class BaseSampler(metaclass=ABCMeta):
             elif self.action_type == "discret":
                 self.noise_processor = EpsilonGreedy(**self.noise_params)
         
+        self.info_keys = list(kwargs["additional_info"].keys())
+        # State infos of env_gen_ocp, written to columnar batches leaf by leaf
+        self.state_layouts = {
+            k: StateLayout(v)
+            for k, v in kwargs["additional_info"].items()
+            if not isinstance(v, dict)
+        }
+
         self.total_sample_number = 0
-        self.obs, self.info = self.env.reset()
-        if self._is_vector:
-            # convert a dict of batched data to a list of dict of unbatched data
-            # e.g. next_info = {"a": [1, 2, 3], "b": [4, 5, 6]} ->
-            #      unbatched_infos = [{"a": 1, "b": 4}, {"a": 2, "b": 5}, {"a": 3, "b": 6}]
-            # ref: https://stackoverflow.com/questions/5558418/list-of-dicts-to-from-dict-of-lists
-            self.info = [dict(zip(self.info, t)) for t in zip(*self.info.values())] if self.info else [{}] * self.num_envs
+        self.obs, info = self.env.reset()
+        self.info = self._batch_info(info)
 
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
 
-    def sample(self) -> Tuple[Union[List[Experience], dict], dict]:
+    def get_weight_modules(self) -> Optional[tuple]:
+        """
+        Names of the modules whose weights the sampler needs, or None for all
+        weights, e.g. when the policy is a function of another network.
+        """
+        if all(isinstance(getattr(self.networks, n, None), torch.nn.Module) for n in self.weight_modules):
+            return self.weight_modules
+        return None
+
+    def load_flat_weights(self, flat, names=None):
+        load_flat_weights(self.networks, flat, names)
+
+    def sample(self) -> Tuple[dict, dict]:
         self.total_sample_number += self.sample_batch_size
         tb_info = dict()
         start_time = time.perf_counter()
@@ -92,13 +119,31 @@ class BaseSampler(metaclass=ABCMeta):
         return data, tb_info
     
     @abstractmethod
-    def _sample(self) -> Union[List[Experience], dict]:
+    def _sample(self) -> dict:
         pass
 
     def get_total_sample_number(self) -> int:
         return self.total_sample_number
     
-    def _step(self) -> List[Experience]:
+    def _batch_info(self, info: dict, final_info: Optional[dict] = None) -> dict:
+        """
+        Batch the additional info of a step along the first dimension. For vector
+        envs, `final_info` maps the index of each environment that was reset to
+        the info of its last step, which replaces the info after the reset.
+        """
+        batched = {}
+        for k in self.info_keys:
+            values = list(info[k]) if self._is_vector else [info[k]]
+            if final_info is not None:
+                for i, last_info in final_info.items():
+                    values[i] = last_info[k]
+            if k in self.state_layouts:
+                batched[k] = values[0].__class__.stack(values)
+            else:
+                batched[k] = np.stack(values)
+        return batched
+
+    def _step(self) -> Experience:
         # take action using behavior policy
         if not self._is_vector:
             batch_obs = torch.from_numpy(
@@ -133,31 +178,35 @@ class BaseSampler(metaclass=ABCMeta):
             # For vector env, next_obs, reward, terminated, truncated, and next_info are batched data,
             # and vector env will automatically reset the environment when terminated or truncated is True,
             # So we need to get real final observation and info from next_info.
-
-            # Get real final observation
+            reset_obs = next_obs.copy()
+            reset_info = self._batch_info(next_info)
             if "final_observation" in next_info.keys():
                 # get the index where next_info["_final_observation"] is True
                 index = np.where(next_info["_final_observation"])[0]
                 next_obs[index, :] = np.stack(next_info["final_observation"][index])
-                
-            
-            # convert a dict of batched data to a list of dicts of unbatched data
-            # e.g. next_info = {"a": [1, 2, 3], "b": [4, 5, 6]} ->
-            #      unbatched_infos = [{"a": 1, "b": 4}, {"a": 2, "b": 5}, {"a": 3, "b": 6}]
-            # ref: https://stackoverflow.com/questions/5558418/list-of-dicts-to-from-dict-of-lists
-            unbatched_infos = [dict(zip(next_info, t)) for t in zip(*next_info.values())]
-            
-            # Get real final info
-            if "final_info" in next_info.keys():
-                for i in index:
-                    unbatched_infos[i] = next_info["final_info"][i]
+                next_info = self._batch_info(
+                    next_info, {i: next_info["final_info"][i] for i in index}
+                )
+            else:
+                next_info = dict(reset_info)
+            next_info["TimeLimit.truncated"] = np.asarray(truncated)
 
-            experiences = [Experience(*e) for e in zip(self.obs, action, reward, terminated, self.info, next_obs, unbatched_infos, logp)]
+            experience = Experience(
+                obs=self.obs,
+                action=action,
+                reward=np.asarray(reward),
+                done=np.asarray(terminated),
+                info=self.info,
+                next_obs=next_obs,
+                next_info=next_info,
+                logp=logp,
+            )
 
-            self.obs = next_obs
-            self.info = unbatched_infos
+            # the policy continues from the observations after the reset
+            self.obs = reset_obs
+            self.info = reset_info
 
-            return experiences
+            return experience
             
         else:
             next_obs, reward, done, next_info = self.env.step(action_clip)
@@ -165,23 +214,26 @@ class BaseSampler(metaclass=ABCMeta):
             # TODO: deprecate this after changing to gymnasium
             if "TimeLimit.truncated" not in next_info.keys():
                 next_info["TimeLimit.truncated"] = False
-            if next_info["TimeLimit.truncated"]:
+            truncated = next_info["TimeLimit.truncated"]
+            if truncated:
                 done = False
+            batched_next_info = self._batch_info(next_info)
         
             experience = Experience(
-                obs=self.obs.copy(),
-                action=action,
-                reward=self.reward_scale * reward,
-                done=done,
+                obs=np.array([self.obs]),
+                action=np.expand_dims(action, 0),
+                reward=np.array([self.reward_scale * reward]),
+                done=np.array([done]),
                 info=self.info,
-                next_obs=next_obs.copy(),
-                next_info=next_info,
-                logp=logp,
+                next_obs=np.array([next_obs]),
+                next_info=dict(batched_next_info, **{"TimeLimit.truncated": np.array([truncated])}),
+                logp=np.expand_dims(logp, 0),
             )
             
             self.obs = next_obs
-            self.info = next_info
-            if done or next_info["TimeLimit.truncated"]:
-                self.obs, self.info = self.env.reset()
+            self.info = batched_next_info
+            if done or truncated:
+                self.obs, info = self.env.reset()
+                self.info = self._batch_info(info)
 
-            return [experience]
+            return experience
@@ -0,0 +1,197 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Sampler rolling out the environment model in batched torch
+
+
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from gops.create_pkg.create_env_model import create_env_model
+from gops.trainer.sampler.base import BaseSampler
+
+
+class ModelSampler(BaseSampler):
+    """
+    Sampler stepping many rollouts of the registered environment model at once.
+
+    `model_env_num` rollouts run in parallel, so every call of `sample` steps
+    the model `sample_batch_size // model_env_num` times with batches of width
+    `model_env_num`. A rollout is reset after it terminates or reaches the time
+    limit of the env, where a time limit does not count as done, as in the
+    other samplers. The output is the environment-major columnar batch of
+    OffSampler, so it goes to the replay buffers as is.
+
+    When the observation of the env is its state and it has no additional info,
+    initial states are drawn in torch from the `init_space` of the env, which is
+    its `train_space` (the `work_space` unless given), with its
+    `initial_distribution`. Other envs, e.g. those tracking a reference, compute
+    the model infos in their reset, so rollouts are reset with the numpy env one
+    at a time; this costs one `reset` per finished episode, not per step.
+
+    Args:
+        model_env_num (int): number of parallel rollouts, defaults to
+            `sample_batch_size`.
+    """
+
+    def __init__(
+        self,
+        sample_batch_size,
+        index=0,
+        noise_params=None,
+        **kwargs
+    ):
+        super().__init__(
+            sample_batch_size,
+            index,
+            noise_params,
+            **kwargs
+        )
+        assert self.action_type == "continu", "ModelSampler supports continuous actions only"
+        # rollouts run on cpu like the networks of the other samplers
+        self.model = create_env_model(**dict(kwargs, use_gpu=False))
+        self.num_envs = kwargs.get("model_env_num", sample_batch_size)
+        assert self.sample_batch_size % self.num_envs == 0, (
+            "sample_batch_size must be divisible by model_env_num"
+        )
+        self.horizon = self.sample_batch_size // self.num_envs
+
+        env = self.env.unwrapped
+        self.max_episode_steps = kwargs.get("max_episode_steps", None)
+        if self.max_episode_steps is None:
+            self.max_episode_steps = getattr(env, "max_episode_steps", None)
+        self.action_low = torch.as_tensor(self.env.action_space.low, dtype=torch.float32)
+        self.action_high = torch.as_tensor(self.env.action_space.high, dtype=torch.float32)
+
+        self.batched_reset = (
+            not self.info_keys
+            and hasattr(env, "init_space")
+            and np.shape(env.init_space)[1:] == self.env.observation_space.shape
+        )
+        if self.batched_reset:
+            self.initial_distribution = getattr(env, "initial_distribution", "uniform")
+            obs_shift, obs_scale = kwargs.get("obs_shift", None), kwargs.get("obs_scale", None)
+            self.obs_shift = torch.as_tensor(0.0 if obs_shift is None else obs_shift, dtype=torch.float32)
+            self.obs_scale = torch.as_tensor(1.0 if obs_scale is None else obs_scale, dtype=torch.float32)
+
+        self.steps = torch.zeros(self.num_envs, dtype=torch.int64)
+        self.obs, self.info = self._reset(self.num_envs)
+        # infos the model is stepped with, other outputs of the model are dropped
+        self.model_info_keys = list(self.info.keys())
+
+    def _sample(self) -> dict:
+        batch_data = {}
+        for t in range(self.horizon):
+            for k, v in self._columns(*self._step()).items():
+                if k not in batch_data:
+                    batch_data[k] = torch.empty(
+                        (self.num_envs, self.horizon) + v.shape[1:], dtype=v.dtype
+                    )
+                batch_data[k][:, t] = v
+        return {
+            k: v.reshape((-1,) + v.shape[2:]).numpy() for k, v in batch_data.items()
+        }
+
+    @torch.no_grad()
+    def _step(self) -> Tuple:
+        logits = self.networks.policy(self.obs)
+        action_distribution = self.networks.create_action_distributions(logits)
+        action, logp = action_distribution.sample()
+        if self.noise_params is not None:
+            action = torch.as_tensor(
+                self.noise_processor.sample(action.numpy()), dtype=torch.float32
+            )
+        action = torch.max(torch.min(action, self.action_high), self.action_low)
+
+        next_obs, reward, terminated, next_info = self.model.forward(
+            self.obs, action, torch.zeros(self.num_envs, dtype=torch.bool), self.info
+        )
+        self.steps += 1
+        if self.max_episode_steps is None:
+            truncated = torch.zeros(self.num_envs, dtype=torch.bool)
+        else:
+            truncated = self.steps >= self.max_episode_steps
+        done = terminated.bool() & ~truncated
+        transition = (
+            self.obs, action, self.reward_scale * reward, done, self.info,
+            next_obs, next_info, logp,
+        )
+
+        # start new episodes for the rollouts that ended
+        self.obs = next_obs
+        self.info = {k: next_info[k] for k in self.model_info_keys}
+        reset_idx = torch.nonzero(done | truncated).squeeze(1)
+        if len(reset_idx) > 0:
+            reset_obs, reset_info = self._reset(len(reset_idx))
+            self.obs = self.obs.clone()
+            self.obs[reset_idx] = reset_obs
+            self.info = {
+                k: self._replace_rows(k, self.info[k], reset_idx, reset_info[k])
+                for k in self.model_info_keys
+            }
+            self.steps[reset_idx] = 0
+        return transition
+
+    def _columns(self, obs, action, reward, done, info, next_obs, next_info, logp) -> dict:
+        columns = {
+            "obs": obs,
+            "obs2": next_obs,
+            "act": action,
+            "rew": reward.float(),
+            "done": done,
+            "logp": logp,
+        }
+        for k in self.info_keys:
+            for key, value in ((k, info[k]), ("next_" + k, next_info[k])):
+                layout = self.state_layouts.get(k, None)
+                if layout is None:
+                    columns[key] = torch.as_tensor(value)
+                else:
+                    for name, leaf in zip(layout.names, layout.flatten(value)):
+                        columns[key + "." + name] = leaf
+        return columns
+
+    def _reset(self, num: int) -> Tuple[torch.Tensor, dict]:
+        """Initial observations and model infos of `num` new rollouts."""
+        if self.batched_reset:
+            low, high = (torch.as_tensor(s, dtype=torch.float32) for s in self.env.unwrapped.init_space)
+            if self.initial_distribution == "uniform":
+                state = low + (high - low) * torch.rand(num, len(low))
+            elif self.initial_distribution == "normal":
+                state = (low + high) / 2 + (high - low) / 6 * torch.randn(num, len(low))
+            else:
+                raise ValueError(
+                    f"Invalid initial distribution: {self.initial_distribution}!"
+                )
+            return (state + self.obs_shift) * self.obs_scale, {}
+
+        obs, infos = zip(*(self.env.reset() for _ in range(num)))
+        info = {}
+        for k in infos[0].keys():
+            values = [i[k] for i in infos]
+            if k in self.state_layouts:
+                info[k] = values[0].__class__.stack(values).array2tensor()
+            else:
+                value = np.stack(values)
+                if np.issubdtype(value.dtype, np.floating):
+                    value = value.astype(np.float32)
+                info[k] = torch.from_numpy(value)
+        return torch.as_tensor(np.stack(obs), dtype=torch.float32), info
+
+    def _replace_rows(self, key: str, value, idx: torch.Tensor, new_value):
+        layout = self.state_layouts.get(key, None)
+        if layout is None:
+            value = value.clone()
+            value[idx] = new_value.to(value.dtype)
+            return value
+        leaves = [leaf.clone() for leaf in layout.flatten(value)]
+        for leaf, new_leaf in zip(leaves, layout.flatten(new_value)):
+            leaf[idx] = new_leaf.to(leaf.dtype)
+        return layout.unflatten(leaves)
@@ -12,7 +12,7 @@
 #  Update Date: 2023-07-22, Zhilong Zheng: inherit from BaseSampler
 
 
-from typing import List
+import numpy as np
 
 from gops.trainer.sampler.base import BaseSampler, Experience
 
@@ -32,9 +32,37 @@ class OffSampler(BaseSampler):
             **kwargs
         )
     
-    def _sample(self) -> List[Experience]:
-        batch_data = []
-        for _ in range(self.horizon):
-            experiences = self._step()
-            batch_data.extend(experiences)
-        return batch_data
\ No newline at end of file
+    def _sample(self) -> dict:
+        # columnar batch keyed like the replay buffer storage, allocated at the
+        # first step; the environment-major layout keeps the steps of each
+        # environment next to each other once flattened
+        batch_data = None
+        for t in range(self.horizon):
+            columns = self._columns(self._step())
+            if batch_data is None:
+                batch_data = {
+                    k: np.empty((self.num_envs, self.horizon) + v.shape[1:], dtype=v.dtype)
+                    for k, v in columns.items()
+                }
+            for k, v in columns.items():
+                batch_data[k][:, t] = v
+        return {k: v.reshape((-1,) + v.shape[2:]) for k, v in batch_data.items()}
+
+    def _columns(self, experience: Experience) -> dict:
+        columns = {
+            "obs": np.asarray(experience.obs),
+            "obs2": np.asarray(experience.next_obs),
+            "act": np.asarray(experience.action),
+            "rew": np.asarray(experience.reward),
+            "done": np.asarray(experience.done),
+            "logp": np.asarray(experience.logp),
+        }
+        for k in self.info_keys:
+            for key, info in ((k, experience.info), ("next_" + k, experience.next_info)):
+                layout = self.state_layouts.get(k, None)
+                if layout is None:
+                    columns[key] = info[k]
+                else:
+                    for name, leaf in zip(layout.names, layout.flatten(info[k])):
+                        columns[key + "." + name] = leaf
+        return columns
\ No newline at end of file
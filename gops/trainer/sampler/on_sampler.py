@@ -13,8 +13,6 @@
 #  Update Date: 2023-07-22, Zhilong Zheng: inherit from BaseSampler
 
 
-from typing import List
-
 import numpy as np
 import torch
 
@@ -22,6 +20,8 @@ from gops.trainer.sampler.base import BaseSampler, Experience
 
 
 class OnSampler(BaseSampler):
+    weight_modules = ("policy", "value")
+
     def __init__(
         self, 
         sample_batch_size,
@@ -56,11 +56,15 @@ class OnSampler(BaseSampler):
         self.mb_tlim = np.zeros((self.num_envs, self.horizon), dtype=np.bool_)
         self.mb_logp = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
         self.need_value_flag = not (alg_name == "FHADP" or alg_name == "INFADP")
+        if not self.need_value_flag:
+            self.weight_modules = ("policy",)
         if self.need_value_flag:
             self.gae_lambda = 0.95
             self.mb_val = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
             self.mb_adv = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
             self.mb_ret = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
+            # steps ending a trajectory slice, bootstrapped from their next observation
+            self.mb_end = np.zeros((self.num_envs, self.horizon), dtype=np.bool_)
         self.mb_info = {}
         self.info_keys = kwargs["additional_info"].keys()
         for k, v in kwargs["additional_info"].items():
@@ -72,19 +76,13 @@ class OnSampler(BaseSampler):
             )
 
     def _sample(self) -> dict:
-        self.ptr = np.zeros(self.num_envs, dtype=np.int32)
-        self.last_ptr = np.zeros(self.num_envs, dtype=np.int32)
+        self.end_obs = []
         for t in range(self.horizon):
-            # batch_obs has shape (num_envs, obs_dim)
-            if not self._is_vector:
-                batch_obs = torch.from_numpy(
-                    np.expand_dims(self.obs, axis=0).astype("float32")
-                )
-            else:
-                batch_obs = torch.from_numpy(self.obs.astype("float32"))
             # interact with environment
-            experiences = self._step()
-            self._process_experiences(experiences, batch_obs, t)
+            experience = self._step()
+            self._process_experiences(experience, t)
+        if self.need_value_flag:
+            self._compute_gae()
 
         # wrap collected data into replay format
         mb_data = {
@@ -109,79 +107,65 @@ class OnSampler(BaseSampler):
 
     def _process_experiences(
         self, 
-        experiences: List[Experience],
-        batch_obs: np.ndarray, 
+        experience: Experience,
         t: int
     ):
+        (
+            obs, 
+            action, 
+            reward, 
+            done, 
+            info, 
+            next_obs, 
+            next_info, 
+            logp,
+        ) = experience
+        time_limited = next_info["TimeLimit.truncated"]
+
+        self.mb_obs[:, t, ...] = obs
+        self.mb_act[:, t, ...] = action
+        self.mb_rew[:, t] = reward
+        self.mb_done[:, t] = done
+        self.mb_tlim[:, t] = time_limited
+        self.mb_logp[:, t] = logp
+
+        for key in self.info_keys:
+            self.mb_info[key][:, t] = info[key]
+            self.mb_info["next_" + key][:, t] = next_info[key]
+
         if self.need_value_flag:
-            value = self.networks.value(batch_obs).detach()
-            self.mb_val[:, t] = value
-        
-        for i in np.arange(self.num_envs):
-            (
-                obs, 
-                action, 
-                reward, 
-                done, 
-                info, 
-                next_obs, 
-                next_info, 
-                logp,
-            ) = experiences[i]
-
-            (
-                self.mb_obs[i, t, ...],
-                self.mb_act[i, t, ...],
-                self.mb_rew[i, t],
-                self.mb_done[i, t],
-                self.mb_tlim[i, t],
-                self.mb_logp[i, t],
-            ) = (
-                obs,
-                action,
-                reward,
-                done,
-                next_info["TimeLimit.truncated"],
-                logp,
-            )
+            if t == self.horizon - 1:
+                end = np.ones(self.num_envs, dtype=np.bool_)
+            else:
+                end = np.logical_or(done, time_limited)
+            self.mb_end[:, t] = end
+            self.end_obs.append((np.flatnonzero(end), t, np.asarray(next_obs)[end]))
 
-            for key in self.info_keys:
-                self.mb_info[key][i, t] = info[key]
-                self.mb_info["next_" + key][i, t] = next_info[key]
-
-            # calculate value target (mb_ret) & gae (mb_adv)
-            if (
-                done
-                or next_info["TimeLimit.truncated"]
-                or t == self.horizon - 1
-            ) and self.need_value_flag:
-                last_obs_expand = torch.from_numpy(
-                    np.expand_dims(next_obs, axis=0).astype("float32")
-                )
-                est_last_value = self.networks.value(
-                    last_obs_expand
-                ).detach().item() * (1 - done)
-                self.ptr[i] = t
-                self._finish_trajs(i, est_last_value)
-                self.last_ptr[i] = self.ptr[i]
-
-    def _finish_trajs(self, env_index: int, est_last_val: float):
-        # calculate value target (mb_ret) & gae (mb_adv) whenever episode is finished
-        path_slice = slice(self.last_ptr[env_index], self.ptr[env_index] + 1)
-        value_preds_slice = np.append(self.mb_val[env_index, path_slice], est_last_val)
-        rews_slice = self.mb_rew[env_index, path_slice]
-        length = len(rews_slice)
-        ret = np.zeros(length)
-        adv = np.zeros(length)
-        gae = 0.0
-        for i in reversed(range(length)):
-            delta = (
-                rews_slice[i]
-                + self.gamma * value_preds_slice[i + 1]
-                - value_preds_slice[i]
+    def _compute_gae(self):
+        # value of every visited state and bootstrap value of every slice end
+        # in a single batched call
+        end_env = np.concatenate([env_idx for env_idx, _, _ in self.end_obs])
+        end_t = np.concatenate([np.full(len(env_idx), t) for env_idx, t, _ in self.end_obs])
+        end_obs = np.concatenate([obs for _, _, obs in self.end_obs]).astype(np.float32)
+        values = self.networks.value(
+            torch.from_numpy(
+                np.concatenate((self.mb_obs.reshape(-1, *self.obs_dim), end_obs))
             )
-            gae = delta + self.gamma * self.gae_lambda * gae
-            ret[i] = gae + value_preds_slice[i]
-            adv[i] = gae
-        self.mb_ret[env_index, path_slice] = ret
-        self.mb_adv[env_index, path_slice] = adv
+        ).detach().numpy()
+        self.mb_val[:] = values[:self.num_envs * self.horizon].reshape(self.num_envs, self.horizon)
+
+        next_val = np.empty_like(self.mb_val)
+        next_val[:, :-1] = self.mb_val[:, 1:]
+        next_val[end_env, end_t] = values[self.num_envs * self.horizon:] * (
+            1 - self.mb_done[end_env, end_t]
+        )
+
+        # reverse scan over the whole (num_envs, horizon) block, where a slice
+        # end stops the accumulation of gae
+        delta = self.mb_rew + self.gamma * next_val - self.mb_val
+        decay = self.gamma * self.gae_lambda * (1 - self.mb_end)
+        gae = np.zeros(self.num_envs)
+        for t in reversed(range(self.horizon)):
+            gae = delta[:, t] + decay[:, t] * gae
+            self.mb_adv[:, t] = gae
+        self.mb_ret[:] = self.mb_adv + self.mb_val
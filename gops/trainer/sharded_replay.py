@@ -0,0 +1,88 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Prioritized replay sharded over several buffer actors
+
+
+__all__ = ["ShardedPrioritizedReplay"]
+
+from typing import List
+
+import numpy as np
+import ray
+import torch
+
+
+def _concat(values: list):
+    if isinstance(values[0], torch.Tensor):
+        return torch.cat(values)
+    # State of env_gen_ocp
+    return values[0].__class__.concat(values)
+
+
+class ShardedPrioritizedReplay:
+    """
+    Prioritized replay over several PrioritizedReplayBuffer actors.
+
+    Each shard keeps the sum tree of its own samples. A batch is split among the
+    shards by stratified draws over their total priority masses, every shard
+    draws its part stratified over its own priorities, and the importance
+    weights are computed from the statistics of all shards, so samples are drawn
+    as if from one buffer holding all of them. Sampled indices are global and
+    priority updates are routed back to the owning shard.
+
+    Shard statistics are requested right after each sampling round and read at
+    the next one, so they lag by at most one round instead of costing an extra
+    round trip per batch.
+
+    Args:
+        buffers: handles of the PrioritizedReplayBuffer actors, where the one at
+            position i was created with index i.
+        max_size (int): buffer_max_size of every shard.
+    """
+
+    def __init__(self, buffers: List, max_size: int):
+        self.buffers = buffers
+        self.max_size = max_size
+        self.beta, self.beta_increment = ray.get(buffers[0].beta_schedule.remote())
+        self.stats_refs = [buffer.priority_stats.remote() for buffer in buffers]
+
+    def sample_batch(self, batch_size: int) -> dict:
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        totals, mins, sizes = map(np.array, zip(*ray.get(self.stats_refs)))
+        total = totals.sum()
+        min_priority = mins[sizes > 0].min()
+
+        values = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * (total / batch_size)
+        shard_idxes = np.minimum(
+            np.searchsorted(np.cumsum(totals), values, side="right"), len(self.buffers) - 1
+        )
+        counts = np.bincount(shard_idxes, minlength=len(self.buffers))
+        refs = [
+            buffer.sample_shard.remote(int(count), total, min_priority, int(sizes.sum()), self.beta)
+            for buffer, count in zip(self.buffers, counts)
+            if count > 0
+        ]
+        self.stats_refs = [buffer.priority_stats.remote() for buffer in self.buffers]
+        batches = ray.get(refs)
+        return {k: _concat([b[k] for b in batches]) for k in batches[0].keys()}
+
+    def sample_batches(self, num: int, batch_size: int) -> dict:
+        # advance beta once per replay batch, as separate sample_batch calls would
+        self.beta = min(1.0, self.beta + (num - 1) * self.beta_increment)
+        return self.sample_batch(num * batch_size)
+
+    def update_batch(self, idxes, priorities) -> None:
+        if isinstance(idxes, torch.Tensor):
+            idxes = idxes.detach().cpu().numpy()
+        if isinstance(priorities, torch.Tensor):
+            priorities = priorities.detach().cpu().numpy()
+        shard_idxes = idxes // self.max_size
+        for i in np.unique(shard_idxes):
+            mask = shard_idxes == i
+            self.buffers[i].update_batch.remote(idxes[mask], priorities[mask])
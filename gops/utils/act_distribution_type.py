@@ -39,7 +39,8 @@ class TanhGaussDistribution:
         return action_limited, log_prob
 
     def rsample(self):
-        action = self.gauss_distribution.rsample()
+        # same draw as Normal.rsample, which is not random per batch under torch.func.vmap
+        action = self.mean + torch.randn_like(self.mean) * self.std
         action_limited = (self.act_high_lim - self.act_low_lim) / 2 * torch.tanh(
             action
         ) + (self.act_high_lim + self.act_low_lim) / 2
@@ -93,7 +94,8 @@ class GaussDistribution:
         return action, log_prob
 
     def rsample(self):
-        action = self.gauss_distribution.rsample()
+        # same draw as Normal.rsample, which is not random per batch under torch.func.vmap
+        action = self.mean + torch.randn_like(self.mean) * self.std
         log_prob = self.gauss_distribution.log_prob(action)
         return action, log_prob
 
@@ -0,0 +1,110 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Flat packing and averaging of remote update infos
+
+
+__all__ = [
+    "pack_update_info",
+    "unpack_update_info",
+    "mean_update_info",
+    "allreduce_update_info",
+]
+
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import torch
+import torch.distributed as dist
+
+FlatTensors = Dict[torch.dtype, torch.Tensor]
+
+
+def pack_update_info(update_info: dict) -> Tuple[FlatTensors, tuple]:
+    """
+    Pack the tensors of an update info returned by `get_remote_update_info`,
+    single or in lists such as the gradients of a network, into one contiguous
+    cpu tensor per dtype. The returned spec records the structure and the other
+    values, e.g. the iteration, to rebuild the update info by `unpack_update_info`.
+    """
+    groups = defaultdict(list)
+
+    def encode(value):
+        if isinstance(value, torch.Tensor):
+            groups[value.dtype].append(value.detach().reshape(-1))
+            return "tensor", value.dtype, tuple(value.shape)
+        if isinstance(value, (list, tuple)):
+            return "list", tuple(encode(v) for v in value)
+        return "value", value
+
+    spec = tuple((k, encode(v)) for k, v in update_info.items())
+    flat = {dtype: torch.cat(tensors).cpu() for dtype, tensors in groups.items()}
+    return flat, spec
+
+
+def unpack_update_info(flat: FlatTensors, spec: tuple) -> dict:
+    """Rebuild an update info from `pack_update_info`; its tensors are views of `flat`."""
+    offsets = defaultdict(int)
+
+    def decode(item):
+        kind = item[0]
+        if kind == "tensor":
+            _, dtype, shape = item
+            numel = 1
+            for s in shape:
+                numel *= s
+            start = offsets[dtype]
+            offsets[dtype] += numel
+            return flat[dtype][start:start + numel].view(shape)
+        if kind == "list":
+            return [decode(i) for i in item[1]]
+        return item[1]
+
+    return {k: decode(item) for k, item in spec}
+
+
+def mean_update_info(packed: Sequence[Tuple[FlatTensors, tuple]]) -> dict:
+    """
+    Average packed update infos of several learners with a single flat sum
+    and scale per dtype. Learners must return update infos of the same
+    structure; values other than tensors are taken from the first one.
+    """
+    spec = packed[0][1]
+    assert all(s == spec for _, s in packed), "Learners returned update infos of different structures"
+    if len(packed) == 1:
+        return unpack_update_info(packed[0][0], spec)
+    flats: List[FlatTensors] = [f for f, _ in packed]
+    mean = {}
+    for dtype, first in flats[0].items():
+        # accumulate in place into one new buffer, then scale once
+        total = torch.add(first, flats[1][dtype])
+        for f in flats[2:]:
+            total.add_(f[dtype])
+        mean[dtype] = total.div_(len(flats))
+    return unpack_update_info(mean, spec)
+
+
+def allreduce_update_info(update_info: dict, bucket_numel: int) -> dict:
+    """
+    Average the tensors of an update info over the processes of the default
+    torch.distributed group. The packed tensors are all-reduced in buckets of
+    at most `bucket_numel` elements, which are launched together and waited
+    for at once. Processes must pass update infos of the same structure.
+    """
+    flat, spec = pack_update_info(update_info)
+    works = [
+        dist.all_reduce(bucket, async_op=True)
+        for tensor in flat.values()
+        for bucket in torch.split(tensor, bucket_numel)
+    ]
+    for work in works:
+        work.wait()
+    world_size = dist.get_world_size()
+    for tensor in flat.values():
+        tensor.div_(world_size)
+    return unpack_update_info(flat, spec)
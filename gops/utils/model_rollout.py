@@ -0,0 +1,235 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Compiled and cached multi-step rollout of a policy through an env model
+
+
+__all__ = ["Trajectory", "ModelRollout", "discounted_sum"]
+
+import warnings
+from contextlib import contextmanager
+from typing import Callable, NamedTuple, Optional
+
+import torch
+from torch import nn
+from torch.func import functional_call
+
+from gops.utils.gops_typing import InfoDict
+
+
+@contextmanager
+def _eager_numpy():
+    # numpy calls of env models, e.g. noise from the global generator, run eagerly
+    # instead of being traced into torch ops of other dtype and random stream
+    config = torch._dynamo.config if hasattr(torch, "_dynamo") else None
+    if config is None or not hasattr(config, "trace_numpy"):
+        yield
+        return
+    trace_numpy = config.trace_numpy
+    config.trace_numpy = False
+    try:
+        yield
+    finally:
+        config.trace_numpy = trace_numpy
+
+
+def discounted_sum(values: torch.Tensor, gamma: float) -> torch.Tensor:
+    """Sum `values` of shape (horizon, ...) over the horizon, discounted by `gamma` per step."""
+    discount = gamma ** torch.arange(len(values), dtype=values.dtype, device=values.device)
+    return (values * discount.reshape(-1, *[1] * (values.dim() - 1))).sum(0)
+
+
+class Trajectory(NamedTuple):
+    """
+    Rollout of a batch through an env model: observations of shape
+    (horizon + 1, batch, obs_dim) from the initial one, rewards of shape
+    (horizon, batch), constraints of the model infos of shape
+    (horizon, batch, n) or None if the model gives none, and done of the
+    last step.
+    """
+
+    obs: torch.Tensor
+    rewards: torch.Tensor
+    constraints: Optional[torch.Tensor]
+    done: torch.Tensor
+
+
+class ModelRollout:
+    """
+    Roll out a policy, or a given action sequence, through an env model for
+    the model-based algorithms. One step of policy and model is captured by
+    torch.compile and called once per step of the horizon, so that its many
+    small tensor operations run fused in forward and backward. The compiled
+    step is built at the first rollout, and compilation failures, e.g.
+    without a C++ compiler, fall back to eager execution with a warning.
+    Numpy calls of the model are not traced and run eagerly.
+
+    Within `shared()`, e.g. around the losses of value and policy of one
+    update, the last trajectory is cached, so that the losses share a single
+    differentiable rollout of the same batch with its intermediate
+    observations and constraints. It is reused while the batch, horizon and
+    policy parameters are unchanged, and a trajectory rolled out without
+    gradient is only reused without gradient. The input info, usually the
+    sampled data, is passed to the model as it is and never modified.
+
+    Args:
+        envmodel: env model with `forward(obs, action, done, info)`.
+        policy (nn.Module): policy, for rollouts without given actions.
+        virtual_time (bool): whether the policy is finite-horizon and called
+            as `policy(obs, virtual_t)` at virtual time steps 1, ..., horizon.
+        policy_grad_steps (int): number of first steps whose actions are
+            differentiable w.r.t. the policy parameters; later actions are
+            computed with detached parameters, so gradients only pass through
+            their observations. All steps if None.
+        compile (bool): whether to compile the step with torch.compile.
+    """
+
+    def __init__(
+        self,
+        envmodel,
+        policy: Optional[nn.Module] = None,
+        virtual_time: bool = True,
+        policy_grad_steps: Optional[int] = None,
+        compile: bool = True,
+    ):
+        self.envmodel = envmodel
+        self.policy = policy
+        self.virtual_time = virtual_time
+        self.policy_grad_steps = policy_grad_steps
+        self.compile = compile and hasattr(torch, "compile")
+        self._compiled = {}
+        self._virtual_t = torch.empty(0)
+        self._sharing = False
+        self._cache = None
+        self._steps = 0
+        self._reused_steps = 0
+
+    def __getstate__(self):
+        # compiled steps and the cached trajectory are rebuilt by copies, e.g. in remote learners
+        state = self.__dict__.copy()
+        state["_compiled"] = {}
+        state["_cache"] = None
+        return state
+
+    @contextmanager
+    def shared(self):
+        """Share trajectories between the rollouts within the context."""
+        self._sharing = True
+        try:
+            yield self
+        finally:
+            self._sharing = False
+            self._cache = None
+
+    def _policy_step(self, obs, done, info, virtual_t, params):
+        args = (obs,) if virtual_t is None else (obs, virtual_t)
+        if params is None:
+            action = self.policy(*args)
+        else:
+            action = functional_call(self.policy, params, args)
+        return self.envmodel.forward(obs, action, done, info)
+
+    def _model_step(self, obs, action, done, info):
+        return self.envmodel.forward(obs, action, done, info)
+
+    def _call(self, step: Callable, *args):
+        if self.compile:
+            name = step.__name__
+            if name not in self._compiled:
+                self._compiled[name] = torch.compile(step)
+            try:
+                with _eager_numpy():
+                    return self._compiled[name](*args)
+            except Exception as e:
+                warnings.warn(
+                    "Failed to compile the model rollout, running it eagerly: {}".format(e)
+                )
+                self.compile = False
+        return step(*args)
+
+    def _cache_key(self, obs, done, info, horizon, actions) -> tuple:
+        versions = ()
+        if actions is None:
+            versions = tuple(p._version for p in self.policy.parameters())
+        return (obs, done, info, actions), horizon, versions
+
+    def _lookup(self, key: tuple) -> Optional[Trajectory]:
+        if not self._sharing or self._cache is None:
+            return None
+        cached_key, with_grad, trajectory = self._cache
+        # inputs are compared by identity
+        if (
+            all(a is b for a, b in zip(cached_key[0], key[0]))
+            and cached_key[1:] == key[1:]
+            and (with_grad or not torch.is_grad_enabled())
+        ):
+            return trajectory
+        return None
+
+    def __call__(
+        self,
+        obs: torch.Tensor,
+        done: torch.Tensor,
+        info: InfoDict,
+        horizon: int,
+        actions: Optional[torch.Tensor] = None,
+    ) -> Trajectory:
+        """
+        Roll out `horizon` steps from `obs`, with `actions` of shape
+        (batch, horizon, act_dim) if given, else with the policy.
+        """
+        key = self._cache_key(obs, done, info, horizon, actions)
+        trajectory = self._lookup(key)
+        if trajectory is not None:
+            self._reused_steps += horizon
+            return trajectory
+
+        if actions is None and self.virtual_time and len(self._virtual_t) < horizon:
+            self._virtual_t = torch.arange(1, horizon + 1, dtype=torch.float32)
+        detached_params = None
+        if actions is None and self.policy_grad_steps is not None:
+            detached_params = {
+                k: v.detach() for k, v in self.policy.named_parameters()
+            }
+        observations, rewards, constraints = [obs], [], []
+        for step in range(horizon):
+            if actions is None:
+                virtual_t = self._virtual_t[step] if self.virtual_time else None
+                params = None
+                if self.policy_grad_steps is not None and step >= self.policy_grad_steps:
+                    params = detached_params
+                obs, rew, done, info = self._call(
+                    self._policy_step, obs, done, info, virtual_t, params
+                )
+            else:
+                obs, rew, done, info = self._call(
+                    self._model_step, obs, actions[:, step], done, info
+                )
+            observations.append(obs)
+            rewards.append(rew)
+            if info.get("constraint") is not None:
+                constraints.append(info["constraint"])
+        trajectory = Trajectory(
+            obs=torch.stack(observations),
+            rewards=torch.stack(rewards),
+            constraints=torch.stack(constraints) if constraints else None,
+            done=done,
+        )
+        self._steps += horizon
+        if self._sharing:
+            self._cache = (key, torch.is_grad_enabled(), trajectory)
+        return trajectory
+
+    def tb_info(self, prefix: str) -> dict:
+        """Model steps rolled out and reused from shared trajectories since the last call, as tb info."""
+        info = {
+            prefix + "/rollout_steps-RL iter": self._steps,
+            prefix + "/rollout_steps_reused-RL iter": self._reused_steps,
+        }
+        self._steps, self._reused_steps = 0, 0
+        return info
@@ -0,0 +1,42 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Fused polyak averaging of target networks
+
+
+__all__ = ["polyak_update"]
+
+from typing import Sequence, Union
+
+import torch
+from torch import nn
+
+Modules = Union[nn.Module, Sequence[nn.Module]]
+
+
+def _parameters(modules: Modules) -> list:
+    if isinstance(modules, nn.Module):
+        modules = [modules]
+    return [p for m in modules for p in m.parameters()]
+
+
+@torch.no_grad()
+def polyak_update(nets: Modules, target_nets: Modules, tau: float) -> None:
+    """
+    Soft update target networks in place, target = (1 - tau) * target + tau * net,
+    for all parameters of the given networks, e.g. critic and policy, by a single
+    fused `torch._foreach_lerp_` instead of a loop of `mul_` and `add_` per tensor.
+    """
+    params = _parameters(nets)
+    target_params = _parameters(target_nets)
+    assert len(params) == len(target_params), "networks and target networks differ"
+    if hasattr(torch, "_foreach_lerp_"):
+        torch._foreach_lerp_(target_params, params, tau)
+    else:
+        for p, p_targ in zip(params, target_params):
+            p_targ.mul_(1 - tau).add_(p, alpha=tau)
@@ -163,6 +163,9 @@ tb_tags = {
     "loss_critic": "Loss/Critic loss-RL iter",
     "alg_time": "Time/Algorithm time [ms]-RL iter",
     "sampler_time": "Time/Sampler time [ms]-RL iter",
+    "prefetch_wait_time": "Time/Prefetch wait time [ms]-RL iter",
+    "prefetch_starvation": "Prefetch/Starvation rate-RL iter",
+    "prefetch_queue_size": "Prefetch/Queue size-RL iter",
     "critic_avg_value": "Train/Critic avg value-RL iter",
     "lips_value": "Lipschitz/Lipschitz value - RL iter",
 }
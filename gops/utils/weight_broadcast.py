@@ -0,0 +1,93 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Versioned broadcast of flattened network weights to ray actors
+
+
+__all__ = ["flatten_weights", "load_flat_weights", "WeightPublisher"]
+
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import ray
+import torch
+from torch import nn
+
+
+def _weight_tensors(networks: nn.Module, names: Optional[Sequence[str]]) -> Dict[torch.dtype, List[torch.Tensor]]:
+    """Parameters and buffers of the named modules of `networks`, grouped by dtype."""
+    modules = [networks] if names is None else [getattr(networks, n) for n in names]
+    groups = defaultdict(list)
+    for module in modules:
+        for tensor in module.state_dict(keep_vars=True).values():
+            groups[tensor.dtype].append(tensor)
+    return groups
+
+
+def flatten_weights(networks: nn.Module, names: Optional[Sequence[str]] = None) -> Dict[torch.dtype, torch.Tensor]:
+    """
+    Copy the parameters and buffers of the modules `names` of `networks`, or
+    of all of it if `names` is None, into one contiguous cpu tensor per dtype.
+    """
+    with torch.no_grad():
+        return {
+            dtype: torch.cat([t.detach().reshape(-1).cpu() for t in tensors])
+            for dtype, tensors in _weight_tensors(networks, names).items()
+        }
+
+
+def load_flat_weights(networks: nn.Module, flat: Dict[torch.dtype, torch.Tensor], names: Optional[Sequence[str]] = None) -> None:
+    """Copy weights flattened by `flatten_weights` into the same modules of `networks` in place."""
+    with torch.no_grad():
+        for dtype, tensors in _weight_tensors(networks, names).items():
+            chunks = torch.split(flat[dtype], [t.numel() for t in tensors])
+            for tensor, chunk in zip(tensors, chunks):
+                tensor.copy_(chunk.view_as(tensor))
+
+
+class WeightPublisher:
+    """
+    Publish the weights of the center networks of a parallel trainer.
+
+    Every change of the networks is a new version, announced by `update`. The
+    weights a receiver needs, i.e. all modules for learners and only those used
+    for sampling for samplers, are flattened and put into the object store at
+    most once per version, however many receivers get them, and a receiver
+    already holding the current version is skipped. Receivers are actors with a
+    `load_flat_weights(flat, names)` method.
+
+    Args:
+        networks (nn.Module): center networks.
+    """
+
+    def __init__(self, networks: nn.Module):
+        self.networks = networks
+        self.version = 0
+        # module names -> (version, object ref) of the latest publication
+        self.published = {}
+        # receiver -> version it holds
+        self.receiver_versions = {}
+
+    def update(self) -> None:
+        """Announce that the networks changed."""
+        self.version += 1
+
+    def publish(self, names: Optional[Sequence[str]] = None) -> ray.ObjectRef:
+        key = None if names is None else tuple(names)
+        version, ref = self.published.get(key, (None, None))
+        if version != self.version:
+            ref = ray.put(flatten_weights(self.networks, names))
+            self.published[key] = (self.version, ref)
+        return ref
+
+    def send(self, receiver, names: Optional[Sequence[str]] = None) -> None:
+        """Send the current weights of `names` to `receiver` unless it holds them."""
+        if self.receiver_versions.get(receiver, None) == self.version:
+            return
+        receiver.load_flat_weights.remote(self.publish(names), names)
+        self.receiver_versions[receiver] = self.version
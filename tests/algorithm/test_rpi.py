@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+import torch
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_env import create_env  # noqa: F401, registers env models
+
+
+def make_alg(**kwargs):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    return create_alg(
+        algorithm="RPI", env_id="pyth_oscillatorconti", is_adversary=True, obsv_dim=2,
+        action_dim=1, action_type="continu", action_high_limit=np.array([1.0]),
+        action_low_limit=np.array([-1.0]), value_func_name="StateValue",
+        value_func_type="MLP", value_hidden_sizes=[16, 16], value_hidden_activation="elu",
+        value_output_activation="linear", policy_func_name="DetermPolicy",
+        policy_act_distribution="default", gamma_atte=2, sample_batch_size=64,
+        fixed_initial_state=[0.5, -0.5], initial_state_range=[1.2, 1.2],
+        state_threshold=[5.0, 5.0], lower_step=100, upper_step=200, max_newton_iteration=5,
+        max_step_update_value=20, print_interval=100, trainer="on_serial_trainer", seed=0,
+        use_gpu=False, **kwargs,
+    )
+
+
+def run(alg, num_iteration=2):
+    # env models draw states from the global random generator
+    np.random.seed(1)
+    infos = []
+    for iteration in range(num_iteration):
+        alg.local_update(None, iteration)
+        infos.append((alg.num_update_value, alg.norm_hamiltonian_after))
+    return infos
+
+
+@pytest.mark.parametrize("eval_chunk_size", [7, 64])
+def test_chunked_norm_hamiltonian(eval_chunk_size):
+    # the full evaluation set of one reset batch at once as reference
+    reference = run(make_alg(eval_chunk_size=100000))
+    infos = run(make_alg(eval_chunk_size=eval_chunk_size))
+    for (num_update, norm), (ref_num_update, ref_norm) in zip(infos, reference):
+        assert num_update == ref_num_update
+        assert norm == pytest.approx(ref_norm, rel=1e-5)
+
+
+def test_eval_state_set_larger_than_reset_batch():
+    alg = make_alg(num_eval_state=1000, eval_chunk_size=300)
+    alg.local_update(None, 0)
+    assert alg.set_state.shape == (1000, 2)
+    assert alg.set_state_terms is None
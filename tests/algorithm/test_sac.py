@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+import gops.create_pkg.create_env  # noqa: F401, registers env models
+from gops.create_pkg.create_alg import create_approx_contrainer
+from gops.create_pkg.create_apprfunc import create_apprfunc
+from gops.utils.common_utils import get_apprfunc_dict, get_args_from_json
+
+RESULT_DIR = os.path.join(os.path.dirname(__file__), "../../results/SAC/idpendulum")
+
+
+def test_load_checkpoint_with_twin_critics():
+    args = get_args_from_json(os.path.join(RESULT_DIR, "config.json"), {})
+    state_dict = torch.load(os.path.join(RESULT_DIR, "apprfunc/apprfunc_34500_opt.pkl"))
+    assert "q1.q.0.weight" in state_dict
+
+    networks = create_approx_contrainer(**args)
+    networks.load_state_dict(state_dict)
+
+    obs = torch.randn(16, args["obsv_dim"])
+    act = torch.randn(16, args["action_dim"])
+    for k, name in enumerate(["q1", "q2"]):
+        q = create_apprfunc(**get_apprfunc_dict("value", **args))
+        q.load_state_dict({
+            n[len(name) + 1:]: v for n, v in state_dict.items() if n.startswith(name + ".")
+        })
+        assert torch.allclose(networks.q(obs, act)[k], q(obs, act), atol=1e-5)
+        assert torch.allclose(networks.q(obs, act, index=k), q(obs, act), atol=1e-5)
+    policy = {n[7:]: v for n, v in state_dict.items() if n.startswith("policy.")}
+    for n, v in networks.policy.state_dict().items():
+        assert torch.equal(v, policy[n])
+
+
+MPG_ARGS = dict(
+    obsv_dim=3, action_dim=1, action_type="continu", cnn_shared=False,
+    action_high_limit=np.array([2.0]), action_low_limit=np.array([-2.0]),
+    value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[8],
+    value_hidden_activation="relu", value_output_activation="linear",
+    policy_func_name="DetermPolicy", policy_func_type="MLP",
+    policy_act_distribution="default", policy_hidden_sizes=[8],
+    policy_hidden_activation="relu", policy_output_activation="linear",
+    value_learning_rate=1e-3, policy_learning_rate=1e-3,
+)
+
+
+def make_mpg_networks(pge_method="mixed_state"):
+    from gops.algorithm.mpg import ApproxContainer
+
+    return ApproxContainer(pge_method=pge_method, **MPG_ARGS)
+
+
+@pytest.mark.parametrize(
+    "pge_method, members",
+    [
+        ("mixed_weight", ["q1", "q2"]),
+        ("mixed_state", ["q1", "q2", "q1_model", "q2_model"]),
+    ],
+)
+def test_load_mpg_checkpoint_with_separate_critics(pge_method, members):
+    # state dict laid out as saved before the critics became one ensemble
+    critics = {
+        name: create_apprfunc(**get_apprfunc_dict("value", **MPG_ARGS))
+        for m in members for name in (m, m + "_target")
+    }
+    state_dict = {
+        n: v for n, v in make_mpg_networks(pge_method).state_dict().items()
+        if n.startswith("policy")
+    }
+    state_dict.update({"policy4rollout." + n[7:]: v for n, v in state_dict.items()
+                       if n.startswith("policy.")})
+    for name, critic in critics.items():
+        state_dict.update({name + "." + n: v for n, v in critic.state_dict().items()})
+
+    networks = make_mpg_networks(pge_method)
+    networks.load_state_dict(state_dict)
+
+    obs, act = torch.randn(16, 3), torch.randn(16, 1)
+    for k, name in enumerate(members):
+        with torch.no_grad():
+            assert torch.allclose(networks.q(obs, act)[k], critics[name](obs, act), atol=1e-5)
+            assert torch.allclose(
+                networks.q_target(obs, act)[k], critics[name + "_target"](obs, act), atol=1e-5
+            )
+
+
+def test_load_mpg_checkpoint_with_policy4rollout():
+    networks = make_mpg_networks()
+    state_dict = networks.state_dict()
+    # earlier checkpoints hold a copy of the policy used for model rollouts
+    state_dict.update({"policy4rollout." + n[7:]: torch.randn_like(v)
+                       for n, v in state_dict.items() if n.startswith("policy.")})
+
+    loaded = make_mpg_networks()
+    loaded.load_state_dict(state_dict)
+    for n, v in loaded.state_dict().items():
+        assert torch.equal(v, state_dict[n])
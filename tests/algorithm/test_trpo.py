@@ -0,0 +1,64 @@
+import copy
+
+import numpy as np
+import pytest
+import ray
+import torch
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_env import create_env
+from gops.utils.init_args import init_args
+
+
+def make_alg(tmp_path, env_id, policy_func_name, func_type="MLP", obsv_dim=None):
+    args = dict(
+        env_id=env_id, algorithm="TRPO", enable_cuda=False, is_render=False,
+        value_func_name="StateValue", value_func_type=func_type, value_hidden_sizes=[16],
+        value_hidden_activation="relu", value_output_activation="linear",
+        policy_func_name=policy_func_name, policy_func_type=func_type,
+        policy_act_distribution="default", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", policy_output_activation="linear",
+        policy_std_type="parameter", policy_min_log_std=-20, policy_max_log_std=1,
+        value_learning_rate=1e-3, delta=0.01, rtol=1e-5, atol=1e-8, damping_factor=0.01,
+        max_cg=10, alpha=0.8, max_search=10, train_v_iters=2, trainer="on_serial_trainer",
+        sampler_name="on_sampler", sample_batch_size=64, noise_params={},
+        save_folder=str(tmp_path), seed=0,
+    )
+    args = init_args(create_env(**args), **args)
+    ray.shutdown()
+    if obsv_dim is not None:
+        # e.g. sequences of observations for RNN apprfuncs
+        args["obsv_dim"] = obsv_dim
+    torch.manual_seed(0)
+    return create_alg(**args), args
+
+
+@pytest.mark.parametrize(
+    "env_id, policy_func_name, func_type, obsv_dim",
+    [
+        ("gym_pendulum", "StochaPolicy", "MLP", None),
+        ("gym_cartpole", "StochaPolicyDis", "MLP", None),
+        # no batching rule for RNN, searched serially
+        ("gym_pendulum", "StochaPolicy", "RNN", (4, 3)),
+    ],
+)
+def test_update_satisfies_trust_region(tmp_path, env_id, policy_func_name, func_type, obsv_dim):
+    alg, args = make_alg(tmp_path, env_id, policy_func_name, func_type, obsv_dim)
+    networks = alg.networks
+    obs = torch.randn(64, *np.atleast_1d(args["obsv_dim"]))
+    with torch.no_grad():
+        act, _ = networks.create_action_distributions(networks.policy(obs)).sample()
+    data = {"obs": obs, "act": act, "adv": torch.randn(64), "ret": torch.randn(64)}
+    old_policy = copy.deepcopy(networks.policy)
+
+    alg.local_update(data, 0)
+    assert alg.batched_search == (func_type != "RNN")
+
+    with torch.no_grad():
+        pi_old = networks.create_action_distributions(old_policy(obs))
+        pi_new = networks.create_action_distributions(networks.policy(obs))
+        kl = pi_new.kl_divergence(pi_old).mean()
+        adv = (data["adv"] - data["adv"].mean()) / data["adv"].std()
+        ratio = torch.exp(pi_new.log_prob(act) - pi_old.log_prob(act))
+    assert 0 < kl < alg.delta
+    assert (ratio * adv).mean() > 0
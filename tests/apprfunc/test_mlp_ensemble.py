@@ -0,0 +1,55 @@
+import torch
+import torch.nn.functional as F
+
+from gops.create_pkg.create_apprfunc import ApprfuncEnsemble, create_ensemble_apprfunc
+from gops.utils.act_distribution_cls import Action_Distribution
+
+
+def make_q_args(**kwargs):
+    args = dict(
+        apprfunc="MLP", name="ActionValue", obs_dim=3, act_dim=1, hidden_sizes=[16, 16],
+        hidden_activation="relu", output_activation="linear",
+        action_distribution_cls=Action_Distribution,
+    )
+    args.update(kwargs)
+    return args
+
+
+def test_stacked_ensemble_matches_members():
+    q = create_ensemble_apprfunc(2, **make_q_args())
+    assert not isinstance(q, ApprfuncEnsemble)
+    obs, act = torch.randn(32, 3), torch.randn(32, 1)
+    out = q(obs, act)
+    assert out.shape == (2, 32)
+
+    x = torch.cat([obs, act], dim=-1)
+    linears = [m for m in q.q if hasattr(m, "weight")]
+    for k in range(2):
+        h = x
+        for j, layer in enumerate(linears):
+            h = F.linear(h, layer.weight[k].t(), layer.bias[k, 0])
+            if j < len(linears) - 1:
+                h = torch.relu(h)
+        assert torch.allclose(out[k], h.squeeze(-1), atol=1e-6)
+
+
+def test_fallback_ensemble_stacks_outputs():
+    # polynomial action values have no stacked implementation
+    q = create_ensemble_apprfunc(3, **make_q_args(apprfunc="POLY", degree=2))
+    assert isinstance(q, ApprfuncEnsemble)
+    obs, act = torch.randn(8, 3), torch.randn(8, 1)
+    out = q(obs, act)
+    assert out.shape == (3, 8)
+    for k, member in enumerate(q.members):
+        assert torch.allclose(out[k], member(obs, act))
+
+
+def test_member_index_matches_ensemble():
+    for q in (
+        create_ensemble_apprfunc(2, **make_q_args()),
+        create_ensemble_apprfunc(2, **make_q_args(apprfunc="POLY", degree=2)),
+    ):
+        obs, act = torch.randn(8, 3), torch.randn(8, 1)
+        out = q(obs, act)
+        for k in range(2):
+            assert torch.allclose(q(obs, act, index=k), out[k], atol=1e-6)
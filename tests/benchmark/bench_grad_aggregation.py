@@ -0,0 +1,96 @@
+"""
+Compare the flat gradient aggregation of OffSyncTrainer with the former
+averaging of update infos, which walked the gradient lists of every learner.
+Update infos have the gradients of SAC with MLP critics and policy; transport
+is emulated by pickling what a learner returns.
+
+Usage: python tests/benchmark/bench_grad_aggregation.py [--hidden 256] [--repeat 50]
+"""
+import argparse
+import pickle
+import time
+
+import torch
+from torch import nn
+
+from gops.utils.grad_aggregation import mean_update_info, pack_update_info
+
+
+def legacy_mean(update_info):
+    # averaging of the previous OffSyncTrainer.step
+    num = len(update_info)
+    values_last_time = None
+    for _ in range(num):
+        if _ == 0:
+            values_last_time = list(update_info[0].values())
+        else:
+            values_list = []
+            for a, b in zip(values_last_time, list(update_info[_].values())):
+                if _ == 1:
+                    if isinstance(a, list):
+                        values_list.append([(i + j) / num for i, j in zip(a, b)])
+                    else:
+                        values_list.append((a + b) / num)
+                else:
+                    if isinstance(a, list):
+                        values_list.append([i + j / num for i, j in zip(a, b)])
+                    else:
+                        values_list.append(a + b / num)
+            values_last_time = values_list
+    return dict(zip(update_info[0].keys(), values_last_time))
+
+
+def mlp(sizes):
+    layers = []
+    for i, o in zip(sizes[:-1], sizes[1:]):
+        layers += [nn.Linear(i, o), nn.ReLU()]
+    return nn.Sequential(*layers[:-1])
+
+
+def make_update_info(hidden, obs_dim=17, act_dim=6):
+    nets = {
+        "q1_grad": mlp([obs_dim + act_dim, hidden, hidden, 1]),
+        "q2_grad": mlp([obs_dim + act_dim, hidden, hidden, 1]),
+        "policy_grad": mlp([obs_dim, hidden, hidden, 2 * act_dim]),
+    }
+    update_info = {k: [torch.randn_like(p) for p in net.parameters()] for k, net in nets.items()}
+    update_info["log_alpha_grad"] = torch.randn(())
+    update_info["iteration"] = 0
+    return update_info
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hidden", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for num in (2, 4, 8, 16):
+        infos = [make_update_info(args.hidden) for _ in range(num)]
+        packed = [pack_update_info(info) for info in infos]
+
+        legacy, flat = legacy_mean(infos), mean_update_info(packed)
+        error = max(
+            (a - b).abs().max().item()
+            for k in ("q1_grad", "q2_grad", "policy_grad")
+            for a, b in zip(legacy[k], flat[k])
+        )
+
+        legacy_bytes = [pickle.dumps(info) for info in infos]
+        packed_bytes = [pickle.dumps(p) for p in packed]
+        legacy_time = timeit(lambda: legacy_mean([pickle.loads(b) for b in legacy_bytes]), args.repeat)
+        flat_time = timeit(lambda: mean_update_info([pickle.loads(b) for b in packed_bytes]), args.repeat)
+        pack_time = timeit(lambda: pack_update_info(infos[0]), args.repeat)
+        print(f"{num:2d} learners: legacy {legacy_time:7.2f} ms, flat {flat_time:7.2f} ms "
+              f"(+{pack_time:.2f} ms packing per learner), max difference {error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
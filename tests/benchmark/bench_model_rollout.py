@@ -0,0 +1,66 @@
+"""
+Compare the FHADP policy update with the eager and the compiled rollout of
+ModelRollout, on the env model of the inverted double pendulum with a
+64x64 finite-horizon policy. The first compiled update includes compilation,
+unless cached from a previous horizon, and is reported separately.
+
+Usage: python tests/benchmark/bench_model_rollout.py [--horizons 20 80 200] [--batch 256] [--repeat 5]
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from gops.apprfunc.mlp import FiniteHorizonPolicy
+from gops.env.env_ocp.env_model.pyth_idpendulum_model import PythInvertedpendulum
+from gops.utils.act_distribution_cls import Action_Distribution
+from gops.utils.model_rollout import ModelRollout, discounted_sum
+
+
+def make_policy():
+    return FiniteHorizonPolicy(
+        obs_dim=6, act_dim=1, hidden_sizes=[64, 64], hidden_activation="gelu",
+        output_activation="linear", act_high_lim=np.array([1.0], dtype=np.float32),
+        act_low_lim=np.array([-1.0], dtype=np.float32),
+        action_distribution_cls=Action_Distribution,
+    )
+
+
+def update(rollout, policy, data, horizon):
+    policy.zero_grad()
+    r, _ = rollout(data["obs"], data["done"], data, horizon)
+    loss = -discounted_sum(r, 1.0).mean()
+    loss.backward()
+    return loss.item()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--horizons", type=int, nargs="+", default=[20, 80, 200])
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model = PythInvertedpendulum()
+    data = {"obs": torch.randn(args.batch, 6) * 0.1, "done": torch.zeros(args.batch)}
+    for horizon in args.horizons:
+        times, losses = {}, {}
+        for compile in (False, True):
+            torch.manual_seed(0)
+            policy = make_policy()
+            rollout = ModelRollout(model, policy, compile=compile)
+            start = time.perf_counter()
+            losses[compile] = update(rollout, policy, data, horizon)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                update(rollout, policy, data, horizon)
+            times[compile] = (time.perf_counter() - start) / args.repeat * 1e3
+        print(f"horizon {horizon:3d}: eager {times[False]:8.1f} ms, compiled {times[True]:8.1f} ms "
+              f"({times[False] / times[True]:.1f}x, first compiled update {first:.0f} s), "
+              f"relative loss difference {abs(losses[True] / losses[False] - 1):.1e}")
+
+
+if __name__ == "__main__":
+    main()
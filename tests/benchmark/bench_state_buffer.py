@@ -0,0 +1,71 @@
+"""
+Compare ReplayBuffer throughput with the State info of veh3dof_tracking against
+plain array infos holding the same amount of data.
+
+Usage: python tests/benchmark/bench_state_buffer.py [--size 100000] [--batch 256]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from gops.create_pkg.create_env import create_env
+from gops.trainer.buffer.replay_buffer import ReplayBuffer
+from gops.trainer.sampler.base import Experience
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def to_plain(info):
+    return {"robot_state": info["state"].robot_state,
+            "reference": info["state"].context_state.reference}
+
+
+def make_experiences(env, num, state_info):
+    convert = (lambda info: info) if state_info else to_plain
+    obs, info = env.reset()
+    experiences = []
+    for _ in range(num):
+        next_obs, rew, done, next_info = env.step(env.action_space.sample())
+        experiences.append(Experience(obs, env.action_space.sample(), rew, done,
+                                      convert(info), next_obs, convert(next_info), np.array(0.0)))
+        obs, info = next_obs, next_info
+        if done:
+            obs, info = env.reset()
+    return experiences
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    env = create_env(env_id="veh3dof_tracking")
+    state = env.additional_info["state"]
+    plain_info = {
+        "robot_state": {"shape": state.robot_state.shape, "dtype": state.robot_state.dtype},
+        "reference": {"shape": state.context_state.reference.shape,
+                      "dtype": state.context_state.reference.dtype},
+    }
+    for name, info in (("plain arrays", plain_info), ("State", env.additional_info)):
+        buffer = ReplayBuffer(
+            trainer="off_serial_trainer", seed=0, obsv_dim=env.observation_space.shape,
+            action_dim=env.action_space.shape, buffer_max_size=args.size, additional_info=info,
+        )
+        experiences = make_experiences(env, args.batch, info is not plain_info)
+        store = timeit(lambda: [buffer.store(*e) for e in experiences], args.repeat // 10 + 1)
+        add = timeit(lambda: buffer.add_batch(experiences), args.repeat)
+        sample = timeit(lambda: buffer.sample_batch(args.batch), args.repeat)
+        print(f"{name:>12}: store {store / args.batch:8.1f} us/transition, "
+              f"add_batch {add:8.1f} us, sample_batch {sample:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare the batched SumMinTree of PrioritizedReplayBuffer with the former
+per-index sum tree, which descended and updated the tree one sample at a time.
+
+Usage: python tests/benchmark/bench_sum_tree.py [--size 1000000] [--batch 256]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from gops.trainer.buffer.prioritized_replay_buffer import SumMinTree
+
+
+class LegacySumTree:
+    # tree layout and traversal of the previous PrioritizedReplayBuffer
+    def __init__(self, size):
+        self.sum_tree = np.zeros(2 * size - 1)
+        self.min_tree = float("inf") * np.ones(2 * size - 1)
+        self.size = size
+
+    def update_tree(self, tree_idx):
+        parent = (tree_idx - 1) // 2
+        while True:
+            left = 2 * parent + 1
+            right = left + 1
+            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
+            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
+            if parent == 0:
+                break
+            parent = (parent - 1) // 2
+
+    def store(self, idx, priority):
+        tree_idx = idx + self.size - 1
+        self.sum_tree[tree_idx] = priority
+        self.min_tree[tree_idx] = priority
+        self.update_tree(tree_idx)
+
+    def get_leaf(self, value):
+        parent = 0
+        while True:
+            left = 2 * parent + 1
+            right = left + 1
+            if left >= len(self.sum_tree):
+                return parent, self.sum_tree[parent]
+            if value <= self.sum_tree[left]:
+                parent = left
+            else:
+                value -= self.sum_tree[left]
+                parent = right
+
+    def update_batch(self, idxes, priorities):
+        idxes = idxes + self.size - 1
+        self.sum_tree[idxes] = priorities
+        self.min_tree[idxes] = priorities
+        idxes_to_update = {}
+        for idx in idxes:
+            while idx >= 0 and idx not in idxes_to_update:
+                idxes_to_update[idx] = True
+                idx = (idx - 1) // 2
+        for idx in sorted(idxes_to_update.keys(), reverse=True):
+            parent = (idx - 1) // 2
+            left = 2 * parent + 1
+            right = left + 1
+            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
+            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=int(1e6))
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--insert", type=int, default=20, help="transitions inserted per iteration")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    legacy, tree = LegacySumTree(args.size), SumMinTree(args.size)
+    init = rng.random(args.size) + 0.01
+    legacy.sum_tree[args.size - 1:] = init
+    legacy.min_tree[args.size - 1:] = init
+    legacy.update_batch(np.arange(args.size), init)
+    tree.update(np.arange(args.size), init)
+
+    values = rng.random(args.batch) * tree.total
+    idxes = rng.integers(0, args.size, args.batch)
+    priorities = rng.random(args.batch)
+    inserts = rng.integers(0, args.size, args.insert)
+
+    results = {
+        "sample": (
+            timeit(lambda: [legacy.get_leaf(v) for v in values], args.repeat),
+            timeit(lambda: tree.find_prefixsum_idx(values), args.repeat),
+        ),
+        "update priorities": (
+            timeit(lambda: legacy.update_batch(idxes, priorities), args.repeat),
+            timeit(lambda: tree.update(idxes, priorities), args.repeat),
+        ),
+        "insert": (
+            timeit(lambda: [legacy.store(i, 1.0) for i in inserts], args.repeat),
+            timeit(lambda: tree.update(inserts, 1.0), args.repeat),
+        ),
+    }
+    print(f"size={args.size}, batch={args.batch}, insert={args.insert}")
+    print(f"{'operation':<20}{'legacy [ms]':>14}{'batched [ms]':>14}{'speedup':>10}")
+    for name, (t_legacy, t_batched) in results.items():
+        print(f"{name:<20}{t_legacy:>14.3f}{t_batched:>14.3f}{t_legacy / t_batched:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
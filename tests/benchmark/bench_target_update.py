@@ -0,0 +1,66 @@
+"""
+Compare the fused polyak update of target networks with the former loop of
+`mul_` and `add_` per parameter, for the twin critics and policy of TD3 with
+MLP approximate functions.
+
+Usage: python tests/benchmark/bench_target_update.py [--repeat 1000]
+"""
+import argparse
+import copy
+import time
+
+import torch
+from torch import nn
+
+from gops.utils.target_update import polyak_update
+
+
+def legacy_update(nets, targets, tau):
+    # target update of the previous algorithms
+    with torch.no_grad():
+        polyak = 1 - tau
+        for net, target in zip(nets, targets):
+            for p, p_targ in zip(net.parameters(), target.parameters()):
+                p_targ.data.mul_(polyak)
+                p_targ.data.add_((1 - polyak) * p.data)
+
+
+def mlp(sizes):
+    layers = []
+    for i, o in zip(sizes[:-1], sizes[1:]):
+        layers += [nn.Linear(i, o), nn.ReLU()]
+    return nn.Sequential(*layers[:-1])
+
+
+def timeit(fn, repeat):
+    for _ in range(10):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    obs_dim, act_dim = 17, 6
+    for hidden, layers in ((64, 2), (256, 2), (256, 4)):
+        sizes = [hidden] * layers
+        nets = [
+            mlp([obs_dim + act_dim] + sizes + [1]),
+            mlp([obs_dim + act_dim] + sizes + [1]),
+            mlp([obs_dim] + sizes + [act_dim]),
+        ]
+        targets = [copy.deepcopy(net) for net in nets]
+        legacy_time = timeit(lambda: legacy_update(nets, targets, 0.005), args.repeat)
+        fused_time = timeit(lambda: polyak_update(nets, targets, 0.005), args.repeat)
+        num = sum(1 for net in nets for _ in net.parameters())
+        print(f"hidden {sizes}, {num} tensors: loop {legacy_time * 1e3:7.1f} us, "
+              f"fused {fused_time * 1e3:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
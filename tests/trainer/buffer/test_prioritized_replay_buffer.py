@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from gops.trainer.buffer.prioritized_replay_buffer import PrioritizedReplayBuffer, SumMinTree
+
+
+@pytest.mark.parametrize("size", [1, 7, 8, 1000])
+def test_sum_min_tree_matches_brute_force(size):
+    rng = np.random.default_rng(size)
+    tree = SumMinTree(size)
+    priorities = np.zeros(size)
+    for _ in range(5):
+        idxes = rng.integers(0, size, size=min(size, 64))
+        values = rng.random(len(idxes)) + 0.01
+        tree.update(idxes, values)
+        # with duplicated indices the last write wins, as in numpy
+        priorities[idxes] = values
+
+        assert np.isclose(tree.total, priorities.sum())
+        assert np.isclose(tree.min, priorities[priorities > 0].min())
+        queries = rng.random(128) * tree.total
+        expected = np.minimum(np.searchsorted(np.cumsum(priorities), queries), size - 1)
+        assert np.array_equal(tree.find_prefixsum_idx(queries), expected)
+
+
+def test_prioritized_sampling_follows_priorities():
+    buffer = PrioritizedReplayBuffer(
+        trainer="off_serial_trainer",
+        seed=0,
+        obsv_dim=2,
+        action_dim=1,
+        buffer_max_size=4,
+        additional_info={},
+    )
+    buffer.add_batch({
+        "obs": np.arange(8, dtype=np.float32).reshape(4, 2),
+        "obs2": np.zeros((4, 2)),
+        "act": np.zeros((4, 1)),
+        "rew": np.zeros(4),
+        "done": np.zeros(4),
+        "logp": np.zeros(4),
+    })
+    buffer.update_batch(np.array([0, 1, 2, 3]), np.array([0.0, 0.0, 0.0, 10.0]))
+    batch = buffer.sample_batch(32)
+    assert (batch["idx"] == 3).float().mean() > 0.95
+    assert np.allclose(batch["obs"][batch["idx"] == 3].numpy(), [6, 7])
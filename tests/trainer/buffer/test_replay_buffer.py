@@ -0,0 +1,268 @@
+import numpy as np
+import pytest
+import torch
+
+from gops.env.env_gen_ocp.pyth_base import ContextState, State
+from gops.trainer.buffer.compact_replay_buffer import CompactReplayBuffer
+from gops.trainer.buffer.replay_buffer import ReplayBuffer, split_batches
+from gops.trainer.buffer.sequence_replay_buffer import SequenceReplayBuffer
+from gops.trainer.buffer.prioritized_replay_buffer import PrioritizedReplayBuffer
+from gops.trainer.sampler.base import Experience
+
+
+OBS_DIM = 3
+ACT_DIM = 2
+
+
+def make_kwargs(**kwargs):
+    default = {
+        "trainer": "off_serial_trainer",
+        "seed": 0,
+        "obsv_dim": OBS_DIM,
+        "action_dim": ACT_DIM,
+        "buffer_max_size": 16,
+        "additional_info": {"constraint": {"shape": (2,), "dtype": np.float32}},
+    }
+    default.update(kwargs)
+    return default
+
+
+def make_experiences(num, rng):
+    experiences = []
+    obs = rng.normal(size=OBS_DIM)
+    info = {"constraint": rng.normal(size=2)}
+    for _ in range(num):
+        next_obs = rng.normal(size=OBS_DIM)
+        next_info = {"constraint": rng.normal(size=2)}
+        experiences.append(Experience(
+            obs=obs,
+            action=rng.normal(size=ACT_DIM),
+            reward=rng.normal(),
+            done=rng.random() < 0.1,
+            info=info,
+            next_obs=next_obs,
+            next_info=next_info,
+            logp=np.array(rng.normal()),
+        ))
+        obs, info = next_obs, next_info
+    return experiences
+
+
+@pytest.mark.parametrize("buffer_cls", [ReplayBuffer, PrioritizedReplayBuffer, CompactReplayBuffer])
+def test_add_batch_matches_store(buffer_cls):
+    rng = np.random.default_rng(0)
+    buffer_store = buffer_cls(**make_kwargs())
+    buffer_batch = buffer_cls(**make_kwargs())
+    # batch sizes chosen to exercise wrap-around and batches larger than the buffer
+    for num in [5, 7, 9, 20, 3]:
+        experiences = make_experiences(num, rng)
+        for e in experiences:
+            buffer_store.store(*e)
+        buffer_batch.add_batch(experiences)
+
+        assert buffer_store.ptr == buffer_batch.ptr
+        assert buffer_store.size == buffer_batch.size
+        for k, v in buffer_store.buf.items():
+            assert np.array_equal(v, buffer_batch.buf[k]), k
+
+
+def test_add_batch_columnar():
+    rng = np.random.default_rng(1)
+    buffer = ReplayBuffer(**make_kwargs())
+    experiences = make_experiences(10, rng)
+    buffer.add_batch(buffer.experiences_to_batch(experiences))
+    assert len(buffer) == 10
+    assert np.allclose(buffer.buf["obs2"][:10], np.stack([e.next_obs for e in experiences]))
+    assert np.allclose(buffer.buf["next_constraint"][:10], np.stack([e.next_info["constraint"] for e in experiences]))
+
+
+@pytest.mark.parametrize("buffer_cls", [ReplayBuffer, CompactReplayBuffer])
+def test_add_batch_broadcasts_undeclared_info_shape(buffer_cls):
+    # e.g. pyth_mobilerobot declares its constraint of shape (0,) but emits (1,)
+    rng = np.random.default_rng(2)
+    additional_info = {
+        "constraint": {"shape": (0,), "dtype": np.float32},
+        "mask": {"shape": (2,), "dtype": np.float32},
+    }
+    buffer = buffer_cls(**make_kwargs(additional_info=additional_info))
+    experiences = [
+        e._replace(
+            done=False,
+            info={"constraint": e.info["constraint"][:1], "mask": e.info["constraint"][:1]},
+            next_info={
+                "constraint": e.next_info["constraint"][:1],
+                "mask": e.next_info["constraint"][:1],
+            },
+        )
+        for e in make_experiences(10, rng)
+    ]
+    buffer.add_batch(experiences)
+    assert len(buffer) == 10
+    assert buffer.buf["constraint"].shape == (16, 0)
+    mask = np.stack([e.info["mask"] for e in experiences])
+    assert np.allclose(buffer.buf["mask"][:10], np.broadcast_to(mask, (10, 2)))
+    batch = buffer.sample_batch(4)
+    assert batch["constraint"].shape == (4, 0) and batch["next_mask"].shape == (4, 2)
+
+
+@pytest.mark.parametrize("buffer_cls", [ReplayBuffer, PrioritizedReplayBuffer])
+def test_save_and_load(buffer_cls, tmp_path):
+    rng = np.random.default_rng(2)
+    buffer = buffer_cls(**make_kwargs())
+    buffer.add_batch(make_experiences(21, rng))
+    if buffer_cls is PrioritizedReplayBuffer:
+        buffer.update_batch(np.arange(4), rng.random(4))
+    buffer.save(str(tmp_path))
+
+    restored = buffer_cls(**make_kwargs())
+    restored.load(str(tmp_path))
+    assert (restored.ptr, restored.size) == (buffer.ptr, buffer.size)
+    for k, v in buffer.buf.items():
+        assert np.array_equal(v, restored.buf[k]), k
+    if buffer_cls is PrioritizedReplayBuffer:
+        assert np.array_equal(buffer.tree.sum_tree, restored.tree.sum_tree)
+        assert restored.max_priority == buffer.max_priority
+
+    with pytest.raises(ValueError):
+        buffer_cls(**make_kwargs(buffer_max_size=32)).load(str(tmp_path))
+
+
+@pytest.mark.parametrize("buffer_cls", [ReplayBuffer, PrioritizedReplayBuffer])
+def test_sample_batches(buffer_cls):
+    rng = np.random.default_rng(5)
+    buffer = buffer_cls(**make_kwargs())
+    buffer.add_batch(make_experiences(12, rng))
+    block = buffer.sample_batches(3, 4)
+    batches = split_batches(block, 3)
+    assert len(batches) == 3
+    for batch in batches:
+        assert set(batch.keys()) == set(block.keys())
+        assert batch["obs"].shape == (4, OBS_DIM)
+        assert batch["next_constraint"].shape == (4, 2)
+        # each batch owns its storage, so shipping it does not copy the block
+        assert batch["obs"].untyped_storage().nbytes() == batch["obs"].nbytes
+    assert torch.equal(torch.cat([b["rew"] for b in batches]).sort()[0], block["rew"].sort()[0])
+    if buffer_cls is PrioritizedReplayBuffer:
+        beta = buffer.beta
+        buffer.sample_batches(3, 4)
+        assert np.isclose(buffer.beta, min(1.0, beta + 3 * buffer.beta_increment))
+
+
+def test_compact_buffer_rebuilds_next_state():
+    rng = np.random.default_rng(3)
+    buffer = CompactReplayBuffer(**make_kwargs(buffer_max_size=64))
+    next_obs_of = {}
+    for _ in range(30):
+        experiences = make_experiences(8, rng)
+        for e in experiences:
+            next_obs_of[e.obs.astype(np.float32).tobytes()] = (e.next_obs, e.next_info["constraint"], e.done)
+        buffer.add_batch(experiences)
+        batch = buffer.sample_batch(32)
+        for obs, obs2, next_constraint, done in zip(
+            batch["obs"].numpy(), batch["obs2"].numpy(), batch["next_constraint"].numpy(), batch["done"].numpy()
+        ):
+            expected_obs2, expected_constraint, expected_done = next_obs_of[obs.tobytes()]
+            assert np.allclose(obs2, expected_obs2)
+            assert np.allclose(next_constraint, expected_constraint)
+            assert done == expected_done
+    assert buffer.num_valid == buffer.buf["valid"].sum()
+    # consecutive samples share their states, only episode ends and batch
+    # boundaries take an extra slot
+    assert buffer.num_valid > 0.75 * buffer.size
+
+
+# short windows are mostly valid and drawn by rejection, long ones from the index
+@pytest.mark.parametrize("seq_len", [2, 4])
+def test_sequence_buffer_windows(seq_len):
+    rng = np.random.default_rng(7)
+    buffer = SequenceReplayBuffer(**make_kwargs(buffer_max_size=64, buffer_seq_len=seq_len))
+    for _ in range(20):
+        buffer.add_batch(make_experiences(int(rng.integers(1, 10)), rng))
+        if buffer.num_valid == 0:
+            continue
+        batch = buffer.sample_batch(32)
+        assert batch["obs"].shape == (32, seq_len, OBS_DIM)
+        assert batch["next_constraint"].shape == (32, seq_len, 2)
+        # windows are consecutive steps of one episode
+        assert torch.equal(batch["obs2"][:, :-1], batch["obs"][:, 1:])
+        assert not batch["done"][:, :-1].any()
+
+    # the incrementally maintained index matches a full rebuild
+    valid_start = buffer.valid_start.copy()
+    buffer._update_index(0, buffer.max_size)
+    assert np.array_equal(valid_start, buffer.valid_start)
+    assert buffer.num_valid == valid_start.sum()
+
+
+def make_state(rng):
+    return State(
+        robot_state=rng.normal(size=4).astype(np.float32),
+        context_state=ContextState(reference=rng.normal(size=(5, 2)).astype(np.float32)),
+    )
+
+
+@pytest.mark.parametrize("buffer_cls", [ReplayBuffer, CompactReplayBuffer])
+def test_state_info(buffer_cls):
+    rng = np.random.default_rng(6)
+    buffer = buffer_cls(**make_kwargs(additional_info={"state": make_state(rng)}))
+    assert buffer.buf["state.context_state.reference"].shape == (16, 5, 2)
+    experiences = []
+    state = make_state(rng)
+    for _ in range(10):
+        next_state = make_state(rng)
+        experiences.append(Experience(
+            obs=rng.normal(size=OBS_DIM), action=rng.normal(size=ACT_DIM), reward=0.0,
+            done=False, info={"state": state}, next_obs=rng.normal(size=OBS_DIM),
+            next_info={"state": next_state}, logp=np.array(0.0),
+        ))
+        state = next_state
+    buffer.add_batch(experiences)
+
+    batch = buffer.sample_batch(32)
+    assert isinstance(batch["state"], State) and isinstance(batch["next_state"], State)
+    assert batch["state"].context_state.t == 0
+    assert batch["state"].context_state.constraint is None
+    robot_states = {e.info["state"].robot_state.tobytes(): e for e in experiences}
+    for i in range(32):
+        e = robot_states[batch["state"].robot_state[i].numpy().tobytes()]
+        assert np.array_equal(batch["state"].context_state.reference[i].numpy(), e.info["state"].context_state.reference)
+        assert np.array_equal(batch["next_state"].robot_state[i].numpy(), e.next_info["state"].robot_state)
+
+
+@pytest.mark.parametrize("spec, atol", [
+    ("float16", 1e-2),
+    ("bfloat16", 5e-2),
+    ({"dtype": "int8", "shift": 0.0, "scale": 0.25}, 4.0 / 127),
+    ({"dtype": "int16", "shift": [0.0, 0.0, 0.0], "scale": [0.25, 0.25, 0.25]}, 4.0 / 32767),
+])
+def test_storage_dtype(spec, atol):
+    rng = np.random.default_rng(4)
+    buffer = ReplayBuffer(**make_kwargs(buffer_storage_dtype={"obs": spec, "constraint": "float16"}))
+    experiences = make_experiences(16, rng)
+    buffer.add_batch(experiences)
+    assert buffer.buf["obs"].dtype.itemsize < 4
+    assert buffer.buf["next_constraint"].dtype == np.float16
+
+    batch = buffer.sample_batch(64)
+    obs = np.stack([e.obs for e in experiences]).astype(np.float32)
+    # every sampled observation is close to exactly one stored observation
+    dist = np.abs(batch["obs"].numpy()[:, None, :] - obs[None]).max(axis=-1)
+    assert batch["obs"].dtype == torch.float32
+    assert np.all(dist.min(axis=1) <= atol)
+
+
+def test_storage_dtype_uint8_images():
+    buffer = ReplayBuffer(**make_kwargs(obsv_dim=(4, 4, 3), buffer_storage_dtype={"obs": "uint8"}))
+    images = np.random.default_rng(5).integers(0, 256, size=(8, 4, 4, 3)).astype(np.float32)
+    buffer.add_batch({
+        "obs": images,
+        "obs2": images,
+        "act": np.zeros((8, ACT_DIM)),
+        "rew": np.zeros(8),
+        "done": np.zeros(8),
+        "logp": np.zeros(8),
+        "constraint": np.zeros((8, 2)),
+        "next_constraint": np.zeros((8, 2)),
+    })
+    assert buffer.buf["obs2"].dtype == np.uint8
+    assert np.array_equal(buffer.buf["obs"][:8], images.astype(np.uint8))
@@ -0,0 +1,42 @@
+import numpy as np
+import ray
+
+from gops.create_pkg.create_env import create_env
+from gops.create_pkg.create_sampler import create_sampler
+from gops.trainer.buffer.replay_buffer import ReplayBuffer
+from gops.utils.init_args import init_args
+
+
+def test_model_rollouts(tmp_path):
+    args = dict(
+        env_id="pyth_idpendulum", algorithm="DDPG", enable_cuda=False, is_render=False,
+        value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[16],
+        value_hidden_activation="relu", policy_func_name="DetermPolicy",
+        policy_func_type="MLP", policy_act_distribution="default", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", value_learning_rate=1e-3, policy_learning_rate=1e-3,
+        trainer="off_serial_trainer", sampler_name="model_sampler", sample_batch_size=48,
+        noise_params=None, buffer_max_size=100, save_folder=str(tmp_path), seed=0,
+    )
+    args = init_args(create_env(**args), **args)
+    # samplers do not need the ray instance started by init_args
+    ray.shutdown()
+    args.update(model_env_num=16, max_episode_steps=2)
+    sampler = create_sampler(**args)
+    assert sampler.batched_reset
+    batch, _ = sampler.sample()
+    assert batch["obs"].shape == (48, 6) and batch["act"].shape == (48, 1)
+    assert batch["rew"].shape == batch["done"].shape == batch["logp"].shape == (48,)
+
+    # environment-major layout; every rollout continues after its first step
+    # unless it terminated, and is reset after reaching the time limit
+    obs = batch["obs"].reshape(16, 3, 6)
+    obs2 = batch["obs2"].reshape(16, 3, 6)
+    done = batch["done"].reshape(16, 3)
+    assert np.array_equal(obs2[~done[:, 0], 0], obs[~done[:, 0], 1])
+    low, high = sampler.env.unwrapped.init_space
+    assert np.all((obs[:, 2] >= low) & (obs[:, 2] <= high))
+    assert not np.array_equal(obs2[:, 1], obs[:, 2])
+
+    buffer = ReplayBuffer(**args)
+    buffer.add_batch(batch)
+    assert len(buffer) == 48
@@ -0,0 +1,41 @@
+import numpy as np
+import ray
+
+from gops.create_pkg.create_env import create_env
+from gops.create_pkg.create_sampler import create_sampler
+from gops.trainer.buffer.replay_buffer import ReplayBuffer
+from gops.utils.init_args import init_args
+
+
+def make_args(tmp_path, **kwargs):
+    args = dict(
+        env_id="gym_pendulum", algorithm="DDPG", enable_cuda=False, is_render=False,
+        value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[16],
+        value_hidden_activation="relu", policy_func_name="DetermPolicy",
+        policy_func_type="MLP", policy_act_distribution="default", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", value_learning_rate=1e-3, policy_learning_rate=1e-3,
+        trainer="off_serial_trainer", sampler_name="off_sampler", sample_batch_size=12,
+        noise_params=None, buffer_max_size=100, save_folder=str(tmp_path), seed=0,
+    )
+    args = init_args(create_env(**args), **args)
+    # samplers do not need the ray instance started by init_args
+    ray.shutdown()
+    args.update(kwargs)
+    return args
+
+
+def test_columnar_batch(tmp_path):
+    args = make_args(tmp_path, vector_env_num=3, vector_env_type="sync", gym2gymnasium=True)
+    sampler = create_sampler(**args)
+    batch, _ = sampler.sample()
+    assert batch["obs"].shape == (12, 3) and batch["act"].shape == (12, 1)
+    assert batch["rew"].shape == batch["done"].shape == batch["logp"].shape == (12,)
+    # environment-major layout: the 4 steps of each environment are adjacent
+    obs = batch["obs"].reshape(3, 4, 3)
+    obs2 = batch["obs2"].reshape(3, 4, 3)
+    assert np.array_equal(obs2[:, :-1], obs[:, 1:])
+
+    buffer = ReplayBuffer(**args)
+    buffer.add_batch(batch)
+    assert len(buffer) == 12
+    assert np.allclose(buffer.buf["obs"][:12], batch["obs"])
@@ -0,0 +1,88 @@
+import numpy as np
+import ray
+import torch
+
+from gops.create_pkg.create_env import create_env
+from gops.create_pkg.create_sampler import create_sampler
+from gops.trainer.sampler.base import Experience
+from gops.utils.init_args import init_args
+
+
+def make_args(tmp_path, **kwargs):
+    args = dict(
+        env_id="gym_pendulum", algorithm="PPO", enable_cuda=False, is_render=False,
+        value_func_name="StateValue", value_func_type="MLP", value_hidden_sizes=[16],
+        value_hidden_activation="relu", value_output_activation="linear",
+        policy_func_name="StochaPolicy", policy_func_type="MLP",
+        policy_act_distribution="default", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", policy_output_activation="linear",
+        policy_std_type="parameter", policy_min_log_std=-20, policy_max_log_std=1,
+        trainer="on_serial_trainer", sampler_name="on_sampler", sample_batch_size=16,
+        noise_params=None, save_folder=str(tmp_path), seed=0,
+    )
+    args = init_args(create_env(**args), **args)
+    # samplers do not need the ray instance started by init_args
+    ray.shutdown()
+    args.update(kwargs)
+    return args
+
+
+def reference_gae(value, obs, rew, done, tlim, next_obs, gamma, lam):
+    # per-step reference: each trajectory slice ends at a terminal state, a time
+    # limit or the end of the horizon and is bootstrapped from its next observation
+    num_envs, horizon = rew.shape
+    adv = np.zeros((num_envs, horizon))
+    for i in range(num_envs):
+        start = 0
+        for t in range(horizon):
+            if not (done[i, t] or tlim[i, t] or t == horizon - 1):
+                continue
+            last_val = value(next_obs[i, t]) * (1 - done[i, t])
+            gae = 0.0
+            for k in reversed(range(start, t + 1)):
+                next_val = last_val if k == t else value(obs[i, k + 1])
+                delta = rew[i, k] + gamma * next_val - value(obs[i, k])
+                gae = delta + gamma * lam * gae
+                adv[i, k] = gae
+            start = t + 1
+    ret = adv + np.array([[value(o) for o in env_obs] for env_obs in obs])
+    return adv, ret
+
+
+def test_gae_matches_reference(tmp_path):
+    args = make_args(tmp_path, vector_env_num=2, vector_env_type="sync", gym2gymnasium=True)
+    sampler = create_sampler(**args)
+    num_envs, horizon = 2, 8
+    assert (sampler.num_envs, sampler.horizon) == (num_envs, horizon)
+
+    rng = np.random.default_rng(0)
+    obs = rng.normal(size=(num_envs, horizon, 3)).astype(np.float32)
+    rew = rng.normal(size=(num_envs, horizon)).astype(np.float32)
+    done = np.zeros((num_envs, horizon), dtype=bool)
+    tlim = np.zeros((num_envs, horizon), dtype=bool)
+    done[0, 2], tlim[0, 5], tlim[1, 3], done[1, 7] = True, True, True, True
+    # next observations continue the trajectory except after a slice end
+    next_obs = np.concatenate([obs[:, 1:], obs[:, -1:]], axis=1)
+    ends = done | tlim
+    ends[:, -1] = True
+    next_obs[ends] = rng.normal(size=(ends.sum(), 3))
+
+    sampler.end_obs = []
+    for t in range(horizon):
+        experience = Experience(
+            obs=obs[:, t], action=np.zeros((num_envs, 1), dtype=np.float32),
+            reward=rew[:, t], done=done[:, t], info={}, next_obs=next_obs[:, t],
+            next_info={"TimeLimit.truncated": tlim[:, t]}, logp=np.zeros(num_envs),
+        )
+        sampler._process_experiences(experience, t)
+    sampler._compute_gae()
+
+    def value(o):
+        with torch.no_grad():
+            return sampler.networks.value(torch.from_numpy(np.float32(o))[None]).item()
+
+    adv, ret = reference_gae(
+        value, obs, rew, done, tlim, next_obs, sampler.gamma, sampler.gae_lambda
+    )
+    np.testing.assert_allclose(sampler.mb_adv, adv, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(sampler.mb_ret, ret, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,54 @@
+import pytest
+import torch
+
+from gops.trainer.batch_prefetcher import BatchPrefetcher
+
+
+class CountingBuffer:
+    def __init__(self, fail_after=None):
+        self.count = 0
+        self.fail_after = fail_after
+        self.added = []
+
+    def sample_batch(self, batch_size):
+        if self.fail_after is not None and self.count >= self.fail_after:
+            raise ValueError("sampling failed")
+        self.count += 1
+        return {"i": torch.full((batch_size,), self.count - 1)}
+
+    def add_batch(self, samples):
+        self.added.append(samples)
+
+
+def test_batches_in_order():
+    buffer = CountingBuffer()
+    prefetcher = BatchPrefetcher(buffer, batch_size=4, num_prefetch=2)
+    for i in range(10):
+        batch = prefetcher.sample_batch(4)
+        assert torch.equal(batch["i"], torch.full((4,), i))
+    prefetcher.add_batch([1, 2])
+    assert buffer.added == [[1, 2]] and prefetcher.fail_after is None
+    prefetcher.close()
+
+
+def test_close_stops_worker_with_full_queue():
+    prefetcher = BatchPrefetcher(CountingBuffer(), batch_size=4, num_prefetch=2)
+    while not prefetcher.queue.full():
+        pass
+    prefetcher.close()
+    assert not prefetcher.thread.is_alive()
+    assert prefetcher.buffer.count <= 3
+
+
+def test_worker_error_is_raised():
+    prefetcher = BatchPrefetcher(CountingBuffer(fail_after=2), batch_size=4, num_prefetch=4)
+    for i in range(2):
+        assert prefetcher.sample_batch(4)["i"][0] == i
+    with pytest.raises(RuntimeError) as e:
+        prefetcher.sample_batch(4)
+    assert isinstance(e.value.__cause__, ValueError)
+    # the worker has stopped, later calls fail instead of waiting forever
+    prefetcher.thread.join(timeout=1)
+    with pytest.raises(RuntimeError, match="stopped"):
+        prefetcher.sample_batch(4)
+    prefetcher.close()
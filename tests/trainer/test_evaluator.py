@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+import ray
+import torch
+
+from gops.create_pkg.create_env import create_env
+from gops.trainer.evaluator import Evaluator
+from gops.utils.init_args import init_args
+
+
+@pytest.fixture(scope="module")
+def args(tmp_path_factory):
+    args = dict(
+        env_id="gym_pendulum", algorithm="TD3", enable_cuda=False, is_render=False,
+        value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[16],
+        value_hidden_activation="relu", value_output_activation="linear",
+        policy_func_name="DetermPolicy", policy_func_type="MLP",
+        policy_act_distribution="default", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", policy_output_activation="linear",
+        value_learning_rate=1e-3, policy_learning_rate=1e-3,
+        trainer="off_serial_trainer", buffer_name="replay_buffer", sample_batch_size=8,
+        save_folder=str(tmp_path_factory.mktemp("init")), seed=0,
+        max_episode_steps=20, num_eval_episode=4,
+    )
+    args = init_args(create_env(**args), **args)
+    ray.shutdown()
+    return args
+
+
+def evaluate(args, save_folder, state_dict, **kwargs):
+    os.makedirs(save_folder / "evaluator")
+    evaluator = Evaluator(**dict(args, save_folder=str(save_folder), **kwargs))
+    evaluator.load_state_dict(state_dict)
+    returns = [evaluator.run_evaluation(iteration) for iteration in range(2)]
+    saved = {
+        f.name: np.load(f, allow_pickle=True).item()
+        for f in sorted((save_folder / "evaluator").glob("*.npy"))
+    }
+    return returns, saved
+
+
+@pytest.mark.parametrize("eval_env_num, eval_env_type", [(4, "sync"), (3, "sync"), (2, "async")])
+def test_vectorized_evaluation_matches_sequential(args, tmp_path, eval_env_num, eval_env_type):
+    torch.manual_seed(0)
+    state_dict = Evaluator(**args).networks.state_dict()
+    returns, saved = evaluate(args, tmp_path / "seq", state_dict, eval_env_num=1)
+    vec_returns, vec_saved = evaluate(
+        args, tmp_path / "vec", state_dict, eval_env_num=eval_env_num, eval_env_type=eval_env_type
+    )
+
+    # batched inference only differs by the rounding of the policy network
+    np.testing.assert_allclose(returns, vec_returns, rtol=1e-5)
+    assert len(saved) == 8 and saved.keys() == vec_saved.keys()
+    for name, eval_dict in saved.items():
+        np.testing.assert_array_equal(eval_dict["obs_list"][0], vec_saved[name]["obs_list"][0])
+        for k, v in eval_dict.items():
+            assert len(v) == len(vec_saved[name][k]) == 20
+            np.testing.assert_allclose(np.stack(v), np.stack(vec_saved[name][k]), rtol=1e-4, atol=1e-5)
@@ -0,0 +1,58 @@
+import copy
+
+import ray
+import torch
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_env import create_env
+from gops.trainer.off_vmap_trainer import StackedAgents
+from gops.utils.init_args import init_args
+
+
+def make_args(tmp_path, **kwargs):
+    args = dict(
+        env_id="gym_pendulum", algorithm="TD3", enable_cuda=False, is_render=False,
+        value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[16],
+        value_hidden_activation="relu", value_output_activation="linear",
+        policy_func_name="DetermPolicy", policy_func_type="MLP",
+        policy_act_distribution="default", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", policy_output_activation="linear",
+        value_learning_rate=1e-3, policy_learning_rate=1e-3, trainer="off_vmap_trainer",
+        buffer_name="replay_buffer", sample_batch_size=8, save_folder=str(tmp_path), seed=0,
+    )
+    args = init_args(create_env(**args), **args)
+    ray.shutdown()
+    args.update(kwargs)
+    return args
+
+
+def make_batch(size=32):
+    return {
+        "obs": torch.randn(size, 3),
+        "act": torch.rand(size, 1) * 4 - 2,
+        "rew": torch.randn(size),
+        "obs2": torch.randn(size, 3),
+        "done": torch.zeros(size),
+    }
+
+
+def test_stacked_update_matches_local_update(tmp_path):
+    # no target policy smoothing, so that updates are deterministic
+    args = make_args(tmp_path, target_noise=0.0)
+    algs = []
+    for seed in range(3):
+        torch.manual_seed(seed)
+        algs.append(create_alg(**args))
+    references = [copy.deepcopy(alg) for alg in algs]
+
+    stacked = StackedAgents(algs)
+    for iteration in range(3):
+        batches = [make_batch() for _ in algs]
+        tb_infos = stacked.update(batches, iteration)
+        for reference, batch in zip(references, batches):
+            reference.local_update(batch, iteration)
+
+    assert len(tb_infos) == 3
+    for alg, reference in zip(algs, references):
+        for k, v in reference.networks.state_dict().items():
+            assert torch.allclose(alg.networks.state_dict()[k], v, atol=1e-6), k
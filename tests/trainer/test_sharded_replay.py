@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+import ray
+
+from gops.trainer.buffer.prioritized_replay_buffer import PrioritizedReplayBuffer
+from gops.trainer.sharded_replay import ShardedPrioritizedReplay
+
+SHARD_SIZE = 4
+NUM_SHARDS = 2
+
+
+def buffer_kwargs(buffer_max_size):
+    return dict(
+        trainer="off_sync_trainer",
+        seed=0,
+        obsv_dim=1,
+        action_dim=1,
+        buffer_max_size=buffer_max_size,
+        additional_info={},
+    )
+
+
+def transitions(start, num):
+    # the observation of a sample is its global index
+    return {
+        "obs": np.arange(start, start + num, dtype=np.float32)[:, None],
+        "obs2": np.zeros((num, 1)),
+        "act": np.zeros((num, 1)),
+        "rew": np.zeros(num),
+        "done": np.zeros(num),
+        "logp": np.zeros(num),
+    }
+
+
+@pytest.fixture(scope="module")
+def ray_instance():
+    ray.init(num_cpus=1, include_dashboard=False)
+    yield
+    ray.shutdown()
+
+
+@pytest.fixture
+def shards(ray_instance):
+    remote_buffer = ray.remote(num_cpus=0)(PrioritizedReplayBuffer)
+    buffers = [
+        remote_buffer.remote(index=i, **buffer_kwargs(SHARD_SIZE)) for i in range(NUM_SHARDS)
+    ]
+    ray.get([
+        buffer.add_batch.remote(transitions(i * SHARD_SIZE, SHARD_SIZE))
+        for i, buffer in enumerate(buffers)
+    ])
+    return buffers
+
+
+def test_update_batch_is_routed_to_owning_shard(shards):
+    replay = ShardedPrioritizedReplay(shards, SHARD_SIZE)
+    priorities = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 5.0, 0.0])
+    replay.update_batch(np.arange(NUM_SHARDS * SHARD_SIZE), priorities)
+
+    alpha, epsilon = 0.6, 1e-6
+    expected = (priorities + epsilon) ** alpha
+    stats = ray.get([buffer.priority_stats.remote() for buffer in shards])
+    for i, (total, min_priority, size) in enumerate(stats):
+        shard = expected[i * SHARD_SIZE:(i + 1) * SHARD_SIZE]
+        assert np.isclose(total, shard.sum())
+        assert np.isclose(min_priority, shard.min())
+        assert size == SHARD_SIZE
+
+    # statistics lag by one sampling round
+    replay.sample_batch(16)
+    batch = replay.sample_batch(64)
+    assert (batch["idx"] == 6).float().mean() > 0.95
+    assert np.array_equal(batch["obs"][:, 0].numpy(), batch["idx"].numpy())
+
+
+def test_weights_match_single_buffer(shards):
+    priorities = np.arange(1, NUM_SHARDS * SHARD_SIZE + 1, dtype=np.float64)
+    idxes = np.arange(NUM_SHARDS * SHARD_SIZE)
+    ray.get([
+        buffer.update_batch.remote(idxes[i * SHARD_SIZE:(i + 1) * SHARD_SIZE],
+                                   priorities[i * SHARD_SIZE:(i + 1) * SHARD_SIZE])
+        for i, buffer in enumerate(shards)
+    ])
+    replay = ShardedPrioritizedReplay(shards, SHARD_SIZE)
+    single = PrioritizedReplayBuffer(**buffer_kwargs(NUM_SHARDS * SHARD_SIZE))
+    single.add_batch(transitions(0, NUM_SHARDS * SHARD_SIZE))
+    single.update_batch(idxes, priorities)
+
+    # both advance beta once before drawing
+    batch = replay.sample_batch(256)
+    expected = single.sample_batch(256)
+    assert replay.beta == single.beta
+    weights = dict(zip(expected["idx"].tolist(), expected["weight"].tolist()))
+    assert set(batch["idx"].tolist()) == set(weights)
+    for idx, weight in zip(batch["idx"].tolist(), batch["weight"].tolist()):
+        assert np.isclose(weight, weights[idx], rtol=1e-5)
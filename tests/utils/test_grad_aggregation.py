@@ -0,0 +1,52 @@
+import torch
+import torch.distributed as dist
+
+from gops.utils.grad_aggregation import (
+    allreduce_update_info,
+    mean_update_info,
+    pack_update_info,
+)
+
+
+def make_update_info(seed):
+    torch.manual_seed(seed)
+    return {
+        "q_grad": [torch.randn(4, 3), torch.randn(4)],
+        "policy_grad": [torch.randn(2, 4), None],
+        "log_alpha_grad": torch.randn(()),
+        "iteration": 7,
+    }
+
+
+def test_mean_update_info():
+    infos = [make_update_info(seed) for seed in range(3)]
+    packed = [pack_update_info(info) for info in infos]
+    assert list(packed[0][0].keys()) == [torch.float32]
+
+    mean = mean_update_info(packed)
+    for k in ("q_grad", "policy_grad"):
+        for i, value in enumerate(mean[k]):
+            if value is None:
+                assert all(info[k][i] is None for info in infos)
+            else:
+                expected = torch.stack([info[k][i] for info in infos]).mean(0)
+                assert value.shape == expected.shape
+                assert torch.allclose(value, expected)
+    assert torch.allclose(mean["log_alpha_grad"], sum(info["log_alpha_grad"] for info in infos) / 3)
+    assert mean["iteration"] == 7 and isinstance(mean["iteration"], int)
+
+    single = mean_update_info(packed[:1])
+    assert torch.equal(single["q_grad"][0], infos[0]["q_grad"][0])
+
+
+def test_allreduce_update_info(tmp_path):
+    dist.init_process_group(
+        "gloo", init_method=f"file://{tmp_path}/store", rank=0, world_size=1
+    )
+    try:
+        info = make_update_info(0)
+        reduced = allreduce_update_info(info, bucket_numel=5)
+        assert torch.equal(reduced["q_grad"][0], info["q_grad"][0])
+        assert reduced["policy_grad"][1] is None and reduced["iteration"] == 7
+    finally:
+        dist.destroy_process_group()
@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+import torch
+
+from gops.apprfunc.mlp import FiniteHorizonPolicy
+from gops.utils.act_distribution_cls import Action_Distribution
+from gops.utils.model_rollout import ModelRollout, discounted_sum
+
+
+class LinearModel:
+    def __init__(self):
+        self.A = torch.tensor([[1.0, 0.1], [0.0, 1.0]])
+        self.B = torch.tensor([[0.0], [0.1]])
+
+    def forward(self, obs, action, done, info):
+        next_obs = obs @ self.A.T + action @ self.B.T
+        reward = -(obs ** 2).sum(1) - (action ** 2).sum(1)
+        next_info = {"constraint": next_obs[:, :1] - 1.0}
+        return next_obs, reward, done, next_info
+
+
+class NoisyLinearModel(LinearModel):
+    # draws noise from the global numpy generator, like pyth_mobilerobot
+    def forward(self, obs, action, done, info):
+        noise = torch.Tensor(np.random.normal(0, 0.1, [obs.shape[0], 1]))
+        return super().forward(obs, action + noise, done, info)
+
+
+def make_policy():
+    torch.manual_seed(0)
+    return FiniteHorizonPolicy(
+        obs_dim=2, act_dim=1, hidden_sizes=[16], hidden_activation="tanh",
+        output_activation="linear", act_high_lim=np.array([1.0], dtype=np.float32),
+        act_low_lim=np.array([-1.0], dtype=np.float32),
+        action_distribution_cls=Action_Distribution,
+    )
+
+
+def legacy_loss(policy, model, obs, done, info, horizon, gamma):
+    v_pi, v_pi_c = 0, 0
+    for step in range(horizon):
+        a = policy(obs, step + 1)
+        obs, r, done, info = model.forward(obs, a, done, info)
+        v_pi += r * (gamma ** step)
+        v_pi_c += torch.clamp_min(info["constraint"], 0).sum(1) * (gamma ** step)
+    return -v_pi.mean() + v_pi_c.mean()
+
+
+def test_compiled_rollout_runs_numpy_eagerly():
+    policy, obs, done = make_policy(), torch.randn(8, 2), torch.zeros(8)
+    trajs = []
+    for compile in [False, True]:
+        np.random.seed(0)
+        rollout = ModelRollout(NoisyLinearModel(), policy, compile=compile)
+        trajs.append(rollout(obs, done, {}, 4))
+        assert trajs[-1].obs.dtype == torch.float32
+    assert torch.allclose(trajs[0].obs, trajs[1].obs, atol=1e-5)
+
+
+@pytest.mark.parametrize("compile", [False, True])
+def test_rollout_matches_loop(compile):
+    policy, model = make_policy(), LinearModel()
+    obs, done = torch.randn(32, 2), torch.zeros(32)
+    data = {"obs": obs, "done": done}
+    horizon, gamma = 5, 0.9
+
+    expected = legacy_loss(policy, model, obs, done, data, horizon, gamma)
+    expected_grad = torch.autograd.grad(expected, list(policy.parameters()))
+
+    rollout = ModelRollout(model, policy, compile=compile)
+    traj = rollout(obs, done, data, horizon)
+    r, constraint = traj.rewards, traj.constraints
+    assert traj.obs.shape == (horizon + 1, 32, 2)
+    assert r.shape == (horizon, 32) and constraint.shape == (horizon, 32, 1)
+    loss = -discounted_sum(r, gamma).mean() + discounted_sum(
+        torch.clamp_min(constraint, 0).sum(2), gamma
+    ).mean()
+    grad = torch.autograd.grad(loss, list(policy.parameters()))
+
+    assert torch.allclose(loss, expected, atol=1e-5)
+    for g, e in zip(grad, expected_grad):
+        assert torch.allclose(g, e, atol=1e-5)
+    assert set(data) == {"obs", "done"}
+
+
+def test_shared_rollout_is_reused_within_scope():
+    policy, model = make_policy(), LinearModel()
+    obs, done = torch.randn(8, 2), torch.zeros(8)
+    data = {"obs": obs, "done": done}
+    rollout = ModelRollout(model, policy, compile=False)
+
+    with rollout.shared():
+        with torch.no_grad():
+            first = rollout(obs, done, data, 4)
+        # rolled out without gradient, so not reused with gradient
+        second = rollout(obs, done, data, 4)
+        assert second is not first and second.rewards.requires_grad
+        assert rollout(obs, done, data, 4) is second
+        with torch.no_grad():
+            assert rollout(obs, done, data, 4) is second
+        assert rollout(obs, done, data, 3) is not second
+    assert rollout(obs, done, data, 3) is not rollout(obs, done, data, 3)
+    assert rollout.tb_info("ALG") == {
+        "ALG/rollout_steps-RL iter": 4 + 4 + 3 + 3 + 3,
+        "ALG/rollout_steps_reused-RL iter": 4 + 4,
+    }
+
+    with rollout.shared():
+        traj = rollout(obs, done, data, 4)
+        with torch.no_grad():
+            for p in policy.parameters():
+                p.add_(0.1)
+        # policy parameters changed
+        assert rollout(obs, done, data, 4) is not traj
+
+
+def test_policy_grad_steps():
+    policy, model = make_policy(), LinearModel()
+    obs, done = torch.randn(8, 2), torch.zeros(8)
+    data = {"obs": obs, "done": done}
+    horizon = 4
+
+    rollout = ModelRollout(model, policy, policy_grad_steps=1, compile=False)
+    traj = rollout(obs, done, data, horizon)
+    full = ModelRollout(model, policy, compile=False)(obs, done, data, horizon)
+    torch.testing.assert_close(traj.rewards, full.rewards)
+    # rewards of later steps only depend on the policy through the first action
+    loss = traj.rewards[1:].sum()
+    grad = torch.autograd.grad(loss, list(policy.parameters()))
+
+    a0 = policy(obs, torch.tensor(1.0))
+    obs1 = obs @ model.A.T + a0 @ model.B.T
+    frozen = {k: v.detach() for k, v in policy.named_parameters()}
+    expected = 0
+    for step in range(1, horizon):
+        a = torch.func.functional_call(policy, frozen, (obs1, torch.tensor(step + 1.0)))
+        expected = expected - (obs1 ** 2).sum() - (a ** 2).sum()
+        obs1 = obs1 @ model.A.T + a @ model.B.T
+    expected_grad = torch.autograd.grad(expected, list(policy.parameters()))
+    for g, e in zip(grad, expected_grad):
+        torch.testing.assert_close(g, e)
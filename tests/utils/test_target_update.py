@@ -0,0 +1,27 @@
+import copy
+
+import torch
+from torch import nn
+
+from gops.utils.target_update import polyak_update
+
+
+def test_polyak_update_matches_loop():
+    nets = [nn.Sequential(nn.Linear(3, 8), nn.ReLU(), nn.Linear(8, 1)), nn.Linear(3, 2)]
+    targets = [copy.deepcopy(net) for net in nets]
+    for net in nets:
+        for p in net.parameters():
+            p.data.add_(torch.randn_like(p))
+    expected = [copy.deepcopy(t) for t in targets]
+    tau = 0.005
+    with torch.no_grad():
+        for net, target in zip(nets, expected):
+            for p, p_targ in zip(net.parameters(), target.parameters()):
+                p_targ.data.mul_(1 - tau)
+                p_targ.data.add_(tau * p.data)
+
+    polyak_update(nets, targets, tau)
+    polyak_update(nets[1], targets[1], 0.0)  # a single module, unchanged target
+    for target, reference in zip(targets, expected):
+        for p, q in zip(target.parameters(), reference.parameters()):
+            assert torch.allclose(p, q, atol=1e-6)
@@ -0,0 +1,33 @@
+import torch
+from torch import nn
+
+from gops.utils.weight_broadcast import flatten_weights, load_flat_weights
+
+
+class Container(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.policy = nn.Sequential(nn.Linear(3, 4), nn.BatchNorm1d(4), nn.Linear(4, 2))
+        self.q = nn.Linear(5, 1)
+
+
+def test_flat_weights_roundtrip():
+    source, target = Container(), Container()
+    source.policy(torch.randn(8, 3))  # update the running statistics of batch norm
+
+    flat = flatten_weights(source, ["policy"])
+    # float parameters and buffers in one tensor, the batch counter in another
+    assert set(flat.keys()) == {torch.float32, torch.int64}
+    assert flat[torch.float32].numel() == sum(
+        t.numel() for t in source.policy.state_dict().values() if t.is_floating_point()
+    )
+
+    q_weight = target.q.weight.clone()
+    load_flat_weights(target, flat, ["policy"])
+    for k, v in source.policy.state_dict().items():
+        assert torch.equal(target.policy.state_dict()[k], v)
+    assert torch.equal(target.q.weight, q_weight)
+
+    load_flat_weights(target, flatten_weights(source))
+    for k, v in source.state_dict().items():
+        assert torch.equal(target.state_dict()[k], v)